@@ -0,0 +1,169 @@
+import argparse
+import json
+import os
+import platform
+import statistics
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def load_fixture(name):
+    """
+    Read a saved HTML page from benchmarks/fixtures.
+
+    Parameters:
+        name (str): The file name of the fixture.
+
+    Returns:
+        str: The content of the fixture.
+    """
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def measure(fn, repeat=5, warmup=1):
+    """
+    Time a callable several times.
+
+    Parameters:
+        fn (callable): The function to time, called without arguments.
+        repeat (int): The number of timed runs.
+        warmup (int): The number of untimed runs done first.
+
+    Returns:
+        dict: The min, median, mean, 95th percentile and max wall time of the runs, in seconds.
+    """
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'mean': statistics.fmean(timings),
+        'p95': sorted(timings)[min(len(timings) - 1, int(len(timings) * 0.95))],
+        'max': max(timings),
+        'runs': repeat,
+    }
+
+
+def argument_parser(description, database=False):
+    parser = argparse.ArgumentParser(description=description, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed runs per case')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    if database:
+        parser.add_argument('--database-url', default=os.getenv('BENCHMARK_DATABASE_URL'),
+                            help='database to run against, defaults to $BENCHMARK_DATABASE_URL')
+    return parser
+
+
+def make_app(database_url, **settings):
+    """
+    Create the Flask app against a benchmark database, with CSRF disabled so
+    forms can be posted from the test client.
+
+    Parameters:
+        database_url (str): The SQLAlchemy URL of the database, Postgres or SQLite.
+        **settings: Extra configuration values, e.g. ARTIFACTS_PATH.
+
+    Returns:
+        flask.Flask: The app.
+    """
+    from core.app import create_app
+
+    if not database_url:
+        raise SystemExit('No database given, pass --database-url or set BENCHMARK_DATABASE_URL')
+
+    class BenchmarkConfig:
+        SECRET_KEY = 'benchmark'
+        SQLALCHEMY_DATABASE_URI = database_url
+        SQLALCHEMY_TRACK_MODIFICATIONS = False
+        WTF_CSRF_ENABLED = False
+
+    for name, value in settings.items():
+        setattr(BenchmarkConfig, name, value)
+    return create_app(BenchmarkConfig)
+
+
+def report(name, params, results, output=None):
+    """
+    Print a benchmark report as JSON, and optionally write it to a file, so
+    results of two releases can be diffed.
+
+    Parameters:
+        name (str): The name of the benchmark.
+        params (dict): The parameters the benchmark ran with.
+        results (dict): The measurements, keyed by case.
+        output (str): Optional path of a file to write the report to.
+
+    Returns:
+        dict: The full report.
+    """
+    document = {
+        'benchmark': name,
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'params': params,
+        'results': results,
+    }
+    text = json.dumps(document, indent=2, sort_keys=True)
+    print(text)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    return document
+
+
+@contextmanager
+def fixture_server(routes, latency=0.0):
+    """
+    Serve saved pages from a local HTTP server, as an offline stand-in for the
+    real news sites.
+
+    Parameters:
+        routes (dict): Path prefixes to the fixture content served under them.
+        latency (float): Artificial delay added to every response, in seconds,
+            to mimic the round trip to a remote host.
+
+    Yields:
+        str: The base URL of the server, e.g. http://127.0.0.1:54321
+    """
+    encoded = {prefix: content.encode('utf-8') for prefix, content in routes.items()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def do_GET(self):
+            body = next((content for prefix, content in encoded.items() if self.path.startswith(prefix)), None)
+            if body is None:
+                self.send_error(404)
+                return
+            time.sleep(latency)
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:%d' % server.server_address[1]
+    finally:
+        server.shutdown()
+        server.server_close()
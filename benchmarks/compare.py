@@ -0,0 +1,83 @@
+"""
+Compare two benchmark reports, e.g. two runs of benchmarks.suite, and list
+the cases whose median time changed by more than --threshold, or whose number
+of SQL queries changed:
+
+    python -m benchmarks.compare results/1.3.0.json results/1.4.0.json --threshold 0.1
+
+Exits with status 1 when a case got slower or runs more queries, so it can gate a release.
+"""
+import argparse
+import json
+
+
+def timed_cases(results, prefix=''):
+    """
+    Find the timed cases of a report, the dictionaries returned by measure().
+
+    Returns:
+        dict: Dotted case names, e.g. routes.profile, to their measurements.
+    """
+    cases = {}
+    for key, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        if 'median' in value:
+            cases[prefix + key] = value
+        else:
+            cases.update(timed_cases(value, prefix + key + '.'))
+    return cases
+
+
+def compare(baseline, candidate, threshold=0.1):
+    """
+    Parameters:
+        baseline (dict): The results of the older report.
+        candidate (dict): The results of the newer report.
+        threshold (float): The relative change of a median below which it is noise.
+
+    Returns:
+        list: (case, metric, old, new, change, verdict) tuples of the cases that
+        changed, verdict being 'slower' or 'faster'.
+    """
+    old_cases, new_cases = timed_cases(baseline), timed_cases(candidate)
+    changes = []
+    for case in sorted(old_cases.keys() & new_cases.keys()):
+        old, new = old_cases[case], new_cases[case]
+        if old['median'] > 0:
+            change = new['median'] / old['median'] - 1
+            if abs(change) > threshold:
+                changes.append((case, 'median', old['median'], new['median'], change,
+                                'slower' if change > 0 else 'faster'))
+        if 'queries' in old and 'queries' in new and old['queries'] != new['queries']:
+            change = new['queries'] / old['queries'] - 1 if old['queries'] else float('inf')
+            changes.append((case, 'queries', old['queries'], new['queries'], change,
+                            'slower' if new['queries'] > old['queries'] else 'faster'))
+    return changes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('baseline', help='report of the previous release')
+    parser.add_argument('candidate', help='report to check')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change of a median reported')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)['results']
+    with open(args.candidate) as f:
+        candidate = json.load(f)['results']
+
+    changes = compare(baseline, candidate, args.threshold)
+    for case, metric, old, new, change, verdict in changes:
+        print(f'{verdict:7} {case:45} {metric:8} {old:12.6g} -> {new:<12.6g} {change:+.1%}')
+    for case in sorted(timed_cases(baseline).keys() - timed_cases(candidate).keys()):
+        print(f'missing {case}')
+    if not changes:
+        print(f'No case changed by more than {args.threshold:.0%}')
+    if any(verdict == 'slower' for *_, verdict in changes):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,312 @@
+"""
+Fill a benchmark database with synthetic users, articles, interactions,
+comments, and favorite, viewed, shared and recommendation rows.
+
+--rows is the total number of rows written, split between the tables as in
+TABLE_SHARES: 10k rows is about 100 users and 1,000 articles, 10M rows is
+100k users and 1M articles. Article popularity and word frequencies follow a
+Zipf-like distribution, so a few articles get most of the traffic, as on the
+real site. The same seed always produces the same data.
+
+    python -m benchmarks.datagen --database-url postgresql://localhost/elysian_bench --rows 1000000
+    python -m benchmarks.datagen --database-url sqlite:////tmp/elysian_bench.db --rows 10000
+
+Each table is filled up to its share, so running it again with a larger --rows
+grows an existing database instead of starting over. --reset drops every table first.
+"""
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import func
+from sqlalchemy.engine import make_url
+from werkzeug.security import generate_password_hash
+from benchmarks.common import argument_parser, make_app, report
+from core.extensions import db
+from core.models import (Article, Comment, Interaction, User, favorite_article, recommendation, shared_article,
+                         viewed_article)
+from core.text import summarize
+
+# The fraction of --rows written to each table, in fill order
+TABLE_SHARES = {
+    'user': 0.01,
+    'article': 0.1,
+    'interaction': 0.4,
+    'comment': 0.05,
+    'viewed_article': 0.25,
+    'favorite_article': 0.1,
+    'shared_article': 0.04,
+    'recommendation': 0.05,
+}
+
+# Every synthetic user can log in with this password
+BENCHMARK_PASSWORD = 'Benchmark-Passw0rd!'
+
+COMMON_WORDS = ('apple google chip battery phone startup funding model privacy security robot camera '
+                'laptop electric car game console review launch update software hardware cloud data').split()
+CATEGORIES = ('tech', 'science', 'business', 'culture', 'gaming')
+PLATFORMS = ('twitter', 'facebook', 'linkedin', 'email')
+
+_cumulative = {}
+
+
+def cumulative_weights(n):
+    if n not in _cumulative:
+        total, weights = 0.0, []
+        for rank in range(1, n + 1):
+            total += 1.0 / rank
+            weights.append(total)
+        _cumulative[n] = weights
+    return _cumulative[n]
+
+
+def synthetic_text(rng, words, length):
+    # Word frequencies follow a Zipf-like distribution, as in real text
+    return ' '.join(rng.choices(words, cum_weights=cumulative_weights(len(words)), k=length))
+
+
+def vocabulary(seed=0):
+    words = COMMON_WORDS + ['term%d' % i for i in range(20000)]
+    random.Random(seed).shuffle(words)
+    return words
+
+
+def table_targets(rows):
+    """
+    Returns:
+        dict: The number of rows wanted in each table, at least one.
+    """
+    return {name: max(1, int(rows * share)) for name, share in TABLE_SHARES.items()}
+
+
+def count_rows(table):
+    return db.session.query(func.count()).select_from(table).scalar()
+
+
+def insert_batches(table, target, make_row, batch_size):
+    """
+    Insert rows made by make_row(n), for n from the current row count, until
+    the table holds target rows.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    existing = count_rows(table)
+    inserted = 0
+    while existing + inserted < target:
+        rows = [make_row(existing + inserted + i) for i in range(min(batch_size, target - existing - inserted))]
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+        inserted += len(rows)
+    return inserted
+
+
+def fill_users(target, seed=0, batch_size=5000):
+    # Hashing is slow on purpose, so every user shares one hash
+    password_hash = generate_password_hash(BENCHMARK_PASSWORD)
+
+    def make_row(n):
+        return {'username': 'bench%d' % n, 'email': 'bench%d@example.com' % n, 'password_hash': password_hash}
+    return insert_batches(User.__table__, target, make_row, batch_size)
+
+
+def fill_articles(target, seed=0, batch_size=5000):
+    """
+    Insert synthetic articles until the table holds at least target rows.
+
+    Parameters:
+        target (int): The number of articles wanted.
+        seed (int): The random seed, so the corpus is repeatable.
+        batch_size (int): Rows per INSERT round trip.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    words = vocabulary(seed)
+
+    def make_row(n):
+        rng = random.Random('%d:article:%d' % (seed, n))
+        content = synthetic_text(rng, words, 200)
+        return {
+            'title': synthetic_text(rng, words, 8).capitalize(),
+            'url': 'https://bench.example.com/%d' % n,
+            'content': content,
+            'summary': summarize(content),
+            'category': rng.choice(CATEGORIES),
+            'polarity': rng.uniform(-1, 1),
+            'subjectivity': rng.random(),
+            'views': rng.randint(0, 10000),
+            'likes': rng.randint(0, 500),
+        }
+    return insert_batches(Article.__table__, target, make_row, batch_size)
+
+
+class ArticleSampler:
+    """
+    Draw article ids with a Zipf-like popularity, the most popular articles
+    being spread over the whole id range rather than being the oldest ones.
+    """
+
+    def __init__(self, seed=0):
+        self.ids = [article_id for article_id, in db.session.query(Article.id).order_by(Article.id)]
+        random.Random(seed).shuffle(self.ids)
+        self.weights = cumulative_weights(len(self.ids))
+
+    def sample(self, rng, k):
+        return rng.choices(self.ids, cum_weights=self.weights, k=k)
+
+    def distinct(self, rng, k):
+        # Popular articles come up again and again, so draw until k different ones were found
+        k = min(k, len(self.ids))
+        chosen = set()
+        while len(chosen) < k:
+            chosen.update(self.sample(rng, k - len(chosen)))
+        return chosen
+
+
+def fill_interactions(target, user_ids, articles, seed=0, batch_size=5000):
+    now = datetime.utcnow()
+
+    def make_row(n):
+        rng = random.Random('%d:interaction:%d' % (seed, n))
+        return {
+            'user_id': rng.choice(user_ids),
+            'article_id': articles.sample(rng, 1)[0],
+            'read_time': rng.randint(5, 900),
+            'scroll_depth': rng.random(),
+            'rating': rng.randint(1, 5) if rng.random() < 0.3 else None,
+            'last_interaction_time': now - timedelta(seconds=rng.randint(0, 90 * 24 * 3600)),
+        }
+    return insert_batches(Interaction.__table__, target, make_row, batch_size)
+
+
+def fill_comments(target, seed=0, batch_size=5000):
+    # Comments go on every stride-th interaction, continuing after the last one commented
+    table = Comment.__table__
+    stride = max(1, count_rows(Interaction.__table__) // target)
+    last = db.session.query(func.max(Comment.interaction_id)).scalar() or 0
+    words = vocabulary(seed)
+    now = datetime.utcnow()
+    inserted, existing = 0, count_rows(table)
+    while existing + inserted < target:
+        interactions = db.session.query(Interaction.id, Interaction.user_id, Interaction.article_id) \
+            .filter(Interaction.id > last).order_by(Interaction.id).limit(batch_size * stride).all()
+        if not interactions:
+            break
+        rows = []
+        for interaction_id, user_id, article_id in interactions[::stride][:target - existing - inserted]:
+            rng = random.Random('%d:comment:%d' % (seed, interaction_id))
+            rows.append({
+                'content': synthetic_text(rng, words, 30).capitalize(),
+                'user_id': user_id,
+                'article_id': article_id,
+                'interaction_id': interaction_id,
+                'polarity': rng.uniform(-1, 1),
+                'subjectivity': rng.random(),
+                'timestamp': now - timedelta(seconds=rng.randint(0, 90 * 24 * 3600)),
+            })
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+        inserted += len(rows)
+        last = interactions[-1].id
+    return inserted
+
+
+def fill_user_articles(table, target, user_ids, articles, seed=0, batch_size=5000):
+    """
+    Give users a set of distinct articles in a user/article association table,
+    the same number each, continuing after the last user that has some.
+
+    Returns:
+        int: The number of rows inserted.
+    """
+    per_user = max(1, target // len(user_ids))
+    last = db.session.query(func.max(table.c.user_id)).scalar() or 0
+    now = datetime.utcnow()
+    inserted, existing, rows = 0, count_rows(table), []
+    for user_id in (user_id for user_id in user_ids if user_id > last):
+        if existing + inserted + len(rows) >= target:
+            break
+        rng = random.Random('%d:%s:%d' % (seed, table.name, user_id))
+        for article_id in sorted(articles.distinct(rng, per_user)):
+            row = {'user_id': user_id, 'article_id': article_id}
+            if table is shared_article:
+                row['platform'] = rng.choice(PLATFORMS)
+            elif table is recommendation:
+                row['score'] = rng.random()
+                row['recommended_on'] = now
+            rows.append(row)
+        if len(rows) >= batch_size:
+            db.session.execute(table.insert(), rows)
+            db.session.commit()
+            inserted += len(rows)
+            rows = []
+    if rows:
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+        inserted += len(rows)
+    return inserted
+
+
+def generate(rows, seed=0, batch_size=5000):
+    """
+    Fill every table up to its share of rows.
+
+    Parameters:
+        rows (int): The total number of rows wanted.
+        seed (int): The random seed.
+        batch_size (int): Rows per INSERT round trip.
+
+    Returns:
+        dict: The rows inserted, the rows in the table and the insert rate of each table.
+    """
+    targets = table_targets(rows)
+    results = {}
+
+    def timed(name, fill, *args):
+        start = time.perf_counter()
+        inserted = fill(*args)
+        elapsed = time.perf_counter() - start
+        results[name] = {'inserted': inserted, 'seconds': elapsed,
+                         'rows_per_second': inserted / elapsed if inserted else None}
+
+    timed('user', fill_users, targets['user'], seed, batch_size)
+    timed('article', fill_articles, targets['article'], seed, batch_size)
+    user_ids = [user_id for user_id, in db.session.query(User.id).order_by(User.id)]
+    articles = ArticleSampler(seed)
+    timed('interaction', fill_interactions, targets['interaction'], user_ids, articles, seed, batch_size)
+    timed('comment', fill_comments, targets['comment'], seed, batch_size)
+    for table in (viewed_article, favorite_article, shared_article, recommendation):
+        timed(table.name, fill_user_articles, table, targets[table.name], user_ids, articles, seed, batch_size)
+
+    if db.engine.dialect.name == 'postgresql':
+        db.session.execute('ANALYZE')
+        db.session.commit()
+    tables = {'user': User.__table__, 'article': Article.__table__, 'interaction': Interaction.__table__,
+              'comment': Comment.__table__, 'viewed_article': viewed_article, 'favorite_article': favorite_article,
+              'shared_article': shared_article, 'recommendation': recommendation}
+    for name, table in tables.items():
+        results[name]['rows'] = count_rows(table)
+    return results
+
+
+def main():
+    parser = argument_parser(__doc__, database=True)
+    parser.add_argument('--rows', type=int, default=100000, help='total number of rows, 10k to 10M')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per INSERT round trip')
+    parser.add_argument('--reset', action='store_true', help='drop and recreate every table first')
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        if args.reset:
+            db.drop_all()
+        db.create_all()
+        results = generate(args.rows, seed=args.seed, batch_size=args.batch_size)
+
+    report('datagen', dict(vars(args), database_url=None, dialect=make_url(args.database_url).get_backend_name()),
+           results, args.output)
+
+
+if __name__ == '__main__':
+    main()
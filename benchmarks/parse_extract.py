@@ -0,0 +1,121 @@
+"""
+Compare article extraction backends on the saved article pages: parse time and
+peak memory per page.
+
+    full_soup   what parse_article_content did before, a whole html.parser soup
+    strained    html.parser restricted to the heading and content tags by a SoupStrainer
+    streaming   lxml's pull parser fed in network-sized chunks, stopping after the article
+
+Peak memory is measured once per case in a fresh process: the peak of Python
+allocations (tracemalloc), and on Linux the growth of the peak resident set
+size, which also counts what libxml2 allocates outside of Python:
+
+    python -m benchmarks.parse_extract --repeat 50 --padding-kb 200
+"""
+import multiprocessing
+import tracemalloc
+from bs4 import BeautifulSoup
+from benchmarks.common import argument_parser, load_fixture, measure, report
+from core.scraper import extraction, techcrunch_scraper, verge_scraper
+
+SOURCES = {
+    'techcrunch': (techcrunch_scraper.SOURCE.extractor, 'techcrunch_article.html'),
+    'verge': (verge_scraper.SOURCE.extractor, 'verge_article.html'),
+}
+
+
+def full_soup(html, config):
+    # The previous implementation: the whole page as a BeautifulSoup tree
+    soup = BeautifulSoup(html, 'html.parser')
+    heading = None
+    for tag, css_class in config.headings:
+        heading = soup.find(tag, {'class': css_class})
+        if heading:
+            break
+    tag, css_class = config.content
+    content_tags = soup.find_all(tag, {'class': css_class})
+    return heading.get_text(strip=True), ' '.join(' '.join(t.stripped_strings) + ' ' for t in content_tags).strip()
+
+
+def strained(html, config):
+    return extraction.parse_strained([html], config)
+
+
+def streaming(html, config):
+    data = html.encode('utf-8')
+    chunks = (data[start:start + extraction.CHUNK_SIZE] for start in range(0, len(data), extraction.CHUNK_SIZE))
+    return extraction.extract_article(chunks, config)
+
+
+CASES = {'full_soup': full_soup, 'strained': strained, 'streaming': streaming}
+
+
+def load_page(fixture, padding_kb):
+    # Padding goes after the article, like comments, related stories and scripts on real pages
+    html = load_fixture(fixture)
+    if padding_kb:
+        filler = '<div class="related"><p>%s</p></div>\n' % ('filler text ' * 80)
+        html = html.replace('</body>', filler * (padding_kb * 1024 // len(filler) + 1) + '</body>')
+    return html
+
+
+def resident_kb(field):
+    with open('/proc/self/status') as f:
+        return next(int(line.split()[1]) for line in f if line.startswith(field + ':'))
+
+
+def peak_memory(case, source, padding_kb, queue):
+    config, fixture = SOURCES[source]
+    html = load_page(fixture, padding_kb)
+    try:
+        # Resets the peak resident set size of the process to its current size
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        before = resident_kb('VmRSS')
+    except OSError:
+        before = None
+    tracemalloc.start()
+    CASES[case](html, config)
+    python_peak = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+    queue.put({'python_peak_kb': python_peak,
+               'rss_peak_growth_kb': resident_kb('VmHWM') - before if before is not None else None})
+
+
+def measure_peak_memory(case, source, padding_kb):
+    """
+    Returns:
+        dict: The peak of Python allocations while parsing the page once, and
+        the growth of the peak resident set size where Linux reports it, in KiB.
+    """
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=peak_memory, args=(case, source, padding_kb, queue))
+    process.start()
+    memory = queue.get()
+    process.join()
+    return memory
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--padding-kb', type=int, default=0, help='KiB of markup added after each article')
+    args = parser.parse_args()
+
+    results = {}
+    for source, (config, fixture) in SOURCES.items():
+        html = load_page(fixture, args.padding_kb)
+        expected = full_soup(html, config)
+        for case, parse in CASES.items():
+            if parse(html, config) != expected:
+                raise SystemExit(f'{case} extracted something else than full_soup from {fixture}')
+            timings = measure(lambda: parse(html, config), repeat=args.repeat)
+            results[f'{source}.{case}'] = dict(timings, page_kb=len(html.encode('utf-8')) / 1024,
+                                               **measure_peak_memory(case, source, args.padding_kb))
+        results[f'{source}.speedup'] = results[f'{source}.full_soup']['median'] / results[f'{source}.streaming']['median']
+
+    report('parse_extract', vars(args), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
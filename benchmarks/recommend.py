@@ -0,0 +1,92 @@
+"""
+Time recommendation scoring against a database filled by benchmarks.datagen:
+
+    content.fit             TF-IDF over every article, published as an artifact
+    content.recommend       one user, as the home page does for users without materialized rows
+    content.profiles        loading the history of --users users
+    content.batch           scoring --users users at once, as the materialization job does
+    collaborative.load_feedback
+    collaborative.fit       the item-item model over every favorite, view, share and interaction
+    collaborative.recommend one user
+    collaborative.batch     --users users, against every article of the content model
+    embeddings.build        the LSA vectors and IVF index
+    embeddings.more_like_this
+    embeddings.recommend    one user's profile against the index
+
+Fitting runs once per case by default, as it takes long on large catalogs:
+
+    python -m benchmarks.recommend --database-url postgresql://localhost/elysian_bench --users 256
+"""
+import itertools
+import random
+import tempfile
+from benchmarks.common import argument_parser, make_app, measure, report
+from core.artifacts import artifact_store
+from core.collaborative import ItemItemModel, load_feedback
+from core.embeddings import build_index, embedding_index
+from core.extensions import db
+from core.models import Article, Interaction
+from core.recommender import content_recommender
+
+
+def main():
+    parser = argument_parser(__doc__, database=True)
+    parser.add_argument('--users', type=int, default=256, help='users scored per batch')
+    parser.add_argument('--fit-repeat', type=int, default=1, help='timed runs of each fit')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.set_defaults(repeat=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as artifacts:
+        app = make_app(args.database_url, ARTIFACTS_PATH=artifacts)
+        with app.app_context():
+            store = artifact_store(app)
+            # Users with some history, the ones recommendations are computed for
+            user_ids = sorted(user_id for user_id, in db.session.query(Interaction.user_id).distinct())
+            if not user_ids:
+                raise SystemExit('The database is empty, fill it with benchmarks.datagen first')
+            rng = random.Random(args.seed)
+            batch = sorted(rng.sample(user_ids, min(args.users, len(user_ids))))
+            one_user = itertools.cycle(rng.sample(user_ids, min(len(user_ids), args.repeat + 1)))
+            results = {}
+
+            results['content.fit'] = measure(content_recommender.fit_from_db, repeat=args.fit_repeat, warmup=0)
+            corpus = content_recommender.corpus
+            results['content.recommend'] = measure(lambda: content_recommender.recommend(next(one_user)),
+                                                   repeat=args.repeat)
+            profiles = content_recommender.build_profiles(batch)
+            results['content.profiles'] = measure(lambda: content_recommender.build_profiles(batch),
+                                                  repeat=args.repeat)
+            results['content.batch'] = measure(
+                lambda: content_recommender.top_k(corpus, content_recommender.weight_matrix(corpus, profiles, batch), 20),
+                repeat=args.repeat)
+
+            feedback = load_feedback()
+            results['collaborative.load_feedback'] = measure(load_feedback, repeat=args.fit_repeat, warmup=0)
+            results['collaborative.fit'] = measure(lambda: ItemItemModel().fit(feedback), repeat=args.fit_repeat,
+                                                   warmup=0)
+            model = ItemItemModel().fit(feedback)
+            results['collaborative.recommend'] = measure(lambda: model.recommend(next(one_user)), repeat=args.repeat)
+            results['collaborative.batch'] = measure(lambda: model.score_users(batch, corpus.article_ids),
+                                                     repeat=args.repeat)
+
+            rows = db.session.query(Article.id, Article.title, Article.content).order_by(Article.id).all()
+            ids, documents = [row.id for row in rows], [row.title + ' ' + row.content for row in rows]
+            del rows
+            results['embeddings.build'] = measure(lambda: build_index(store, ids, documents),
+                                                  repeat=args.fit_repeat, warmup=0)
+            article = itertools.cycle(rng.sample(ids, min(len(ids), args.repeat + 1)))
+            results['embeddings.more_like_this'] = measure(lambda: embedding_index.more_like_this(next(article)),
+                                                           repeat=args.repeat)
+            results['embeddings.recommend'] = measure(
+                lambda: embedding_index.recommend(profiles[batch[rng.randrange(len(batch))]]), repeat=args.repeat)
+
+            params = dict(vars(args), database_url=None, dialect=db.engine.dialect.name, article_count=len(ids),
+                          active_users=len(user_ids), corpus_shape=list(corpus.matrix.shape),
+                          feedback_nnz=int(feedback.matrix.nnz), similarity_nnz=int(model.similarity.nnz))
+
+    report('recommend', params, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
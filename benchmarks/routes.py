@@ -0,0 +1,114 @@
+"""
+Time the main pages through the Flask test client against a database filled
+by benchmarks.datagen, and count the SQL queries each of them runs:
+
+    index_anonymous   /, the popular articles
+    index_user        /, the recommendations of a logged-in user
+    article           /article/<id>, a different article every run, so the article cache misses
+    article_cached    /article/<id>, the same article every run
+    search            /search, cycling through a few queries
+    profile           /profile of a logged-in user
+
+    python -m benchmarks.datagen --database-url postgresql://localhost/elysian_bench --rows 1000000
+    python -m benchmarks.routes --database-url postgresql://localhost/elysian_bench --repeat 200
+
+Pages are rendered in full, templates included; there is no network or WSGI
+server in between.
+"""
+import itertools
+import random
+import tempfile
+import threading
+from sqlalchemy import event, func
+from benchmarks.common import argument_parser, make_app, measure, report
+from core.extensions import db
+from core.models import Article, User, favorite_article
+
+SEARCH_QUERIES = ('chip', 'battery startup', '"electric car"', 'term15000', 'privacy')
+
+
+class QueryCounter:
+    """
+    Count the statements an engine runs in the calling thread, leaving out
+    those of background threads such as the event flush.
+    """
+
+    def __init__(self, engine):
+        self.count = 0
+        self.thread = threading.get_ident()
+        event.listen(engine, 'after_cursor_execute', self._count)
+
+    def _count(self, *args):
+        if threading.get_ident() == self.thread:
+            self.count += 1
+
+
+def logged_in_client(app, user_id):
+    # Flask-Login reads the user from the session, so no password check is timed
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+
+def benchmark_user():
+    # The user with the longest favorites list, for the heaviest profile page
+    return db.session.query(favorite_article.c.user_id) \
+        .group_by(favorite_article.c.user_id) \
+        .order_by(func.count().desc(), favorite_article.c.user_id) \
+        .limit(1).scalar() or db.session.query(func.min(User.id)).scalar()
+
+
+def main():
+    parser = argument_parser(__doc__, database=True)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.set_defaults(repeat=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as artifacts:
+        app = make_app(args.database_url, ARTIFACTS_PATH=artifacts)
+        with app.app_context():
+            user_id = benchmark_user()
+            article_ids = [article_id for article_id, in db.session.query(Article.id)]
+            counter = QueryCounter(db.engine)
+        if user_id is None or not article_ids:
+            raise SystemExit('The database is empty, fill it with benchmarks.datagen first')
+
+        rng = random.Random(args.seed)
+        # Articles only repeat, and hit the cache, when there are fewer than the runs
+        fresh_articles = itertools.cycle(rng.sample(article_ids, min(len(article_ids), args.repeat + 1)))
+        cached_article = rng.choice(article_ids)
+        queries = itertools.cycle(SEARCH_QUERIES)
+        anonymous, user = app.test_client(), logged_in_client(app, user_id)
+
+        cases = {
+            'index_anonymous': lambda: anonymous.get('/'),
+            'index_user': lambda: user.get('/'),
+            'article': lambda: anonymous.get('/article/%d' % next(fresh_articles)),
+            'article_cached': lambda: anonymous.get('/article/%d' % cached_article),
+            'search': lambda: anonymous.get('/search', query_string={'keywords': next(queries)}),
+            'profile': lambda: user.get('/profile'),
+        }
+        results = {}
+        for name, request in cases.items():
+            # The first request loads what is loaded once per process; the queries are counted on the second
+            for _ in range(2):
+                counter.count = 0
+                response = request()
+                if response.status_code != 200:
+                    raise SystemExit(f'{name} answered {response.status_code}')
+            queries_run = counter.count
+            results[name] = dict(measure(request, repeat=args.repeat, warmup=0), queries=queries_run)
+
+        with app.app_context():
+            article_count = db.session.query(func.count(Article.id)).scalar()
+            user_count = db.session.query(func.count(User.id)).scalar()
+            dialect = db.engine.dialect.name
+
+    report('routes', dict(vars(args), database_url=None, dialect=dialect, article_count=article_count,
+                          user_count=user_count), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
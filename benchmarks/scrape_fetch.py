@@ -0,0 +1,55 @@
+"""
+Compare serial and concurrent article fetching in scrape_articles.
+
+Saved article pages are replayed through a local HTTP server with an artificial
+per-request latency, so the benchmark runs offline and is repeatable:
+
+    python -m benchmarks.scrape_fetch --links 40 --latency 0.2
+"""
+import requests
+from benchmarks.common import argument_parser, fixture_server, load_fixture, measure, report
+from core.scraper import techcrunch_scraper, verge_scraper
+from core.scraper.fetcher import Fetcher
+
+
+def run_serial_baseline(source, urls):
+    # What scrape_articles did before: one un-pooled requests.get per link
+    articles = {}
+    for url in urls:
+        html = requests.get(url).text
+        heading, content = source.parse_article_content(html)
+        articles[url] = (heading, content)
+    return articles
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--links', type=int, default=40, help='number of article links per source')
+    parser.add_argument('--latency', type=float, default=0.2, help='simulated server latency in seconds')
+    parser.add_argument('--per-host', type=int, default=8, help='concurrent requests allowed per host')
+    args = parser.parse_args()
+
+    routes = {
+        '/verge/': load_fixture('verge_article.html'),
+        '/techcrunch/': load_fixture('techcrunch_article.html'),
+    }
+    results = {}
+    with fixture_server(routes, latency=args.latency) as base_url:
+        for source in (verge_scraper.SOURCE, techcrunch_scraper.SOURCE):
+            name = source.name
+            # Absolute links, so they resolve to the local server rather than the source's base_url
+            urls = ['%s/%s/2023/5/%d/story' % (base_url, name, i) for i in range(args.links)]
+            source.fetcher = Fetcher(max_workers=16, per_host=args.per_host)
+
+            results[name + '.serial_unpooled'] = measure(lambda: run_serial_baseline(source, urls), repeat=args.repeat)
+            results[name + '.serial_pooled'] = measure(lambda: source.scrape_articles(urls, concurrent=False),
+                                                       repeat=args.repeat)
+            results[name + '.concurrent'] = measure(lambda: source.scrape_articles(urls, concurrent=True),
+                                                    repeat=args.repeat)
+            results[name + '.speedup'] = results[name + '.serial_unpooled']['median'] / results[name + '.concurrent']['median']
+
+    report('scrape_fetch', vars(args), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
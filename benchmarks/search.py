@@ -0,0 +1,48 @@
+"""
+Measure full-text search latency through Article.search_articles.
+
+The benchmark database is filled with synthetic articles up to --articles rows
+(existing rows are kept), then each query is run --repeat times:
+
+    python -m benchmarks.search --database-url postgresql://localhost/elysian_bench --articles 100000
+"""
+from sqlalchemy import func
+from benchmarks.common import argument_parser, make_app, measure, report
+from benchmarks.datagen import fill_articles
+from core.extensions import db
+from core.models import Article
+
+
+def main():
+    parser = argument_parser(__doc__, database=True)
+    parser.add_argument('--articles', type=int, default=100000, help='number of articles in the table')
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.set_defaults(repeat=50)
+    args = parser.parse_args()
+
+    app = make_app(args.database_url)
+    with app.app_context():
+        db.create_all()
+        inserted = fill_articles(args.articles)
+        db.session.execute('ANALYZE article')
+
+        queries = {
+            'common_word': 'chip',
+            'rare_word': 'term15000',
+            'two_words': 'battery startup',
+            'phrase': '"electric car"',
+            'no_match': 'zzzzzz',
+        }
+        results = {}
+        for name, keywords in queries.items():
+            results[name] = measure(lambda: Article.search_articles(keywords, per_page=args.per_page).items,
+                                    repeat=args.repeat)
+            results[name]['total'] = Article.search_articles(keywords, per_page=args.per_page).total
+        article_count = db.session.query(func.count(Article.id)).scalar()
+
+    report('search', dict(vars(args), database_url=None, article_count=article_count, inserted=inserted),
+           results, args.output)
+
+
+if __name__ == '__main__':
+    main()
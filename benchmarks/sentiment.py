@@ -0,0 +1,60 @@
+"""
+Compare serial and parallel sentiment scoring of a batch of articles, and the
+cost of scoring the same batch again once it is cached:
+
+    python -m benchmarks.sentiment --articles 1000
+"""
+import random
+from bs4 import BeautifulSoup
+from benchmarks.common import argument_parser, load_fixture, measure, report
+from core.sentiment import SentimentService, score_chunk
+
+
+def synthetic_articles(count, seed=0):
+    """
+    Build article bodies by shuffling the paragraphs of the saved fixtures.
+
+    Parameters:
+        count (int): The number of articles.
+        seed (int): The random seed, so runs are repeatable.
+
+    Returns:
+        list: The article bodies, all distinct.
+    """
+    paragraphs = []
+    for name in ('verge_article.html', 'techcrunch_article.html'):
+        soup = BeautifulSoup(load_fixture(name), 'html.parser')
+        paragraphs.extend(p.get_text(' ', strip=True) for p in soup.find_all('p'))
+    paragraphs = [p for p in paragraphs if len(p) > 200]
+
+    rng = random.Random(seed)
+    return ['Article %d. ' % i + ' '.join(rng.sample(paragraphs, 8)) for i in range(count)]
+
+
+def main():
+    parser = argument_parser(__doc__)
+    parser.add_argument('--articles', type=int, default=1000, help='number of articles to score')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes, defaults to the CPU count')
+    args = parser.parse_args()
+
+    texts = synthetic_articles(args.articles)
+    service = SentimentService(max_workers=args.workers)
+    results = {}
+
+    results['serial'] = measure(lambda: score_chunk(texts), repeat=args.repeat, warmup=0)
+
+    def parallel():
+        service.clear()
+        service.score_many(texts)
+    results['parallel'] = measure(parallel, repeat=args.repeat)
+
+    service.score_many(texts)
+    results['cached'] = measure(lambda: service.score_many(texts), repeat=args.repeat)
+    results['speedup'] = results['serial']['median'] / results['parallel']['median']
+    service.close()
+
+    report('sentiment', dict(vars(args), workers=service.max_workers), results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Run every benchmark, each in a fresh process, and collect their reports into
+one JSON document, to be compared between releases with benchmarks.compare:
+
+    python -m benchmarks.suite --database-url postgresql://localhost/elysian_bench --rows 1000000 \\
+        --output results/1.4.0.json
+
+--rows first fills the database with benchmarks.datagen, up to that many rows.
+Without a database, only the benchmarks that need none run: sentiment scoring,
+and scraper fetching and parsing on the saved fixtures.
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from benchmarks.common import argument_parser, report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Every benchmark module, whether it needs a database, and its arguments in the suite
+BENCHMARKS = [
+    ('parse_extract', False, ['--repeat', '50']),
+    ('scrape_fetch', False, ['--links', '20', '--latency', '0.05']),
+    ('sentiment', False, ['--articles', '500']),
+    # The articles written by datagen are searched as they are, none are added
+    ('search', True, ['--articles', '0']),
+    ('routes', True, []),
+    ('recommend', True, []),
+]
+
+
+def run_benchmark(module, args):
+    """
+    Run a benchmark module in its own process.
+
+    Returns:
+        dict: Its report, or None when it failed.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        output = os.path.join(directory, module + '.json')
+        command = [sys.executable, '-m', 'benchmarks.' + module, *args, '--output', output]
+        completed = subprocess.run(command, cwd=ROOT, stdout=subprocess.DEVNULL)
+        if completed.returncode != 0:
+            print(f'{module} failed with exit status {completed.returncode}', file=sys.stderr)
+            return None
+        with open(output) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argument_parser(__doc__, database=True)
+    parser.add_argument('--rows', type=int, help='fill the database with benchmarks.datagen first')
+    parser.add_argument('--only', nargs='+', choices=[name for name, _, _ in BENCHMARKS],
+                        help='run only these benchmarks')
+    parser.set_defaults(repeat=None)
+    args = parser.parse_args()
+
+    database = ['--database-url', args.database_url] if args.database_url else []
+    params = {'rows': args.rows, 'benchmarks': {}, 'failed': []}
+    results = {}
+    if args.rows and args.database_url:
+        generated = run_benchmark('datagen', database + ['--rows', str(args.rows)])
+        if generated is None:
+            raise SystemExit('Filling the database failed')
+        results['datagen'] = generated['results']
+
+    for name, needs_database, extra in BENCHMARKS:
+        if args.only and name not in args.only:
+            continue
+        if needs_database and not args.database_url:
+            print(f'Skipping {name}, it needs a database', file=sys.stderr)
+            continue
+        # A --repeat given to the suite overrides the one of every benchmark
+        repeat = ['--repeat', str(args.repeat)] if args.repeat else []
+        child = run_benchmark(name, extra + repeat + (database if needs_database else []))
+        if child is None:
+            params['failed'].append(name)
+            continue
+        params['benchmarks'][name] = child['params']
+        results[name] = child['results']
+
+    report('suite', params, results, args.output)
+    if params['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
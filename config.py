@@ -1,13 +1,42 @@
 import os
-from decouple import config
 from datetime import timedelta
 from dotenv import load_dotenv
 load_dotenv()
 
 BASE_DIR = os.path.dirname(os.path.realpath(__file__))
 
+
+def env_flag(name, default=False):
+    # Unset keeps the default; 1, true, yes or on, in any case, turn the flag on
+    value = os.getenv(name)
+    return default if value is None else value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
 class Config:
     SECRET_KEY = os.getenv('SECRET_KEY')
+    # Embedded Redis server shared by the scraper and the web workers
+    REDISLITE_PATH = os.getenv('REDISLITE_PATH', os.path.join(BASE_DIR, 'instance', 'elysian.rdb'))
+    # Article payloads cached per worker; set ARTICLE_CACHE_BACKEND=redislite to share them between processes
+    ARTICLE_CACHE_SIZE = int(os.getenv('ARTICLE_CACHE_SIZE', 1024))
+    ARTICLE_CACHE_TTL = int(os.getenv('ARTICLE_CACHE_TTL', 300))
+    ARTICLE_CACHE_BACKEND = os.getenv('ARTICLE_CACHE_BACKEND', 'memory')
+    # Users loaded by Flask-Login cached per worker; changes made by other processes show after the TTL
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+    # Modules declaring the sources the scraper follows, each polled on its own schedule
+    SCRAPER_SOURCES = os.getenv('SCRAPER_SOURCES', 'core.scraper.verge_scraper,core.scraper.techcrunch_scraper').split(',')
+    SCRAPER_WORKERS = int(os.getenv('SCRAPER_WORKERS', 8))
+    # Articles still linked from a front page are fetched again after this long, to pick up corrections
+    FRONTIER_RECHECK_SECONDS = int(os.getenv('FRONTIER_RECHECK_SECONDS', 6 * 3600))
+    # Versioned model artifacts memory-mapped by every worker, see core/artifacts.py
+    ARTIFACTS_PATH = os.getenv('ARTIFACTS_PATH', os.path.join(BASE_DIR, 'instance', 'artifacts'))
+    # Request, query and pipeline stage timings exported at /metrics, see core/metrics.py
+    METRICS_ENABLED = env_flag('METRICS_ENABLED')
+    SLOW_QUERY_MS = int(os.getenv('SLOW_QUERY_MS', 500))
+    # Port of the /metrics endpoint of the scraper process; 0 disables it
+    METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+    # Let ?_profile=1 return the sampled stacks of a request instead of its page; never in production
+    PROFILING_ENABLED = env_flag('PROFILING_ENABLED')
 
 class ProdConfig(Config):
     DB_USER = os.getenv('DB_USER')
@@ -18,6 +47,19 @@ class ProdConfig(Config):
     DEBUG = False
     TESTING = False
     SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # Connections per worker process: pool_size kept open, up to max_overflow more under bursts
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 10)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 20)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        # Replace connections dropped by the server or a proxy instead of failing the request on them
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'connect_args': {'options': f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 10000))}"},
+    }
+    # Open the pool and load the popularity ranking and models before serving, see core/warmup.py
+    WARMUP_ON_STARTUP = env_flag('WARMUP_ON_STARTUP')
+    PRELOAD_APP = env_flag('PRELOAD_APP')
 
 class TestConfig(Config):
     DB_USER = os.getenv('DB_USER')
@@ -26,4 +68,14 @@ class TestConfig(Config):
     DB_PORT = os.getenv('DB_PORT')
     DB_NAME = os.getenv('TEST_DB_NAME')
     DEBUG = True
-    SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 2)),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', 5)),
+        'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+        'pool_pre_ping': True,
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+        'connect_args': {'options': f"-c statement_timeout={int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 30000))}"},
+    }
+    WARMUP_ON_STARTUP = env_flag('WARMUP_ON_STARTUP')
+    PRELOAD_APP = env_flag('PRELOAD_APP')
\ No newline at end of file
@@ -1,13 +1,22 @@
+import time
 from flask import Flask
 from core.models import User
 from sqlalchemy import text
 from core.extensions import db, login_manager, csrf
+from core.popularity import popularity_ranking
+from core.cache import article_cache, user_cache
+from core.embeddings import embedding_index
+from core.events import event_queue
+from core.metrics import metrics
 from flask_cors import CORS
 from flask_migrate import Migrate
 from core.views.auth import auth_bp
 from core.views.index import main_bp
+from core.commands import articles_cli, recommendations_cli
+from core.warmup import warm_up
 
 def create_app(config): 
+    started = time.perf_counter()
     app = Flask(__name__, template_folder='views/templates')
     app.config.from_object(config)
 
@@ -17,22 +26,45 @@ def create_app(config):
     login_manager.init_app(app)
     csrf.init_app(app)
     migrate = Migrate(app, db)
+    popularity_ranking.init_app(app)
+    event_queue.init_app(app)
+    article_cache.init_app(app)
+    user_cache.init_app(app)
+    embedding_index.init_app(app)
+    metrics.init_app(app)
 
     # Set the login view for Flask-Login
     login_manager.login_view = 'auth.login'
 
     # Define the user loader function for Flask-Login
+    # Users come from a per-process cache, so authenticated requests don't query the user table
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return user_cache.get(int(user_id), User.query.get)
 
-    with app.app_context():
-        try:
-            result = db.engine.execute(text("SELECT 1"))
-            print("Database connection successful:", result.scalar() == 1)
-        except Exception as e:
-            print("Database connection failed:", e)
-        
     app.register_blueprint(main_bp)
     app.register_blueprint(auth_bp)
+    app.cli.add_command(recommendations_cli)
+    app.cli.add_command(articles_cli)
+
+    if app.config.get('WARMUP_ON_STARTUP'):
+        timings = warm_up(app)
+        if app.config.get('PRELOAD_APP'):
+            # The app is preloaded in a master that forks its workers; they must not inherit its connections.
+            # The ranking and models stay loaded and are shared with the workers, which open their own pools.
+            with app.app_context():
+                db.engine.dispose()
+        for name, seconds in timings.items():
+            metrics.set('elysian_warmup_seconds', seconds, step=name)
+        print("Warmup finished:", ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+        print(f"App started in {time.perf_counter() - started:.2f}s")
+    else:
+        with app.app_context():
+            try:
+                with db.engine.connect() as connection:
+                    result = connection.execute(text("SELECT 1"))
+                    print("Database connection successful:", result.scalar() == 1)
+            except Exception as e:
+                print("Database connection failed:", e)
+    metrics.set('elysian_app_start_seconds', time.perf_counter() - started)
     return app
\ No newline at end of file
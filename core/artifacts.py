@@ -0,0 +1,248 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import scipy.sparse as sp
+
+# Versions kept per artifact besides the current one, for workers still mapping them and for rollbacks
+KEEP_VERSIONS = 2
+
+CURRENT_FILE = 'CURRENT'
+META_FILE = 'meta.json'
+
+Artifact = namedtuple('Artifact', ['name', 'version', 'path', 'arrays', 'meta'])
+
+
+def artifacts_path(app):
+    """
+    Returns:
+        str: The directory holding every model artifact, ARTIFACTS_PATH or instance/artifacts.
+    """
+    return app.config.get('ARTIFACTS_PATH') or os.path.join(app.instance_path, 'artifacts')
+
+
+def csr_arrays(prefix, matrix):
+    return {prefix + '_data': matrix.data, prefix + '_indices': matrix.indices, prefix + '_indptr': matrix.indptr}
+
+
+def csr_from_arrays(arrays, prefix, shape):
+    # copy=False keeps the memory-mapped buffers instead of reading them into the process
+    return sp.csr_matrix((arrays[prefix + '_data'], arrays[prefix + '_indices'], arrays[prefix + '_indptr']),
+                         shape=tuple(shape), copy=False)
+
+
+def string_arrays(prefix, strings):
+    """
+    Pack strings into a UTF-8 byte array and an offsets array, which unlike an
+    array of Python strings can be memory-mapped.
+    """
+    encoded = [string.encode('utf-8') for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(string) for string in encoded], out=offsets[1:])
+    return {prefix + '_bytes': np.frombuffer(b''.join(encoded), dtype=np.uint8), prefix + '_offsets': offsets}
+
+
+class StringTable:
+    """
+    Read-only sequence over strings packed by string_arrays(), decoding each one
+    on access.
+    """
+
+    def __init__(self, arrays, prefix):
+        self.data = arrays[prefix + '_bytes']
+        self.offsets = arrays[prefix + '_offsets']
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.data[self.offsets[index]:self.offsets[index + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        return (self[index] for index in range(len(self)))
+
+
+class ArtifactStore:
+    """
+    Versioned model artifacts as directories of .npy files.
+
+    Every publish writes a new version directory and then atomically replaces
+    the CURRENT file naming it, so readers see either the old or the new version
+    and never a partial one. Arrays are opened memory-mapped: processes mapping
+    the same version share its pages through the OS page cache instead of each
+    holding a copy, and a version removed from disk stays readable by the
+    processes that still have it mapped.
+
+    Parameters:
+        root (str): The directory of the store.
+    """
+
+    def __init__(self, root):
+        self.root = root
+
+    def _directory(self, name):
+        return os.path.join(self.root, name)
+
+    def publish(self, name, arrays, meta=None, keep=KEEP_VERSIONS):
+        """
+        Write a new version of an artifact and make it the current one.
+
+        Parameters:
+            name (str): The name of the artifact.
+            arrays (dict): Names to NumPy arrays. Object arrays are not supported.
+            meta (dict): JSON serializable metadata stored alongside.
+            keep (int): The number of previous versions to keep.
+
+        Returns:
+            str: The new version.
+        """
+        directory = self._directory(name)
+        os.makedirs(directory, exist_ok=True)
+        version = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+        building = os.path.join(directory, f'.{version}.{os.getpid()}.tmp')
+        os.makedirs(building)
+        for array_name, array in arrays.items():
+            np.save(os.path.join(building, array_name + '.npy'), np.ascontiguousarray(array), allow_pickle=False)
+        with open(os.path.join(building, META_FILE), 'w') as f:
+            json.dump(dict(meta or {}, version=version, created_at=time.time(), arrays=sorted(arrays)), f)
+        os.rename(building, os.path.join(directory, version))
+
+        pointer = os.path.join(directory, f'.{CURRENT_FILE}.{os.getpid()}.tmp')
+        with open(pointer, 'w') as f:
+            f.write(version)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(pointer, os.path.join(directory, CURRENT_FILE))
+
+        self.prune(name, keep)
+        return version
+
+    def versions(self, name):
+        directory = self._directory(name)
+        if not os.path.isdir(directory):
+            return []
+        return sorted(entry for entry in os.listdir(directory)
+                      if not entry.startswith('.') and os.path.isdir(os.path.join(directory, entry)))
+
+    def current_version(self, name):
+        try:
+            with open(os.path.join(self._directory(name), CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def prune(self, name, keep=KEEP_VERSIONS):
+        current = self.current_version(name)
+        older = [version for version in self.versions(name) if version != current]
+        for version in older[:max(len(older) - keep, 0)]:
+            shutil.rmtree(os.path.join(self._directory(name), version), ignore_errors=True)
+
+    def load(self, name, version=None):
+        """
+        Open a version of an artifact, by default the current one.
+
+        Returns:
+            Artifact: The artifact, with its arrays memory-mapped, or None when
+            nothing was published under that name.
+        """
+        version = version or self.current_version(name)
+        if version is None:
+            return None
+        path = os.path.join(self._directory(name), version)
+        with open(os.path.join(path, META_FILE)) as f:
+            meta = json.load(f)
+        arrays = {array_name: np.load(os.path.join(path, array_name + '.npy'), mmap_mode='r')
+                  for array_name in meta['arrays']}
+        return Artifact(name, version, path, arrays, meta)
+
+
+@contextmanager
+def exclusive_lock(path, wait=False):
+    """
+    Try to take an exclusive lock on a file, by default without waiting for it.
+
+    Parameters:
+        path (str): The lock file, created if missing.
+        wait (bool): Block until the lock is free rather than giving up.
+
+    Yields:
+        bool: Whether the lock was taken, always True when waiting. It is released on exit.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def artifact_store(app):
+    root = artifacts_path(app)
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = ArtifactStore(root)
+        return _stores[root]
+
+
+class ArtifactLoader:
+    """
+    Per-process handle on the current version of an artifact.
+
+    get() looks at the CURRENT file at most every check_interval seconds and,
+    when another process published a new version, builds the serving object
+    from it with build(artifact). Workers therefore switch to a retrained model
+    without restarting, and in between they serve from the version they have.
+
+    Parameters:
+        name (str): The name of the artifact.
+        build (callable): Turns an Artifact into the object get() returns.
+        check_interval (float): The seconds between two checks for a new version.
+    """
+
+    def __init__(self, name, build, check_interval=5.0):
+        self.name = name
+        self.build = build
+        self.check_interval = check_interval
+        self.version = None
+        self.value = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, store):
+        """
+        Returns:
+            object: The object built from the current version, or None when
+            nothing was published yet.
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return self.value
+        with self._lock:
+            if now - self._checked_at < self.check_interval:
+                return self.value
+            version = store.current_version(self.name)
+            if version is not None and version != self.version:
+                self.value = self.build(store.load(self.name, version))
+                self.version = version
+            self._checked_at = now
+            return self.value
+
+    def reset(self):
+        # Forces the next get() to look for a new version, e.g. right after publishing one
+        with self._lock:
+            self._checked_at = 0.0
@@ -0,0 +1,215 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy.orm import make_transient_to_detached
+from core.extensions import db
+from core.redis_store import get_redis
+
+
+class ArticleCache:
+    """
+    Read-through cache of the article payloads rendered by the detail page.
+
+    Payloads are kept in a size-bounded, in-process LRU. With a shared backend
+    (the redislite server of the scraper), a miss in one web worker is served
+    from what another worker already loaded, and ingestion drops updated
+    articles for every process at once. Local entries expire after ttl seconds,
+    which bounds how long a worker can serve an article that another process
+    invalidated.
+
+    Parameters:
+        max_entries (int): The number of payloads kept in the LRU.
+        ttl (float): The seconds a payload stays valid, locally and in the backend.
+        backend (redis.Redis): Optional shared cache.
+    """
+
+    KEY_PREFIX = 'article:'
+
+    def __init__(self, max_entries=1024, ttl=300, backend=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('ARTICLE_CACHE_SIZE', self.max_entries)
+        self.ttl = app.config.get('ARTICLE_CACHE_TTL', self.ttl)
+        if app.config.get('ARTICLE_CACHE_BACKEND') == 'redislite':
+            self.backend = get_redis(app.config['REDISLITE_PATH'])
+
+    def _get_local(self, article_id):
+        with self._lock:
+            entry = self._entries.get(article_id)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time.monotonic():
+                del self._entries[article_id]
+                return None
+            self._entries.move_to_end(article_id)
+            return payload
+
+    def _put_local(self, article_id, payload):
+        with self._lock:
+            self._entries[article_id] = (time.monotonic() + self.ttl, payload)
+            self._entries.move_to_end(article_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def get(self, article_id, loader):
+        """
+        Return the payload of an article, loading and caching it on a miss.
+
+        Parameters:
+            article_id (int): The id of the article.
+            loader (callable): Called with the id on a miss. Returns a JSON
+                serializable payload, or None when the article does not exist.
+
+        Returns:
+            dict: The payload, or None. Missing articles are not cached.
+        """
+        payload = self._get_local(article_id)
+        if payload is not None:
+            self.hits += 1
+            return payload
+
+        if self.backend is not None:
+            cached = self.backend.get(self.KEY_PREFIX + str(article_id))
+            if cached is not None:
+                payload = json.loads(cached)
+                self._put_local(article_id, payload)
+                self.hits += 1
+                return payload
+
+        self.misses += 1
+        payload = loader(article_id)
+        if payload is not None:
+            self._put_local(article_id, payload)
+            if self.backend is not None:
+                self.backend.set(self.KEY_PREFIX + str(article_id), json.dumps(payload), ex=int(self.ttl))
+        return payload
+
+    def invalidate(self, article_ids):
+        """
+        Drop articles whose row changed, e.g. after ingestion updated them.
+
+        Parameters:
+            article_ids (iterable): The ids of the changed articles.
+        """
+        article_ids = list(article_ids)
+        if not article_ids:
+            return
+        with self._lock:
+            for article_id in article_ids:
+                self._entries.pop(article_id, None)
+        if self.backend is not None:
+            self.backend.delete(*[self.KEY_PREFIX + str(article_id) for article_id in article_ids])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: The hit, miss and eviction counts of this process, and the current size.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
+
+
+class UserCache:
+    """
+    Per-process cache of the users loaded by Flask-Login on every request.
+
+    Users are kept as detached copies of their column values and merged into
+    the request's session without loading, so authenticated requests do not
+    query the user table. Relationships of the merged user still load lazily.
+    Entries expire after ttl seconds, which bounds how long a change made by
+    another process goes unnoticed.
+
+    Parameters:
+        max_entries (int): The number of users kept.
+        ttl (float): The seconds a user stays cached.
+    """
+
+    def __init__(self, max_entries=10000, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_entries = app.config.get('USER_CACHE_SIZE', self.max_entries)
+        self.ttl = app.config.get('USER_CACHE_TTL', self.ttl)
+
+    @staticmethod
+    def snapshot(user):
+        # A fresh instance holding only loaded column values, so the cached copy never expires or lazy loads
+        mapper = type(user).__mapper__
+        copy = mapper.class_(**{attribute.key: getattr(user, attribute.key) for attribute in mapper.column_attrs})
+        make_transient_to_detached(copy)
+        return copy
+
+    def get(self, user_id, loader):
+        """
+        Return a user attached to the current session, loading it on a miss.
+
+        Parameters:
+            user_id (int): The id of the user.
+            loader (callable): Called with the id on a miss, returns the user or None.
+
+        Returns:
+            User: The user, or None when it does not exist.
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[user_id]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(user_id)
+        if entry is not None:
+            self.hits += 1
+            return db.session.merge(entry[1], load=False)
+
+        self.misses += 1
+        user = loader(user_id)
+        if user is not None:
+            with self._lock:
+                self._entries[user_id] = (time.monotonic() + self.ttl, self.snapshot(user))
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return user
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns:
+            dict: The hit and miss counts of this process, and the current size.
+        """
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries)}
+
+
+article_cache = ArticleCache()
+user_cache = UserCache()
@@ -0,0 +1,320 @@
+from collections import namedtuple
+import numpy as np
+import scipy.sparse as sp
+from flask import current_app
+from core.artifacts import ArtifactLoader, artifact_store, csr_arrays, csr_from_arrays
+from core.extensions import db
+from core.models import Interaction, favorite_article, viewed_article, shared_article
+from core.recommender import FAVORITE_WEIGHT, VIEW_WEIGHT, interaction_weight
+
+SHARE_WEIGHT = 2.0
+
+# A user x article implicit-feedback matrix with the ids behind its rows and columns.
+FeedbackMatrix = namedtuple('FeedbackMatrix', ['matrix', 'user_ids', 'article_ids'])
+
+
+def load_feedback():
+    """
+    Stream every favorite, view, share and interaction into one sparse matrix.
+
+    Duplicate (user, article) pairs are summed, and negative interaction weights
+    (poor ratings) are clipped to zero as they carry no co-occurrence signal.
+
+    Returns:
+        FeedbackMatrix: The users x articles feedback matrix.
+    """
+    users, articles, weights = [], [], []
+
+    def extend(query, weight):
+        for user_id, article_id in query.yield_per(10000):
+            users.append(user_id)
+            articles.append(article_id)
+            weights.append(weight)
+
+    extend(db.session.query(favorite_article.c.user_id, favorite_article.c.article_id), FAVORITE_WEIGHT)
+    extend(db.session.query(viewed_article.c.user_id, viewed_article.c.article_id), VIEW_WEIGHT)
+    extend(db.session.query(shared_article.c.user_id, shared_article.c.article_id), SHARE_WEIGHT)
+    interactions = db.session.query(Interaction.user_id, Interaction.article_id, Interaction.read_time,
+                                    Interaction.scroll_depth, Interaction.rating)
+    for user_id, article_id, read_time, scroll_depth, rating in interactions.yield_per(10000):
+        users.append(user_id)
+        articles.append(article_id)
+        weights.append(max(interaction_weight(read_time, scroll_depth, rating), 0.0))
+
+    return build_feedback(np.asarray(users, dtype=np.int64), np.asarray(articles, dtype=np.int64),
+                          np.asarray(weights, dtype=np.float32))
+
+
+def build_feedback(users, articles, weights):
+    """
+    Build a feedback matrix from parallel arrays of user ids, article ids and weights.
+    """
+    user_ids, rows = np.unique(users, return_inverse=True)
+    article_ids, columns = np.unique(articles, return_inverse=True)
+    matrix = sp.csr_matrix((weights, (rows, columns)), shape=(len(user_ids), len(article_ids)), dtype=np.float32)
+    matrix.sum_duplicates()
+    matrix.eliminate_zeros()
+    return FeedbackMatrix(matrix, user_ids, article_ids)
+
+
+def prune_rows(matrix, k):
+    """
+    Keep only the k largest entries of every row of a CSR matrix, without a
+    Python loop over the rows.
+    """
+    matrix = matrix.tocsr()
+    counts = np.diff(matrix.indptr)
+    if counts.max(initial=0) <= k:
+        return matrix
+    row_of_entry = np.repeat(np.arange(matrix.shape[0]), counts)
+    order = np.lexsort((-matrix.data, row_of_entry))
+    rank = np.arange(len(order)) - np.repeat(matrix.indptr[:-1], counts)
+    keep = order[rank < k]
+    keep.sort()
+    pruned = sp.csr_matrix((matrix.data[keep], matrix.indices[keep],
+                            np.concatenate(([0], np.cumsum(np.minimum(counts, k))))), shape=matrix.shape)
+    return pruned
+
+
+class ItemItemModel:
+    """
+    Item-item collaborative filtering with cosine similarity.
+
+    Training computes the article x article cosine similarity of the columns of
+    the feedback matrix in chunks of articles, keeping only the top neighbours
+    of each one, so memory stays bounded by n_articles x neighbours. A user's
+    scores are then their feedback row times the similarity matrix.
+
+    Parameters:
+        neighbours (int): The number of most similar articles kept per article.
+        chunk_size (int): The number of articles whose similarities are computed at once.
+    """
+
+    def __init__(self, neighbours=50, chunk_size=2000):
+        self.neighbours = neighbours
+        self.chunk_size = chunk_size
+        self.similarity = None
+        self.feedback = None
+
+    def fit(self, feedback):
+        matrix = feedback.matrix.tocsc()
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+        norms[norms == 0] = 1.0
+        normalized = (matrix @ sp.diags((1.0 / norms).astype(np.float32))).tocsc()
+        transposed = normalized.T.tocsr()
+
+        n_articles = matrix.shape[1]
+        blocks = []
+        for start in range(0, n_articles, self.chunk_size):
+            stop = min(start + self.chunk_size, n_articles)
+            block = (transposed[start:stop] @ normalized).tocoo()
+            # An article is not its own neighbour
+            other = block.col != block.row + start
+            block = sp.csr_matrix((block.data[other], (block.row[other], block.col[other])), shape=block.shape)
+            blocks.append(prune_rows(block, self.neighbours))
+        self.similarity = sp.vstack(blocks, format='csr') if blocks else sp.csr_matrix((0, 0), dtype=np.float32)
+        self.feedback = feedback
+        return self
+
+    def rows_of_users(self, user_ids):
+        """
+        Find the feedback rows of users by binary search, as user_ids are sorted.
+
+        Returns:
+            tuple: The positions in user_ids of the known users, and their rows.
+        """
+        known_ids = self.feedback.user_ids
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if not len(known_ids) or not len(user_ids):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(known_ids, user_ids), len(known_ids) - 1)
+        known = np.flatnonzero(known_ids[rows] == user_ids)
+        return known, rows[known]
+
+    def score_rows(self, history):
+        """
+        Score every article for a batch of feedback rows.
+
+        Parameters:
+            history (scipy.sparse.csr_matrix): Users x articles feedback, in the model's column order.
+
+        Returns:
+            numpy.ndarray: A dense users x articles array of scores, with the
+            articles already in the history set to -inf.
+        """
+        scores = (history @ self.similarity).toarray()
+        scores[history.nonzero()] = -np.inf
+        return scores
+
+    def score_users(self, user_ids, article_ids):
+        """
+        Score a set of articles for a batch of users.
+
+        Parameters:
+            user_ids (list): The ids of the users.
+            article_ids (numpy.ndarray): The ids of the articles to score, in output column order.
+
+        Returns:
+            numpy.ndarray: A dense users x articles array. Unknown users and
+            articles score 0, articles the user already has score -inf.
+        """
+        scores = np.zeros((len(user_ids), len(article_ids)), dtype=np.float32)
+        if self.similarity is None:
+            return scores
+        outputs, rows = self.rows_of_users(user_ids)
+        if not len(rows):
+            return scores
+
+        positions = np.searchsorted(self.feedback.article_ids, article_ids)
+        positions = np.minimum(positions, len(self.feedback.article_ids) - 1)
+        in_model = self.feedback.article_ids[positions] == article_ids
+
+        model_scores = self.score_rows(self.feedback.matrix[rows])
+        scores[np.ix_(outputs, np.flatnonzero(in_model))] = model_scores[:, positions[in_model]]
+        return scores
+
+    def recommend(self, user_id, k=10):
+        """
+        Look up the top-k article ids for a user.
+
+        Parameters:
+            user_id (int): The id of the user.
+            k (int): The number of articles to return.
+
+        Returns:
+            list: The recommended article ids, best first. Empty for unknown users.
+        """
+        _, rows = self.rows_of_users([user_id])
+        if not len(rows):
+            return []
+        scores = self.score_rows(self.feedback.matrix[rows])[0]
+        candidates = np.flatnonzero(np.isfinite(scores) & (scores > 0))
+        if candidates.size == 0:
+            return []
+        k = min(k, candidates.size)
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [int(article_id) for article_id in self.feedback.article_ids[top]]
+
+    def to_arrays(self):
+        arrays = dict(csr_arrays('feedback', self.feedback.matrix), **csr_arrays('similarity', self.similarity))
+        arrays.update(user_ids=self.feedback.user_ids, article_ids=self.feedback.article_ids)
+        return arrays
+
+    @classmethod
+    def from_artifact(cls, artifact):
+        arrays = artifact.arrays
+        n_users, n_articles = len(arrays['user_ids']), len(arrays['article_ids'])
+        model = cls(neighbours=artifact.meta['neighbours'])
+        model.feedback = FeedbackMatrix(csr_from_arrays(arrays, 'feedback', (n_users, n_articles)),
+                                        arrays['user_ids'], arrays['article_ids'])
+        model.similarity = csr_from_arrays(arrays, 'similarity', (n_articles, n_articles))
+        return model
+
+
+def split_feedback(feedback, holdout=0.2, seed=0):
+    """
+    Hold out a random fraction of every user's articles for evaluation. Users
+    with a single article keep it in the training set.
+
+    Returns:
+        tuple: The training and test csr matrices, in the same shape as feedback.matrix.
+    """
+    matrix = feedback.matrix.tocsr()
+    rng = np.random.default_rng(seed)
+    counts = np.diff(matrix.indptr)
+    test_mask = rng.random(matrix.nnz) < holdout
+    # Keep at least one article in training for every user
+    first_of_row = matrix.indptr[:-1][counts > 0]
+    test_mask[first_of_row] = False
+
+    rows = np.repeat(np.arange(matrix.shape[0]), counts)
+    train = sp.csr_matrix((matrix.data[~test_mask], (rows[~test_mask], matrix.indices[~test_mask])), shape=matrix.shape)
+    test = sp.csr_matrix((matrix.data[test_mask], (rows[test_mask], matrix.indices[test_mask])), shape=matrix.shape)
+    return train, test
+
+
+def evaluate(feedback, k=10, holdout=0.2, seed=0, neighbours=50, chunk_size=1024):
+    """
+    Offline evaluation of the item-item model on a held-out split, next to a
+    most-popular baseline.
+
+    Parameters:
+        feedback (FeedbackMatrix): The full feedback matrix.
+        k (int): The cut-off of the ranking.
+        holdout (float): The fraction of each user's articles held out.
+        seed (int): The random seed of the split.
+        neighbours (int): The number of neighbours kept per article.
+        chunk_size (int): The number of users scored at once.
+
+    Returns:
+        dict: Precision@k and recall@k of the model and of the baseline, and the
+        number of users evaluated.
+    """
+    train, test = split_feedback(feedback, holdout, seed)
+    model = ItemItemModel(neighbours=neighbours).fit(FeedbackMatrix(train, feedback.user_ids, feedback.article_ids))
+    popularity = np.asarray((train > 0).sum(axis=0), dtype=np.float32).ravel()
+    # The popularity rank of every article, most popular first
+    popularity_rank = np.empty(len(popularity), dtype=np.int64)
+    popularity_rank[np.argsort(-popularity, kind='stable')] = np.arange(len(popularity))
+    n_articles = train.shape[1]
+
+    users = np.flatnonzero(np.diff(test.indptr) > 0)
+    totals = {'model': [0.0, 0.0], 'popularity': [0.0, 0.0]}
+    for start in range(0, len(users), chunk_size):
+        chunk = users[start:start + chunk_size]
+        history, truth = train[chunk], (test[chunk] > 0).astype(np.float32)
+        relevant = truth.getnnz(axis=1)
+
+        # Everything stays sparse: the model's top-k are taken from the rows of nonzero scores
+        scores = (history @ model.similarity).tocsr()
+        scores = (scores - scores.multiply(history > 0)).tocsr()
+        scores.eliminate_zeros()
+        model_hits = prune_rows(scores, k).multiply(truth).getnnz(axis=1)
+
+        # A held-out article is in the popular top-k when fewer than k unseen articles rank above it;
+        # the seen ones above it are counted by a binary search over (row, rank) keys of the history
+        history_rows = np.repeat(np.arange(len(chunk)), np.diff(history.indptr))
+        history_keys = np.sort(history_rows * n_articles + popularity_rank[history.indices])
+        truth = truth.tocoo()
+        ranks = popularity_rank[truth.col]
+        seen_above = np.searchsorted(history_keys, truth.row * n_articles + ranks) - history.indptr[truth.row]
+        popular_hits = np.bincount(truth.row[ranks - seen_above < k], minlength=len(chunk))
+
+        for name, hits in (('model', model_hits), ('popularity', popular_hits)):
+            totals[name][0] += (hits / k).sum()
+            totals[name][1] += (hits / relevant).sum()
+
+    n = max(len(users), 1)
+    return {
+        'users': int(len(users)),
+        'k': k,
+        'precision@k': float(totals['model'][0] / n),
+        'recall@k': float(totals['model'][1] / n),
+        'popularity_precision@k': float(totals['popularity'][0] / n),
+        'popularity_recall@k': float(totals['popularity'][1] / n),
+    }
+
+
+class CollaborativeRecommender:
+    """
+    Serves the latest trained item-item model, memory-mapped from the
+    'collaborative' artifact, switching to a new version when
+    'flask recommendations train-cf' publishes one.
+    """
+
+    ARTIFACT = 'collaborative'
+
+    def __init__(self):
+        self._loader = ArtifactLoader(self.ARTIFACT, ItemItemModel.from_artifact)
+
+    def publish(self, store, model):
+        version = store.publish(self.ARTIFACT, model.to_arrays(), {'neighbours': model.neighbours})
+        self._loader.reset()
+        return version
+
+    def get_model(self):
+        return self._loader.get(artifact_store(current_app))
+
+
+collaborative_recommender = CollaborativeRecommender()
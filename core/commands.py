@@ -0,0 +1,129 @@
+import importlib.util
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from core.artifacts import artifact_store
+from core.collaborative import ItemItemModel, collaborative_recommender, evaluate, load_feedback
+from core.dedup import duplicate_index, store_clusters
+from core.embeddings import EMBEDDING_DIM, build_index
+from core.extensions import db
+from core.materialize import materialize_recommendations
+from core.models import Article
+from core.transfer import CHUNK_SIZE, TABLES, export_table, import_table
+
+recommendations_cli = AppGroup('recommendations', help='Precompute and maintain recommendations.')
+
+
+@recommendations_cli.command('refresh')
+@click.option('--full', is_flag=True, help='Recompute every active user, not only those with new activity.')
+@click.option('--k', default=20, show_default=True, help='Recommendations stored per user.')
+@click.option('--chunk-size', default=256, show_default=True, help='Users scored at once.')
+def refresh_recommendations(full, k, chunk_size):
+    """Materialize top-k recommendations into the recommendation table."""
+    result = materialize_recommendations(k=k, chunk_size=chunk_size, full=full)
+    click.echo(f"Refreshed {result.users} users, wrote {result.recommendations} recommendations")
+
+
+@recommendations_cli.command('train-cf')
+@click.option('--neighbours', default=50, show_default=True, help='Most similar articles kept per article.')
+def train_collaborative(neighbours):
+    """Train the item-item collaborative-filtering model and publish it to running app processes."""
+    start = time.perf_counter()
+    feedback = load_feedback()
+    model = ItemItemModel(neighbours=neighbours).fit(feedback)
+
+    version = collaborative_recommender.publish(artifact_store(current_app), model)
+    click.echo(f"Trained on {feedback.matrix.nnz} interactions of {len(feedback.user_ids)} users "
+               f"and {len(feedback.article_ids)} articles in {time.perf_counter() - start:.1f}s, "
+               f"published version {version}")
+
+
+@recommendations_cli.command('train-embeddings')
+@click.option('--dim', default=EMBEDDING_DIM, show_default=True, help='Dimensions of the article vectors.')
+def train_embeddings(dim):
+    """Embed every article with LSA and rebuild the similarity index used by "more like this"."""
+    start = time.perf_counter()
+    rows = db.session.query(Article.id, Article.title, Article.content).order_by(Article.id).all()
+    if not rows:
+        raise click.ClickException('There are no articles to embed')
+    meta = build_index(artifact_store(current_app), [row.id for row in rows],
+                       [row.title + ' ' + row.content for row in rows], dim=dim)
+    click.echo(f"Embedded {meta['base_count']} articles in {meta['dim']} dimensions, {meta['lists']} lists, "
+               f"in {time.perf_counter() - start:.1f}s, published version {meta['version']}")
+
+
+@recommendations_cli.command('evaluate-cf')
+@click.option('--k', default=10, show_default=True, help='Ranking cut-off.')
+@click.option('--holdout', default=0.2, show_default=True, help='Fraction of each user\'s articles held out.')
+@click.option('--neighbours', default=50, show_default=True, help='Most similar articles kept per article.')
+@click.option('--seed', default=0, show_default=True, help='Random seed of the split.')
+def evaluate_collaborative(k, holdout, neighbours, seed):
+    """Report precision@k and recall@k of the collaborative-filtering model on a held-out split."""
+    metrics = evaluate(load_feedback(), k=k, holdout=holdout, seed=seed, neighbours=neighbours)
+    for name, value in metrics.items():
+        click.echo(f"{name}: {value:.4f}" if isinstance(value, float) else f"{name}: {value}")
+
+
+articles_cli = AppGroup('articles', help='Move articles and interactions in and out of the database.')
+
+FORMATS = click.Choice(['ndjson', 'parquet'])
+
+
+def guess_format(path, format):
+    format = format or ('parquet' if path.endswith('.parquet') else 'ndjson')
+    if format == 'parquet' and importlib.util.find_spec('pyarrow') is None:
+        raise click.UsageError('Parquet files need pyarrow, install it with: pip install pyarrow')
+    return format
+
+
+@articles_cli.command('export')
+@click.argument('path')
+@click.option('--table', type=click.Choice(list(TABLES)), default='article', show_default=True)
+@click.option('--format', type=FORMATS, default=None, help='Defaults to parquet for .parquet files, else ndjson.')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True, help='Rows fetched per round trip.')
+def export_command(path, table, format, chunk_size):
+    """Stream a table to PATH ('-' for stdout, .gz to compress)."""
+    start = time.perf_counter()
+    result = export_table(table, path, guess_format(path, format), chunk_size)
+    click.echo(f"Exported {result.rows} {table} rows in {time.perf_counter() - start:.1f}s", err=True)
+
+
+@articles_cli.command('import')
+@click.argument('path')
+@click.option('--table', type=click.Choice(list(TABLES)), default='article', show_default=True)
+@click.option('--format', type=FORMATS, default=None, help='Defaults to parquet for .parquet files, else ndjson.')
+@click.option('--chunk-size', default=CHUNK_SIZE, show_default=True, help='Rows sent per COPY.')
+def import_command(path, table, format, chunk_size):
+    """Load a file written by export into a table, skipping rows that already exist."""
+    start = time.perf_counter()
+    result = import_table(table, path, guess_format(path, format), chunk_size)
+    click.echo(f"Imported {result.rows} {table} rows, skipped {result.skipped}, "
+               f"in {time.perf_counter() - start:.1f}s", err=True)
+
+
+@articles_cli.command('dedup')
+@click.option('--all', 'everything', is_flag=True, help='Re-cluster every article, not only unsigned ones.')
+@click.option('--chunk-size', default=1000, show_default=True, help='Articles signed per transaction.')
+def dedup_command(everything, chunk_size):
+    """Cluster near-duplicate articles that were stored without a signature, e.g. by import."""
+    if everything:
+        db.session.query(Article).update({Article.minhash: None, Article.cluster_id: None}, synchronize_session=False)
+        db.session.commit()
+    duplicate_index.clear()
+
+    signed = duplicates = 0
+    last_id = 0
+    while True:
+        rows = db.session.query(Article.id, Article.content) \
+            .filter(Article.minhash.is_(None), Article.id > last_id) \
+            .order_by(Article.id).limit(chunk_size).all()
+        if not rows:
+            break
+        assigned = duplicate_index.assign(rows)
+        store_clusters(assigned)
+        db.session.commit()
+        signed += len(assigned)
+        duplicates += sum(1 for row in assigned if row['cluster'] != row['article_id'])
+        last_id = rows[-1].id
+    click.echo(f"Signed {signed} articles, {duplicates} are near duplicates")
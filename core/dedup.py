@@ -0,0 +1,242 @@
+import hashlib
+import re
+import threading
+from collections import defaultdict
+import numpy as np
+from sqlalchemy import bindparam, update
+from core.extensions import db
+from core.models import Article
+
+# Articles are compared on sets of overlapping 5-word shingles
+SHINGLE_SIZE = 5
+NUM_PERM = 128
+# 16 bands of 8 rows: pairs above about 0.7 Jaccard similarity become candidates
+BANDS = 16
+ROWS_PER_BAND = NUM_PERM // BANDS
+# Candidates are duplicates when their estimated Jaccard similarity reaches this
+DUPLICATE_THRESHOLD = 0.8
+
+# Largest prime below 2**32, so hashed values fit in uint32
+PRIME = 4294967291
+# Fixed seed: signatures are stored with the articles and must stay comparable across runs
+_random = np.random.RandomState(20231)
+HASH_A = _random.randint(1, 2 ** 31, NUM_PERM).astype(np.uint64)
+HASH_B = _random.randint(0, 2 ** 31, NUM_PERM).astype(np.uint64)
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """
+    Split a text into its set of overlapping word n-grams.
+
+    Parameters:
+        text (str): The text.
+        size (int): The number of words per shingle.
+
+    Returns:
+        set: The shingles. Texts shorter than size words are a single shingle.
+    """
+    words = WORD_PATTERN.findall(text.lower())
+    if len(words) <= size:
+        return {' '.join(words)} if words else set()
+    return {' '.join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def minhash(text):
+    """
+    Compute the MinHash signature of a text. The share of equal positions in two
+    signatures estimates the Jaccard similarity of the shingle sets of the texts.
+
+    Parameters:
+        text (str): The text.
+
+    Returns:
+        numpy.ndarray: NUM_PERM uint32 values.
+    """
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=4).digest(), 'little')
+         for shingle in shingles(text)),
+        dtype=np.uint64,
+    )
+    if not hashes.size:
+        return np.full(NUM_PERM, PRIME, dtype=np.uint32)
+    # a * x + b stays below 2**64 as a, b < 2**31 and x < 2**32
+    return ((np.outer(hashes, HASH_A) + HASH_B) % PRIME).min(axis=0).astype(np.uint32)
+
+
+def similarity(signature, other):
+    return float(np.mean(signature == other))
+
+
+def band_keys(signature):
+    # One bucket key per band; articles sharing any bucket are duplicate candidates
+    return [(band, hashlib.blake2b(rows.tobytes(), digest_size=8).digest())
+            for band, rows in enumerate(signature.reshape(BANDS, ROWS_PER_BAND))]
+
+
+class DuplicateIndex:
+    """
+    Locality-sensitive hashing index of the MinHash signatures of articles.
+
+    Each new article is looked up in BANDS buckets, so finding its near
+    duplicates costs the same whatever the size of the catalog. An article whose
+    best candidate is similar enough joins that candidate's cluster; otherwise
+    it starts its own, identified by its id. Signatures and clusters are stored
+    on Article, so the index is rebuilt from them without rehashing content, and
+    later rows are picked up incrementally.
+
+    Parameters:
+        threshold (float): The estimated Jaccard similarity from which two
+            articles are duplicates.
+    """
+
+    def __init__(self, threshold=DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._buckets = defaultdict(set)
+        self._signatures = {}
+        self._clusters = {}
+        self._max_id = 0
+        self._lock = threading.RLock()
+
+    def _add(self, article_id, signature, cluster_id):
+        self._signatures[article_id] = signature
+        self._clusters[article_id] = cluster_id
+        for key in band_keys(signature):
+            self._buckets[key].add(article_id)
+        self._max_id = max(self._max_id, article_id)
+
+    def _remove(self, article_id):
+        signature = self._signatures.pop(article_id, None)
+        self._clusters.pop(article_id, None)
+        if signature is None:
+            return
+        for key in band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(article_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def catch_up(self):
+        """
+        Add the signatures stored since the last call, e.g. by another process.
+        """
+        with self._lock:
+            query = db.session.query(Article.id, Article.cluster_id, Article.minhash) \
+                .filter(Article.id > self._max_id, Article.minhash.isnot(None)) \
+                .order_by(Article.id)
+            for article_id, cluster_id, signature in query.yield_per(5000):
+                self._add(article_id, np.frombuffer(signature, dtype=np.uint32), cluster_id or article_id)
+
+    def find_duplicate(self, signature, exclude=None):
+        """
+        Find the indexed article most similar to a signature.
+
+        Returns:
+            tuple: The id of the article and its estimated similarity, or None
+            when no candidate reaches the threshold.
+        """
+        candidates = set()
+        for key in band_keys(signature):
+            candidates |= self._buckets.get(key, set())
+        candidates.discard(exclude)
+
+        best = None
+        for candidate in candidates:
+            score = similarity(signature, self._signatures[candidate])
+            if score >= self.threshold and (best is None or score > best[1]):
+                best = (candidate, score)
+        return best
+
+    def assign(self, articles):
+        """
+        Sign articles, find their cluster and add them to the index. Articles
+        already indexed, i.e. whose content was updated, are re-clustered.
+
+        Parameters:
+            articles (iterable): (id, content) tuples.
+
+        Returns:
+            list: Dictionaries with the article_id, cluster and signature bytes
+            of each article, ready to be written to the Article table.
+        """
+        with self._lock:
+            self.catch_up()
+            assigned = []
+            for article_id, content in articles:
+                signature = minhash(content)
+                self._remove(article_id)
+                duplicate = self.find_duplicate(signature, exclude=article_id)
+                cluster_id = self._clusters[duplicate[0]] if duplicate else article_id
+                self._add(article_id, signature, cluster_id)
+                assigned.append({'article_id': article_id, 'cluster': cluster_id, 'signature': signature.tobytes()})
+            return assigned
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._signatures.clear()
+            self._clusters.clear()
+            self._max_id = 0
+
+
+def store_clusters(assigned):
+    """
+    Write the clusters and signatures returned by DuplicateIndex.assign().
+    """
+    if not assigned:
+        return
+    # Parameters named after the columns would be taken as their values by SQLAlchemy
+    statement = update(Article).where(Article.id == bindparam('article_id')) \
+        .values(cluster_id=bindparam('cluster'), minhash=bindparam('signature'))
+    db.session.execute(statement, assigned)
+
+
+def duplicate_clusters(article_ids=None):
+    """
+    Map every article that duplicates another to the id of its cluster. Articles
+    missing from the map are alone in their cluster.
+
+    Parameters:
+        article_ids (iterable): Only map these articles, e.g. the candidates of
+            one recommendation, rather than the whole catalog.
+
+    Returns:
+        dict: Article ids to cluster ids.
+    """
+    query = db.session.query(Article.id, Article.cluster_id) \
+        .filter(Article.cluster_id.isnot(None), Article.cluster_id != Article.id)
+    if article_ids is not None:
+        article_ids = list(article_ids)
+        if not article_ids:
+            return {}
+        query = query.filter(Article.id.in_(article_ids))
+    return dict(query)
+
+
+def collapse_duplicates(article_ids, clusters, k):
+    """
+    Keep the first article of each cluster from a ranking.
+
+    Parameters:
+        article_ids (iterable): Article ids, best first.
+        clusters (dict): Article ids to cluster ids, as from duplicate_clusters().
+        k (int): The number of articles to keep.
+
+    Returns:
+        list: The positions of the kept articles in article_ids.
+    """
+    seen, kept = set(), []
+    for position, article_id in enumerate(article_ids):
+        cluster_id = clusters.get(article_id, article_id)
+        if cluster_id in seen:
+            continue
+        seen.add(cluster_id)
+        kept.append(position)
+        if len(kept) == k:
+            break
+    return kept
+
+
+duplicate_index = DuplicateIndex()
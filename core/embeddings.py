@@ -0,0 +1,291 @@
+import fcntl
+import os
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+from flask import current_app
+from scipy.sparse.linalg import svds
+from core.artifacts import ArtifactLoader, StringTable, artifact_store, string_arrays
+from core.recommender import TfidfVectorizer
+
+EMBEDDING_DIM = 128
+# Inverted lists scanned per query; more is slower and closer to exact search
+NPROBE = 8
+
+ARTIFACT = 'embeddings'
+# Rows embedded since the last build are appended to these raw files in the directory of the current version
+APPENDED_VECTORS_FILE = 'appended.f32'
+APPENDED_IDS_FILE = 'appended.i64'
+
+
+def normalize_vectors(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (vectors / norms).astype(np.float32)
+
+
+class LsaModel:
+    """
+    Latent semantic analysis: a truncated SVD of the TF-IDF matrix of the corpus,
+    mapping every article to a dense unit vector. New articles are folded in by
+    projecting their TF-IDF vector on the same components, without refitting.
+
+    Parameters:
+        dim (int): The number of dimensions of the vectors.
+    """
+
+    def __init__(self, dim=EMBEDDING_DIM):
+        self.dim = dim
+        self.vectorizer = TfidfVectorizer()
+        self.components = None
+
+    def fit_transform(self, documents):
+        matrix = self.vectorizer.fit_transform(documents)
+        dim = max(1, min(self.dim, min(matrix.shape) - 1))
+        left, singular, right = svds(matrix, k=dim)
+        order = np.argsort(-singular)
+        self.components = np.ascontiguousarray(right[order], dtype=np.float32)
+        return normalize_vectors(left[:, order] * singular[order])
+
+    def transform(self, documents):
+        return normalize_vectors(np.asarray(self.vectorizer.transform(documents) @ self.components.T))
+
+    def to_arrays(self):
+        terms = sorted(self.vectorizer.vocabulary, key=self.vectorizer.vocabulary.get)
+        return dict(string_arrays('vocabulary', terms), components=self.components, idf=self.vectorizer.idf)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        model = cls()
+        model.components = arrays['components']
+        model.dim = model.components.shape[0]
+        model.vectorizer.idf = arrays['idf']
+        model.vectorizer.vocabulary = {term: index for index, term in enumerate(StringTable(arrays, 'vocabulary'))}
+        return model
+
+
+def kmeans(vectors, n_clusters, iterations=10, sample_size=20000, seed=0):
+    """
+    Spherical k-means over unit vectors, trained on a sample.
+
+    Returns:
+        numpy.ndarray: The n_clusters x dim unit centroids.
+    """
+    rng = np.random.RandomState(seed)
+    sample = vectors[rng.choice(len(vectors), min(sample_size, len(vectors)), replace=False)]
+    centroids = sample[rng.choice(len(sample), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        filled = np.bincount(assignment, minlength=n_clusters) > 0
+        # Empty clusters keep their previous centroid
+        centroids[filled] = normalize_vectors(sums[filled])
+    return centroids
+
+
+def assign_lists(vectors, centroids, chunk_size=10000):
+    return np.concatenate([np.argmax(vectors[start:start + chunk_size] @ centroids.T, axis=1)
+                           for start in range(0, len(vectors), chunk_size)] or [np.empty(0, dtype=np.int64)])
+
+
+def build_index(store, article_ids, documents, dim=EMBEDDING_DIM):
+    """
+    Embed every article and publish the IVF index as a new version of the
+    'embeddings' artifact, which readers switch to on their next query.
+
+    Vectors are stored ordered by inverted list, so a probed list is a
+    contiguous slice of the memory-mapped array.
+
+    Parameters:
+        store (ArtifactStore): The store to publish to.
+        article_ids (list): The ids of the articles.
+        documents (list): The text of each article.
+        dim (int): The number of dimensions of the vectors.
+
+    Returns:
+        dict: The version, number of articles, dimensions and lists of the new index.
+    """
+    model = LsaModel(dim)
+    vectors = model.fit_transform(documents)
+    article_ids = np.asarray(article_ids, dtype=np.int64)
+
+    n_lists = max(1, min(int(np.sqrt(len(vectors))), len(vectors)))
+    centroids = kmeans(vectors, n_lists)
+    lists = assign_lists(vectors, centroids)
+    order = np.argsort(lists, kind='stable')
+    offsets = np.searchsorted(lists[order], np.arange(n_lists + 1))
+
+    ordered_ids = article_ids[order]
+    # Binary search over the ids of the base rows finds the vector of an article
+    by_id = np.argsort(ordered_ids, kind='stable')
+    arrays = dict(model.to_arrays(), vectors=vectors[order], ids=ordered_ids, centroids=centroids,
+                  offsets=offsets.astype(np.int64), sorted_ids=ordered_ids[by_id], sorted_rows=by_id.astype(np.int64))
+    meta = {'dim': int(vectors.shape[1]), 'base_count': len(article_ids), 'lists': n_lists, 'built_at': time.time()}
+    return dict(meta, version=store.publish(ARTIFACT, arrays, meta))
+
+
+IndexState = namedtuple('IndexState', ['artifact', 'meta', 'centroids', 'offsets', 'vectors', 'ids',
+                                       'sorted_ids', 'sorted_rows'])
+
+
+def index_state(artifact):
+    arrays = artifact.arrays
+    # The centroids and offsets are read on every query and are small, so they are copied into memory
+    return IndexState(artifact, artifact.meta, np.array(arrays['centroids']), np.array(arrays['offsets']),
+                      arrays['vectors'], arrays['ids'], arrays['sorted_ids'], arrays['sorted_rows'])
+
+
+class EmbeddingIndex:
+    """
+    Read side of the embedding index, shared by every worker process.
+
+    The vectors are memory-mapped rather than loaded, so the OS keeps a single
+    copy in the page cache for all processes. Queries probe the NPROBE inverted
+    lists whose centroids are closest, then scan the rows appended since the
+    last build, which add() writes as new articles are ingested.
+    """
+
+    def __init__(self, nprobe=NPROBE):
+        self.nprobe = nprobe
+        self.store = None
+        self._loader = ArtifactLoader(ARTIFACT, index_state)
+        self._appended = None
+        self._model = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.store = artifact_store(app)
+        self.nprobe = app.config.get('EMBEDDINGS_NPROBE', self.nprobe)
+
+    def _open(self):
+        # Remaps the appended rows when their file grew, or when a rebuild published a new version
+        state = self._loader.get(self.store or artifact_store(current_app))
+        if state is None:
+            return None
+        path = state.artifact.path
+        try:
+            count = os.path.getsize(os.path.join(path, APPENDED_IDS_FILE)) // 8
+        except FileNotFoundError:
+            count = 0
+        with self._lock:
+            appended = self._appended
+            if appended is None or appended[0] is not state or len(appended[2]) != count:
+                if count:
+                    vectors = np.memmap(os.path.join(path, APPENDED_VECTORS_FILE), dtype=np.float32, mode='r',
+                                        shape=(count, state.meta['dim']))
+                    ids = np.memmap(os.path.join(path, APPENDED_IDS_FILE), dtype=np.int64, mode='r', shape=(count,))
+                else:
+                    vectors, ids = np.empty((0, state.meta['dim']), dtype=np.float32), np.empty(0, dtype=np.int64)
+                appended = self._appended = (state, vectors, ids)
+            return appended
+
+    @property
+    def available(self):
+        return self._open() is not None
+
+    def _vector_of(self, state, appended_vectors, appended_ids, article_id):
+        # Appended rows win, as they hold the newest content
+        appended = np.flatnonzero(appended_ids == article_id)
+        if appended.size:
+            return np.asarray(appended_vectors[appended[-1]])
+        position = np.searchsorted(state.sorted_ids, article_id)
+        if position < len(state.sorted_ids) and state.sorted_ids[position] == article_id:
+            return np.asarray(state.vectors[state.sorted_rows[position]])
+        return None
+
+    def vector(self, article_id):
+        opened = self._open()
+        if opened is None:
+            return None
+        return self._vector_of(*opened, article_id)
+
+    def search(self, vector, k=10, exclude=()):
+        """
+        Find the articles whose vectors are closest to a unit vector.
+
+        Parameters:
+            vector (numpy.ndarray): The query vector.
+            k (int): The number of articles to return.
+            exclude (iterable): Article ids to leave out.
+
+        Returns:
+            list: (article_id, cosine similarity) tuples, most similar first.
+        """
+        opened = self._open()
+        if opened is None:
+            return []
+        state, appended_vectors, appended_ids = opened
+        probed = np.argsort(-(state.centroids @ vector))[:self.nprobe]
+        rows = np.concatenate([np.arange(state.offsets[l], state.offsets[l + 1]) for l in probed])
+        ids = np.concatenate([state.ids[rows], appended_ids])
+        if not ids.size:
+            return []
+        scores = np.concatenate([state.vectors[rows] @ vector, appended_vectors @ vector])
+        exclude = set(exclude)
+        wanted = min(len(ids), k + len(exclude) + 16)
+        top = np.argpartition(-scores, wanted - 1)[:wanted]
+        results, seen = [], set()
+        for position in top[np.argsort(-scores[top])]:
+            article_id = int(ids[position])
+            if article_id in exclude or article_id in seen:
+                continue
+            seen.add(article_id)
+            results.append((article_id, float(scores[position])))
+            if len(results) == k:
+                break
+        return results
+
+    def more_like_this(self, article_id, k=5):
+        vector = self.vector(article_id)
+        if vector is None:
+            return []
+        return self.search(vector, k, exclude=[article_id])
+
+    def recommend(self, weights, k=10):
+        """
+        Recommend articles close to the weighted mean vector of a user's history.
+
+        Parameters:
+            weights (dict): Article ids to profile weights, as from
+                ContentRecommender.build_profiles().
+
+        Returns:
+            list: (article_id, cosine similarity) tuples, unseen articles only.
+        """
+        vectors = [(weight, self.vector(article_id)) for article_id, weight in weights.items()]
+        vectors = [weight * vector for weight, vector in vectors if vector is not None]
+        if not vectors:
+            return []
+        profile = normalize_vectors(np.sum(vectors, axis=0)[None, :])[0]
+        return self.search(profile, k, exclude=weights)
+
+    def add(self, articles):
+        """
+        Embed new or updated articles and append them to the index, where every
+        process sees them on its next query. A no-op until the index is built.
+
+        Parameters:
+            articles (list): (id, text) tuples, the text being the title and content as in build_index().
+        """
+        opened = self._open()
+        if opened is None or not articles:
+            return
+        state = opened[0]
+        with self._lock:
+            if self._model is None or self._model[0] is not state:
+                self._model = (state, LsaModel.from_arrays(state.artifact.arrays))
+            model = self._model[1]
+        vectors = model.transform([text for _, text in articles])
+        path = state.artifact.path
+        with open(os.path.join(path, 'append.lock'), 'w') as lock:
+            # Writers append under an exclusive lock; vectors go first so readers never see an id without one
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(os.path.join(path, APPENDED_VECTORS_FILE), 'ab') as f:
+                f.write(vectors.tobytes())
+            with open(os.path.join(path, APPENDED_IDS_FILE), 'ab') as f:
+                f.write(np.asarray([article_id for article_id, _ in articles], dtype=np.int64).tobytes())
+
+
+embedding_index = EmbeddingIndex()
@@ -0,0 +1,232 @@
+import atexit
+import os
+import queue
+import threading
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import bindparam, update
+from sqlalchemy.dialects.postgresql import insert
+from core.extensions import db
+from core.models import Article, Interaction, User, viewed_article
+from core.popularity import popularity_ranking
+
+COUNTERS = ('views', 'likes', 'dislikes', 'shares', 'saves')
+ENGAGEMENT_COUNTERS = ('likes', 'dislikes', 'shares', 'saves')
+# Flushes in a row a failed batch is retried in before its events are dropped
+MAX_FLUSH_ATTEMPTS = 5
+
+
+class EventQueue:
+    """
+    Write-behind pipeline for article views and engagement.
+
+    Requests only append events to an in-process queue. A background thread
+    wakes up every EVENT_FLUSH_SECONDS, coalesces what accumulated into one
+    counter UPDATE per article (views = views + n, ...), one bulk Interaction
+    INSERT and one viewed_article upsert, and commits them in a single
+    transaction. Hot articles then take one row lock per flush instead of one
+    per page view.
+
+    Parameters:
+        flush_interval (float): The seconds between two flushes.
+        max_size (int): Events beyond this many pending ones are dropped rather
+            than slowing requests down.
+    """
+
+    def __init__(self, flush_interval=5.0, max_size=100000):
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.app = None
+        self.dropped = 0
+        self.failed_flushes = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._wake = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        self.flush_interval = app.config.get('EVENT_FLUSH_SECONDS', self.flush_interval)
+        atexit.register(self.stop)
+
+    def _ensure_worker(self):
+        # Started lazily, and again after a fork, so pre-forking servers get one worker per process
+        if self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._thread = threading.Thread(target=self._run, name='event-flush', daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def _put(self, event):
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def record_view(self, article_id, user_id=None):
+        """
+        Count a page view, and remember that the user viewed the article.
+
+        Parameters:
+            article_id (int): The id of the viewed article.
+            user_id (int): The id of the viewer, or None for anonymous visitors.
+        """
+        self._put(('counter', article_id, 'views', user_id))
+
+    def record_engagement(self, article_id, counter):
+        """
+        Count a like, dislike, share or save.
+
+        Parameters:
+            article_id (int): The id of the article.
+            counter (str): One of likes, dislikes, shares or saves.
+        """
+        if counter not in ENGAGEMENT_COUNTERS:
+            raise ValueError(f'Unknown engagement counter: {counter}')
+        self._put(('counter', article_id, counter, None))
+
+    def record_interaction(self, user_id, article_id, read_time, scroll_depth=0.0, rating=None):
+        """
+        Queue an Interaction row, e.g. when a reader leaves an article.
+
+        Parameters:
+            user_id (int): The id of the reader.
+            article_id (int): The id of the article.
+            read_time (int): Seconds spent on the article.
+            scroll_depth (float): Fraction of the article scrolled.
+            rating (int): Optional 1-5 rating.
+        """
+        if rating is not None and (rating < 1 or rating > 5):
+            raise ValueError('Rating must be between 1 and 5')
+        self._put(('interaction', {
+            'user_id': user_id,
+            'article_id': article_id,
+            'read_time': read_time,
+            'scroll_depth': scroll_depth,
+            'rating': rating,
+            'last_interaction_time': datetime.utcnow(),
+        }))
+
+    def _requeue(self, events):
+        # Put a failed batch back for the next flush, unless it already failed MAX_FLUSH_ATTEMPTS times in a row
+        self.failed_flushes += 1
+        if self.failed_flushes >= MAX_FLUSH_ATTEMPTS:
+            print(f"Dropping {len(events)} events after {self.failed_flushes} failed flushes")
+            self.dropped += len(events)
+            self.failed_flushes = 0
+            return
+        for event in events:
+            try:
+                self._queue.put_nowait(event)
+            except queue.Full:
+                self.dropped += 1
+
+    def _drain(self):
+        events = []
+        while True:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                return events
+
+    def flush(self):
+        """
+        Write every pending event to the database in one transaction. Events
+        of articles or users that do not exist are left out; when the write
+        fails anyway, the batch is queued again for the next flush.
+
+        Returns:
+            int: The number of events written.
+        """
+        events = self._drain()
+        if not events:
+            return 0
+
+        counters = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+        interactions, viewed = [], set()
+        for event in events:
+            if event[0] == 'counter':
+                _, article_id, counter, user_id = event
+                counters[article_id][counter] += 1
+                if user_id is not None:
+                    viewed.add((user_id, article_id))
+            else:
+                interactions.append(event[1])
+
+        with self.app.app_context():
+            try:
+                # Events for deleted or made-up article or user ids would otherwise fail the whole batch on
+                # foreign keys, or push ids without an article into the popularity ranking
+                referenced = ({row['article_id'] for row in interactions} | {article_id for _, article_id in viewed}
+                              | set(counters))
+                existing = {article_id for (article_id,) in
+                            db.session.query(Article.id).filter(Article.id.in_(referenced))}
+                referenced_users = {row['user_id'] for row in interactions} | {user_id for user_id, _ in viewed}
+                existing_users = {user_id for (user_id,) in
+                                  db.session.query(User.id).filter(User.id.in_(referenced_users))}
+                interactions = [row for row in interactions
+                                if row['article_id'] in existing and row['user_id'] in existing_users]
+                viewed = {pair for pair in viewed if pair[1] in existing and pair[0] in existing_users}
+                counters = {article_id: increments for article_id, increments in counters.items()
+                            if article_id in existing}
+                if counters:
+                    statement = update(Article).where(Article.id == bindparam('article_id')).values(
+                        {getattr(Article, name): getattr(Article, name) + bindparam('add_' + name) for name in COUNTERS})
+                    # Sorted by id so concurrent flushes from several workers lock rows in the same order
+                    # Parameters named after the columns would overwrite them instead of being added
+                    db.session.execute(statement, [
+                        dict({'add_' + name: n for name, n in increments.items()}, article_id=article_id)
+                        for article_id, increments in sorted(counters.items())
+                    ])
+                if interactions:
+                    db.session.execute(Interaction.__table__.insert(), interactions)
+                if viewed:
+                    inserted = db.session.execute(insert(viewed_article).values(
+                        [{'user_id': user_id, 'article_id': article_id} for user_id, article_id in sorted(viewed)]
+                    ).on_conflict_do_nothing().returning(viewed_article.c.user_id))
+                    # Only articles viewed for the first time change what the user is recommended
+                    viewers = sorted({user_id for (user_id,) in inserted})
+                    if viewers:
+                        db.session.execute(update(User).where(User.id.in_(viewers))
+                                           .values(signals_changed_at=datetime.utcnow()))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                self._requeue(events)
+                raise
+        self.failed_flushes = 0
+
+        for article_id, increments in counters.items():
+            popularity_ranking.record(article_id, **increments)
+        for row in interactions:
+            popularity_ranking.record(row['article_id'], interaction=1, rating=row['rating'],
+                                      when=row['last_interaction_time'])
+        return len(events)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            stopping = self._wake.is_set()
+            try:
+                self.flush()
+            except Exception as e:
+                print("Event flush failed:", e)
+            if stopping:
+                return
+
+    def stop(self):
+        """
+        Flush what is still pending and stop the background thread.
+        """
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._wake.set()
+            self._thread.join(timeout=self.flush_interval + 5)
+
+
+event_queue = EventQueue()
@@ -0,0 +1,129 @@
+from collections import namedtuple
+from sqlalchemy import literal_column
+from sqlalchemy.dialects.postgresql import insert
+from core.cache import article_cache
+from core.dedup import duplicate_index, store_clusters
+from core.embeddings import embedding_index
+from core.extensions import db
+from core.metrics import metrics
+from core.models import Article
+from core.sentiment import sentiment_service
+from core.text import summarize
+
+# Rows per INSERT statement; keeps statements well below Postgres' bind parameter limit
+BATCH_SIZE = 500
+
+IngestResult = namedtuple('IngestResult', ['inserted', 'updated', 'skipped', 'duplicates', 'article_ids'])
+
+
+def prepare_rows(articles, category):
+    """
+    Turn scraper output into Article rows, scoring the sentiment of each body.
+
+    Parameters:
+        articles (dict): Article URLs to (heading, content) tuples, as returned by the scrapers.
+        category (str): The category stored on every article.
+
+    Returns:
+        list: A list of dictionaries of Article column values, one per URL.
+    """
+    rows = []
+    for url, (heading, content) in articles.items():
+        if not heading or not content:
+            continue
+        rows.append({
+            'title': heading[:256],
+            'url': url,
+            'content': content,
+            'summary': summarize(content),
+            'category': category,
+        })
+
+    # Unchanged articles scraped again are answered from the cache instead of being re-scored
+    with metrics.span('ingest.sentiment'):
+        scores = sentiment_service.score_many([row['content'] for row in rows])
+    for row, (polarity, subjectivity) in zip(rows, scores):
+        row['polarity'] = polarity
+        row['subjectivity'] = subjectivity
+    return rows
+
+
+def upsert_rows(rows, update=True):
+    """
+    Write Article rows with one INSERT ... ON CONFLICT (url) statement per batch.
+
+    Parameters:
+        rows (list): Dictionaries of Article column values.
+        update (bool): Overwrite title, content, summary and sentiment of existing URLs whose
+            content changed. When False, existing URLs are left untouched.
+
+    Returns:
+        tuple: The number of inserted and updated rows, and the (id, url) of both.
+    """
+    table = Article.__table__
+    inserted = updated = 0
+    changed = []
+    for start in range(0, len(rows), BATCH_SIZE):
+        statement = insert(table).values(rows[start:start + BATCH_SIZE])
+        if update:
+            statement = statement.on_conflict_do_update(
+                index_elements=[table.c.url],
+                set_={name: statement.excluded[name] for name in ('title', 'content', 'summary', 'polarity', 'subjectivity')},
+                # Unchanged articles are not rewritten, and are not returned below
+                where=table.c.content.is_distinct_from(statement.excluded.content),
+            )
+        else:
+            statement = statement.on_conflict_do_nothing(index_elements=[table.c.url])
+        # xmax is 0 for freshly inserted row versions and non-zero for updated ones
+        statement = statement.returning(table.c.id, table.c.url, literal_column('xmax = 0').label('inserted'))
+
+        for article_id, url, was_inserted in db.session.execute(statement):
+            changed.append((article_id, url))
+            if was_inserted:
+                inserted += 1
+            else:
+                updated += 1
+    return inserted, updated, changed
+
+
+def ingest_articles(articles, category, update=True):
+    """
+    Score and store a batch of scraped articles. Running it twice on the same
+    batch is a no-op the second time.
+
+    Parameters:
+        articles (dict): Article URLs to (heading, content) tuples, as returned by the scrapers.
+        category (str): The category stored on every article.
+        update (bool): Refresh existing articles whose content changed.
+
+    Returns:
+        IngestResult: How many articles were inserted, updated and skipped, how
+        many of those are near duplicates of existing ones, and the ids of the
+        inserted and updated ones.
+    """
+    rows = prepare_rows(articles, category)
+    content = {row['url']: row['content'] for row in rows}
+    # Embedded like build_index() embeds the whole catalog, title first
+    documents = {row['url']: row['title'] + ' ' + row['content'] for row in rows}
+    try:
+        with metrics.span('ingest.upsert'):
+            inserted, updated, changed = upsert_rows(rows, update=update)
+        # Syndicated copies get a different URL, so near duplicates are clustered by content
+        with metrics.span('ingest.dedup'):
+            assigned = duplicate_index.assign((article_id, content[url]) for article_id, url in changed)
+            store_clusters(assigned)
+        with metrics.span('ingest.commit'):
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        # The index may hold articles that were not stored; rebuild it on next use
+        duplicate_index.clear()
+        raise
+    article_ids = [article_id for article_id, _ in changed]
+    # Changed articles are embedded right away, so they show up in "more like this" before the next rebuild
+    with metrics.span('ingest.embeddings'):
+        embedding_index.add([(article_id, documents[url]) for article_id, url in changed])
+    duplicates = sum(1 for row in assigned if row['cluster'] != row['article_id'])
+    # Only changed rows are returned by the upsert, so unchanged articles stay cached
+    article_cache.invalidate(article_ids)
+    return IngestResult(inserted, updated, len(articles) - inserted - updated, duplicates, article_ids)
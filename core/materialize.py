@@ -0,0 +1,148 @@
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+from sqlalchemy import func, or_, select, update
+from core.extensions import db
+from core.models import Article, Interaction, User, favorite_article, viewed_article, recommendation
+from core.collaborative import collaborative_recommender
+from core.dedup import collapse_duplicates, duplicate_clusters
+from core.recommender import content_recommender, pick_top_k
+
+# Share of the collaborative-filtering score in the blended ranking, when a trained model exists
+COLLABORATIVE_WEIGHT = 0.5
+# Candidates picked per stored recommendation, so there are k left once near duplicates are collapsed
+DUPLICATE_OVERSAMPLE = 2
+
+MaterializeResult = namedtuple('MaterializeResult', ['users', 'recommendations'])
+
+
+def blend_scores(content_scores, collaborative_scores, weight=COLLABORATIVE_WEIGHT):
+    """
+    Mix content and collaborative-filtering scores of a batch of users.
+
+    Collaborative scores are unbounded sums of similarities, so each user's row
+    is scaled to [0, 1] by its maximum before mixing it with the cosine scores.
+    Articles excluded by either model stay at -inf.
+
+    Returns:
+        numpy.ndarray: The blended users x articles scores.
+    """
+    finite = np.where(np.isfinite(collaborative_scores), collaborative_scores, 0.0)
+    peak = finite.max(axis=1, keepdims=True)
+    peak[peak <= 0] = 1.0
+    blended = (1.0 - weight) * content_scores + weight * (finite / peak)
+    blended[np.isneginf(collaborative_scores)] = -np.inf
+    return blended
+
+
+def active_user_ids():
+    """
+    Find every user with at least one favorite, view or interaction.
+
+    Returns:
+        list: The sorted user ids.
+    """
+    query = db.session.query(favorite_article.c.user_id) \
+        .union(db.session.query(viewed_article.c.user_id)) \
+        .union(db.session.query(Interaction.user_id))
+    return sorted(user_id for (user_id,) in query)
+
+
+def stale_user_ids():
+    """
+    Find the users whose recommendations are out of date: those the job never
+    scored that have some history, and those with interactions, favorites or
+    views newer than their last run. A run is recorded even when it found no
+    recommendations, so such users are not scored again until something changes.
+
+    Returns:
+        list: The sorted user ids.
+    """
+    with_new_interactions = db.session.query(Interaction.user_id) \
+        .join(User, User.id == Interaction.user_id) \
+        .filter(or_(User.recommended_at.is_(None), Interaction.last_interaction_time > User.recommended_at))
+    with_new_signals = db.session.query(User.id) \
+        .filter(User.signals_changed_at.isnot(None)) \
+        .filter(or_(User.recommended_at.is_(None), User.signals_changed_at > User.recommended_at))
+    query = with_new_interactions.union(with_new_signals)
+    return sorted(user_id for (user_id,) in query)
+
+
+def refresh_recommendation_counts(article_ids):
+    """
+    Set Article.recommendation_count to the number of users each article is
+    currently recommended to.
+
+    Parameters:
+        article_ids (iterable): The ids of the articles whose count may have changed.
+    """
+    article_ids = list(article_ids)
+    if not article_ids:
+        return
+    count = select(func.count()).where(recommendation.c.article_id == Article.id).scalar_subquery()
+    db.session.query(Article).filter(Article.id.in_(article_ids)) \
+        .update({Article.recommendation_count: count}, synchronize_session=False)
+
+
+def materialize_recommendations(k=20, chunk_size=256, full=False):
+    """
+    Precompute the top-k recommendations of users into the recommendation table.
+
+    Users are scored in vectorized chunks against the published content model,
+    refitted only when the catalog changed, blended with the collaborative-
+    filtering model when one has been trained, and collapsed to one article per
+    near-duplicate cluster. The rows of each chunk are replaced with one DELETE
+    and one bulk INSERT, so a crash leaves every user with either their old or
+    their new recommendations.
+
+    Parameters:
+        k (int): The number of recommendations stored per user.
+        chunk_size (int): The number of users scored at once. Memory use grows with
+            chunk_size times the number of articles.
+        full (bool): Recompute every active user. By default only users with new
+            interactions, favorites or views since their last run, or never run, are.
+
+    Returns:
+        MaterializeResult: The number of users refreshed and of rows written.
+    """
+    content_recommender.fit_if_changed()
+    corpus = content_recommender.corpus
+    collaborative_model = collaborative_recommender.get_model()
+    clusters = duplicate_clusters()
+    user_ids = active_user_ids() if full else stale_user_ids()
+    now = datetime.utcnow()
+
+    written = 0
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        profiles = content_recommender.build_profiles(chunk)
+        weights = content_recommender.weight_matrix(corpus, profiles, chunk)
+        scores = content_recommender.score_profiles(corpus, weights)
+        if collaborative_model is not None:
+            scores = blend_scores(scores, collaborative_model.score_users(chunk, corpus.article_ids))
+        rows, scores = pick_top_k(scores, k * DUPLICATE_OVERSAMPLE)
+
+        new_rows = []
+        for user, user_id in enumerate(chunk):
+            valid = np.isfinite(scores[user])
+            picked_ids = corpus.article_ids[rows[user, valid]]
+            # Only the best article of each near-duplicate cluster is recommended
+            for pick in collapse_duplicates(picked_ids.tolist(), clusters, k):
+                new_rows.append({
+                    'user_id': user_id,
+                    'article_id': int(picked_ids[pick]),
+                    'recommended_on': now,
+                    'score': float(scores[user, valid][pick]),
+                })
+        old_article_ids = {article_id for (article_id,) in db.session.query(recommendation.c.article_id)
+                           .filter(recommendation.c.user_id.in_(chunk))}
+
+        db.session.execute(recommendation.delete().where(recommendation.c.user_id.in_(chunk)))
+        if new_rows:
+            db.session.execute(recommendation.insert(), new_rows)
+        refresh_recommendation_counts(old_article_ids | {row['article_id'] for row in new_rows})
+        db.session.execute(update(User).where(User.id.in_(chunk)).values(recommended_at=now))
+        db.session.commit()
+        written += len(new_rows)
+
+    return MaterializeResult(len(user_ids), written)
@@ -0,0 +1,325 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from flask import Response, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds of the latency histograms, in seconds
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Every metric with its type, help text and, for histograms, buckets
+METRICS = {
+    'elysian_app_start_seconds': ('gauge', 'Time create_app took in this process.', None),
+    'elysian_warmup_seconds': ('gauge', 'Time each warmup step took in this process.', None),
+    'elysian_requests_total': ('counter', 'Requests handled, by endpoint, method and status.', None),
+    'elysian_request_seconds': ('histogram', 'Time spent handling requests, by endpoint.', TIME_BUCKETS),
+    'elysian_request_queries': ('histogram', 'Database queries run per request, by endpoint.', COUNT_BUCKETS),
+    'elysian_query_seconds': ('histogram', 'Time spent in database queries.', TIME_BUCKETS),
+    'elysian_slow_queries_total': ('counter', 'Database queries slower than SLOW_QUERY_MS.', None),
+    'elysian_stage_seconds': ('histogram', 'Time spent in scraper and ingestion stages.', TIME_BUCKETS),
+    'elysian_cache_hits_total': ('counter', 'Cache hits, by cache.', None),
+    'elysian_cache_misses_total': ('counter', 'Cache misses, by cache.', None),
+    'elysian_cache_evictions_total': ('counter', 'Cache evictions, by cache.', None),
+    'elysian_cache_entries': ('gauge', 'Entries held by each cache.', None),
+    'elysian_db_pool_checked_out': ('gauge', 'Database connections currently checked out of the pool.', None),
+}
+
+# Stack samples are taken this often while a request is profiled
+PROFILE_INTERVAL = 0.005
+
+# What span() returns when metrics are disabled; nullcontext can be entered any number of times
+NO_SPAN = nullcontext()
+
+
+def label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler of one thread: a background thread records the stack
+    of the target thread every interval seconds. The result is in the collapsed
+    stack format of flamegraph.pl and speedscope.
+
+    Parameters:
+        thread_id (int): The ident of the thread to sample.
+        interval (float): The time between two samples, in seconds.
+    """
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        # Sampling starts right away, so even requests shorter than the interval get a sample
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        return self
+
+    def collapsed(self):
+        return ''.join(f'{stack} {count}\n' for stack, count in self.samples.most_common())
+
+
+class Metrics:
+    """
+    In-process counters, gauges and histograms, exported in the Prometheus text
+    format at /metrics.
+
+    Disabled by default: then no request hooks, engine listeners or collectors are
+    installed, and span() and the recording methods return right away, so the
+    instrumentation left in hot paths costs a function call. Set
+    METRICS_ENABLED=1 to turn it on. Each worker process keeps and exports its
+    own numbers.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_query_seconds = 0.5
+        self._values = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self._installed = False
+        self._app = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', False)
+        if not self.enabled:
+            return
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 500) / 1000
+        self.profiling = app.config.get('PROFILING_ENABLED', False)
+
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.add_url_rule('/metrics', 'metrics', self.metrics_view)
+        # The pool exported is the one of the latest app; a process normally creates a single one
+        self._app = app
+        if not self._installed:
+            from core.cache import article_cache, user_cache
+            from core.extensions import db
+            # Registered on the Engine class, so they cover every engine the process creates
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self.add_collector(cache_collector('article', article_cache))
+            self.add_collector(cache_collector('user', user_cache))
+            self.add_collector(pool_collector(lambda: db.get_engine(self._app)))
+            self._installed = True
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._values.setdefault(name, {})[label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        if not self.enabled:
+            return
+        buckets = METRICS[name][2]
+        key = label_key(labels)
+        with self._lock:
+            series = self._values.setdefault(name, {})
+            counts = series.get(key)
+            if counts is None:
+                # One count per bucket, then the sum and the count of the observations
+                counts = series[key] = [0] * len(buckets) + [0.0, 0]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[i] += 1
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def _span(self, stage, labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe('elysian_stage_seconds', time.perf_counter() - started, stage=stage, **labels)
+
+    def span(self, stage, **labels):
+        """
+        Time a block of code into elysian_stage_seconds.
+
+        Parameters:
+            stage (str): The name of the stage, e.g. scraper.fetch.
+            **labels: Extra labels, e.g. source.
+
+        Returns:
+            A context manager, a no-op one when metrics are disabled.
+        """
+        if not self.enabled:
+            return NO_SPAN
+        return self._span(stage, labels)
+
+    def add_collector(self, collect):
+        """
+        Register a function called on every export, returning (name, labels,
+        value) tuples read from elsewhere, e.g. the statistics of a cache.
+        """
+        self._collectors.append(collect)
+
+    def render(self):
+        """
+        Returns:
+            str: Every metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            # Histogram counts are lists updated in place, so they are copied too
+            values = {name: {key: list(value) if isinstance(value, list) else value for key, value in series.items()}
+                      for name, series in self._values.items()}
+        for collect in self._collectors:
+            try:
+                for name, labels, value in collect():
+                    values.setdefault(name, {})[label_key(labels)] = value
+            except Exception as e:
+                print("Metrics collector failed:", e)
+
+        lines = []
+        for name, (kind, help_text, buckets) in METRICS.items():
+            series = values.get(name)
+            if not series:
+                continue
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for key, value in sorted(series.items()):
+                if kind != 'histogram':
+                    lines.append(f'{name}{format_labels(key)} {value}')
+                    continue
+                for bound, count in zip(buckets, value):
+                    lines.append(f'{name}_bucket{format_labels(key, [("le", bound)])} {count}')
+                lines.append(f'{name}_bucket{format_labels(key, [("le", "+Inf")])} {value[-1]}')
+                lines.append(f'{name}_sum{format_labels(key)} {value[-2]}')
+                lines.append(f'{name}_count{format_labels(key)} {value[-1]}')
+        return '\n'.join(lines) + '\n'
+
+    def metrics_view(self):
+        return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_queries = 0
+        # ?_profile=1 samples the stacks of this request and returns them instead of the page
+        if self.profiling and request.args.get('_profile') == '1':
+            g.metrics_profiler = SamplingProfiler(threading.get_ident()).start()
+
+    def _after_request(self, response):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        self.observe('elysian_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+        self.observe('elysian_request_queries', g.pop('metrics_queries', 0), endpoint=endpoint)
+        self.inc('elysian_requests_total', endpoint=endpoint, method=request.method, status=response.status_code)
+
+        profiler = g.pop('metrics_profiler', None)
+        if profiler is not None:
+            return Response(profiler.stop().collapsed(), mimetype='text/plain')
+        return response
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_started'].pop()
+        elapsed = time.perf_counter() - started
+        self.observe('elysian_query_seconds', elapsed)
+        if has_request_context() and 'metrics_queries' in g:
+            g.metrics_queries += 1
+        if elapsed >= self.slow_query_seconds:
+            self.inc('elysian_slow_queries_total')
+            print(f"Slow query ({elapsed * 1000:.0f} ms): {' '.join(statement.split())[:500]}")
+
+    def serve(self, port, host='0.0.0.0'):
+        """
+        Export /metrics from a background HTTP server, for processes that are
+        not serving the app, e.g. the scraper.
+        """
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+
+def cache_collector(name, cache):
+    """
+    Export the stats() of an ArticleCache or UserCache.
+    """
+    def collect():
+        stats = cache.stats()
+        collected = [
+            ('elysian_cache_hits_total', {'cache': name}, stats['hits']),
+            ('elysian_cache_misses_total', {'cache': name}, stats['misses']),
+            ('elysian_cache_entries', {'cache': name}, stats['size']),
+        ]
+        # The user cache does not count its evictions
+        if 'evictions' in stats:
+            collected.append(('elysian_cache_evictions_total', {'cache': name}, stats['evictions']))
+        return collected
+    return collect
+
+
+def pool_collector(get_engine):
+    """
+    Export the connections checked out of the pool of the engine get_engine() returns.
+    """
+    def collect():
+        checked_out = getattr(get_engine().pool, 'checkedout', None)
+        return [('elysian_db_pool_checked_out', {}, checked_out())] if checked_out else []
+    return collect
+
+
+metrics = Metrics()
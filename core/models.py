@@ -1,15 +1,24 @@
 from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import DDL, event, func, literal, select, union_all
+from flask_sqlalchemy import Pagination
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import validates
-from textblob import TextBlob
+from flask_login import UserMixin
 from datetime import datetime
 from core.extensions import db
+from core.sentiment import sentiment_service
+from core.text import summarize
 
-class User(db.Model):
+class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False, index=True)
     email = db.Column(db.String(128), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(128), nullable=False)
+    # When a favorite or view of the user was last added or removed, and when the materialization job
+    # last scored the user, whether or not it found recommendations; see core/materialize.py
+    signals_changed_at = db.Column(db.DateTime, nullable=True)
+    recommended_at = db.Column(db.DateTime, nullable=True)
 
     __table_args__ = (
         db.UniqueConstraint('username', 'email', name='unique_username_email'),
@@ -32,18 +41,74 @@ class User(db.Model):
         return check_password_hash(self.password_hash, password)
 
     @classmethod
-    def does_user_exist(username):
-        return db.query.filter_by(username=username).first() is not None
+    def does_user_exist(cls, username):
+        return db.session.query(cls.query.filter_by(username=username).exists()).scalar()
     
     @classmethod
-    def does_email_exist(email):
-        return db.query.filter_by(email=email).first() is not None
+    def does_email_exist(cls, email):
+        return db.session.query(cls.query.filter_by(email=email).exists()).scalar()
+
+    # The article lists shown on the profile page, by the name used in its URLs
+    PROFILE_LISTS = ('favorited', 'viewed', 'shared')
+
+    @staticmethod
+    def _profile_list_table(name):
+        return {'favorited': favorite_article, 'viewed': viewed_article, 'shared': shared_article}[name]
+
+    def get_profile_list(self, name, page=1, per_page=20):
+        # A page of (id, title, summary) rows; article bodies never leave the database.
+        # Distinct, as an article shared on several platforms has a shared_article row for each.
+        table = User._profile_list_table(name)
+        return db.session.query(Article.id, Article.title, Article.summary) \
+            .join(table, table.c.article_id == Article.id) \
+            .filter(table.c.user_id == self.id) \
+            .distinct() \
+            .order_by(Article.id.desc()) \
+            .paginate(page=page, per_page=per_page, error_out=False)
+
+    def get_favorited_articles(self, page=1, per_page=20):
+        return self.get_profile_list('favorited', page, per_page)
+
+    def get_viewed_articles(self, page=1, per_page=20):
+        return self.get_profile_list('viewed', page, per_page)
+
+    def get_shared_articles(self, page=1, per_page=20):
+        return self.get_profile_list('shared', page, per_page)
+
+    def get_profile_lists(self, per_page=20):
+        # The first page of every list and their totals in a single query, instead of a count and a select per list.
+        # Window functions run before DISTINCT, so the articles of each list are made distinct in a subquery first.
+        article_ids = [
+            select(table.c.article_id).where(table.c.user_id == self.id).distinct().subquery()
+            for table in (User._profile_list_table(name) for name in User.PROFILE_LISTS)
+        ]
+        ranked = union_all(*[
+            select(literal(name).label('list'),
+                   articles.c.article_id,
+                   func.row_number().over(order_by=articles.c.article_id.desc()).label('position'),
+                   func.count().over().label('total'))
+            for name, articles in zip(User.PROFILE_LISTS, article_ids)
+        ]).subquery()
+        rows = db.session.query(ranked.c.list, ranked.c.total, Article.id, Article.title,
+                                Article.summary) \
+            .join(Article, Article.id == ranked.c.article_id) \
+            .filter(ranked.c.position <= per_page) \
+            .order_by(ranked.c.list, ranked.c.position).all()
+
+        lists = {}
+        for name in User.PROFILE_LISTS:
+            items = [row for row in rows if row.list == name]
+            lists[name] = Pagination(None, 1, per_page, items[0].total if items else 0, items)
+        return lists
 
 class Article(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(256), nullable=False, index=True)
     url = db.Column(db.String(512), nullable=False, unique=True)
-    content = db.Column(db.Text, nullable=False)
+    # Deferred: list pages only need the summary, the detail route loads content explicitly
+    content = db.deferred(db.Column(db.Text, nullable=False))
+    # Plain-text excerpt of content, kept in sync by _summarize_content and by ingestion
+    summary = db.Column(db.String(300), nullable=True)
     category = db.Column(db.String(64), nullable=False, index=True)
     polarity = db.Column(db.Float, nullable=False)
     subjectivity = db.Column(db.Float, nullable=False)
@@ -55,58 +120,107 @@ class Article(db.Model):
     views = db.Column(db.Integer, nullable=False, default=100)
     saves = db.Column(db.Integer, nullable=False, default=10)
     recommendation_count = db.Column(db.Integer, nullable=False, default=0)
-    
+    # When the article was first stored; articles nobody interacted with decay in popularity from then
+    created_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow)
+    # Near-duplicate cluster, the id of its first article, and the MinHash signature it was found with, see core/dedup.py
+    cluster_id = db.Column(db.Integer, nullable=True, index=True)
+    minhash = db.deferred(db.Column(db.LargeBinary, nullable=True))
+    # Maintained by a database trigger from title (weight A) and content (weight B), see migrations
+    search_vector = db.deferred(db.Column(TSVECTOR().with_variant(db.Text(), 'sqlite'), nullable=True))
+
+    __table_args__ = (
+        db.Index('ix_article_search_vector', 'search_vector', postgresql_using='gin'),
+    )
+
     recommendations = db.relationship('User', secondary='recommendation', backref='recommended_articles')
     comments = db.relationship('Comment', backref='article')
 
     def calculate_sentiment(self):
-        blob = TextBlob(self.content)
-        self.polarity = blob.sentiment.polarity
-        self.subjectivity = blob.sentiment.subjectivity
+        self.polarity, self.subjectivity = sentiment_service.score(self.content)
+
+    @validates('content')
+    def _summarize_content(self, key, content):
+        self.summary = summarize(content)
+        return content
     
     @staticmethod
-    def get_recommended_articles(user):
-        # Replace with actual business logic later
-        dummy_articles = [
-            {
-                'id': 1,
-                'title': 'Recommended Article 1',
-                'summary': 'This is a summary of the recommended article 1.',
-            },
-            {
-                'id': 2,
-                'title': 'Recommended Article 2',
-                'summary': 'This is a summary of the recommended article 2.',
-            },
-            {
-                'id': 3,
-                'title': 'Recommended Article 3',
-                'summary': 'This is a summary of the recommended article 3.',
-            }
-        ]
-        return dummy_articles
+    def get_recommended_articles(user, limit=10):
+        # Every source returns dictionaries with the id, title and summary of each article, best first
+        from core.dedup import collapse_duplicates, duplicate_clusters
+        from core.embeddings import embedding_index
+        from core.recommender import content_recommender
+
+        # Precomputed by the materialization job, see core/materialize.py
+        recommended_articles = db.session.query(Article.id, Article.title, Article.summary) \
+            .join(recommendation, recommendation.c.article_id == Article.id) \
+            .filter(recommendation.c.user_id == user.id) \
+            .order_by(recommendation.c.score.desc()) \
+            .limit(limit).all()
+        if recommended_articles:
+            return [{'id': row.id, 'title': row.title, 'summary': row.summary} for row in recommended_articles]
+
+        # Users the job has not reached yet are scored live, on the dense embedding index once it is built
+        if embedding_index.available:
+            similar = embedding_index.recommend(content_recommender.build_profiles([user.id])[user.id], k=2 * limit)
+            if similar:
+                # Near duplicates of a recommended article are skipped, as in the other sources
+                candidates = [article_id for article_id, _ in similar]
+                kept = [candidates[position] for position in
+                        collapse_duplicates(candidates, duplicate_clusters(candidates), limit)]
+                rows = {row.id: {'id': row.id, 'title': row.title, 'summary': row.summary}
+                        for row in db.session.query(Article.id, Article.title, Article.summary)
+                        .filter(Article.id.in_(kept))}
+                return [rows[article_id] for article_id in kept if article_id in rows]
+
+        recommended_articles = content_recommender.recommend(user.id, k=limit)
+        if not recommended_articles:
+            # Users without any history yet get the popular articles instead
+            return Article.get_popular_articles()
+        return recommended_articles
 
     @staticmethod
-    def get_popular_articles():
-        # Replace with actual business logic later
-        dummy_articles = [
-            {
-                'id': 1,
-                'title': 'BlueSky: News or Horror?',
-                'summary': 'This is a summary of the popular article 1.',
-            },
-            {
-                'id': 2,
-                'title': 'Popular Article 2',
-                'summary': 'This is a summary of the popular article 2.',
-            },
-            {
-                'id': 3,
-                'title': 'Popular Article 3',
-                'summary': 'This is a summary of the popular article 3.',
-            }
-        ]
-        return dummy_articles
+    def search_articles(keywords, page=1, per_page=20):
+        # Ranked full-text search over titles and content, returns a page of (id, title, summary, rank) rows
+        columns = [Article.id, Article.title, Article.summary]
+        if db.engine.dialect.name != 'postgresql':
+            # Development stand-in without tsvector support: plain substring match on titles, % and _ taken literally
+            pattern = keywords.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            query = db.session.query(*columns).filter(Article.title.ilike(f'%{pattern}%', escape='\\')) \
+                .order_by(Article.id.desc())
+            return query.paginate(page=page, per_page=per_page, error_out=False)
+
+        ts_query = func.websearch_to_tsquery('english', keywords)
+        rank = func.ts_rank_cd(Article.search_vector, ts_query)
+        query = db.session.query(*columns, rank.label('rank')) \
+            .filter(Article.search_vector.op('@@')(ts_query)) \
+            .order_by(rank.desc(), Article.id.desc())
+        return query.paginate(page=page, per_page=per_page, error_out=False)
+
+    @staticmethod
+    def get_popular_articles(limit=10):
+        from core.popularity import popularity_ranking
+
+        return popularity_ranking.top(limit)
+
+# Keep Article.search_vector in sync when the table is created with db.create_all() rather than by migrations
+event.listen(Article.__table__, 'after_create', DDL("""
+    CREATE FUNCTION article_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+""").execute_if(dialect='postgresql'))
+event.listen(Article.__table__, 'after_create', DDL("""
+    CREATE TRIGGER article_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, content ON article
+    FOR EACH ROW EXECUTE FUNCTION article_search_vector_update()
+""").execute_if(dialect='postgresql'))
+event.listen(Article.__table__, 'before_drop', DDL(
+    "DROP FUNCTION IF EXISTS article_search_vector_update() CASCADE"
+).execute_if(dialect='postgresql'))
 
 class Interaction(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -138,9 +252,7 @@ class Comment(db.Model):
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
 
     def calculate_sentiment(self):
-        blob = TextBlob(self.content)
-        self.polarity = blob.sentiment.polarity
-        self.subjectivity = blob.sentiment.subjectivity
+        self.polarity, self.subjectivity = sentiment_service.score(self.content)
 
 # Association tables for many to many relationship between users and articles.
 favorite_article = db.Table('favorite_article',
@@ -153,6 +265,14 @@ viewed_article = db.Table('viewed_article',
     db.Column('article_id', db.Integer, db.ForeignKey('article.id', ondelete='CASCADE'), primary_key=True)
 )
 
+
+def _signals_changed(user, *args):
+    user.signals_changed_at = datetime.utcnow()
+
+for _relationship in (User.favorite_articles, User.viewed_articles):
+    for _event in ('append', 'remove'):
+        event.listen(_relationship, _event, _signals_changed)
+
 shared_article = db.Table('shared_article',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
     db.Column('article_id', db.Integer, db.ForeignKey('article.id', ondelete='CASCADE'), primary_key=True),
@@ -162,5 +282,6 @@ shared_article = db.Table('shared_article',
 recommendation = db.Table('recommendation',
     db.Column('user_id', db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True),
     db.Column('article_id', db.Integer, db.ForeignKey('article.id', ondelete='CASCADE'), primary_key=True),
-    db.Column('recommended_on', db.DateTime, nullable=False, default=datetime.utcnow)
-)
\ No newline at end of file
+    db.Column('recommended_on', db.DateTime, nullable=False, default=datetime.utcnow),
+    db.Column('score', db.Float, nullable=True)
+)
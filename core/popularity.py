@@ -0,0 +1,189 @@
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from sortedcontainers import SortedList
+from sqlalchemy import event, func
+from core.extensions import db
+from core.models import Article, Interaction
+
+# How much each counter on an Article contributes to its popularity.
+COUNTER_WEIGHTS = {
+    'views': 1.0,
+    'likes': 4.0,
+    'dislikes': -4.0,
+    'shares': 8.0,
+    'saves': 6.0,
+}
+INTERACTION_WEIGHT = 2.0
+
+
+def counter_weight(**counters):
+    """
+    Combine engagement counters into a single non-negative weight.
+
+    Parameters:
+        **counters: Any of views, likes, dislikes, shares, saves,
+            click_through_rate and engagement_rate.
+
+    Returns:
+        float: The weight, never below 1 so it can be taken the log of.
+    """
+    weight = sum(COUNTER_WEIGHTS[name] * counters.get(name, 0) for name in COUNTER_WEIGHTS)
+    weight *= 1.0 + counters.get('click_through_rate', 0.0) + counters.get('engagement_rate', 0.0)
+    return max(weight, 1.0)
+
+
+def epoch_seconds(when):
+    # Stored datetimes are naive UTC; timestamp() alone would read them as local time
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return when.timestamp()
+
+
+class PopularityRanking:
+    """
+    In-process, time-decayed popularity ranking of articles.
+
+    Scores use forward decay: an event of weight w at time t is stored as
+    log(w) + t * ln(2) / half_life. Comparing these keys is equivalent to
+    comparing the exponentially decayed scores at any later instant, so new
+    events can be folded in with logaddexp without ever rescoring the rest of
+    the catalog, and the SortedList stays ordered as time passes.
+    """
+
+    def __init__(self, half_life_hours=24.0):
+        self.half_life = half_life_hours * 3600.0
+        self._keys = {}
+        self._ranking = SortedList()
+        self._articles = {}
+        self._lock = threading.Lock()
+        self.loaded_at = None
+        self._reloading = False
+        self._listening = False
+
+    def init_app(self, app):
+        self.half_life = app.config.get('POPULARITY_HALF_LIFE_HOURS', 24.0) * 3600.0
+        # The listener is global to the Interaction mapper, so every app created in the process shares it
+        if not self._listening:
+            event.listen(Interaction, 'after_insert', self._on_interaction)
+            self._listening = True
+
+    def _on_interaction(self, mapper, connection, target):
+        self.record(target.article_id, interaction=1, rating=target.rating, when=target.last_interaction_time)
+
+    def _key(self, weight, when):
+        return math.log(weight) + when * math.log(2) / self.half_life
+
+    def _set(self, article_id, key):
+        old = self._keys.get(article_id)
+        if old is not None:
+            self._ranking.remove((-old, article_id))
+        self._keys[article_id] = key
+        self._ranking.add((-key, article_id))
+
+    def load(self):
+        """
+        Rebuild the ranking from the Article counters and the most recent
+        Interaction of each article, or when it was first stored, in two
+        aggregate queries.
+        """
+        last_seen = dict(db.session.query(Interaction.article_id, func.max(Interaction.last_interaction_time))
+                         .group_by(Interaction.article_id))
+        now = time.time()
+
+        keys, articles = {}, {}
+        query = db.session.query(Article.id, Article.title, Article.summary, Article.views, Article.likes,
+                                 Article.dislikes, Article.shares, Article.saves, Article.click_through_rate,
+                                 Article.engagement_rate, Article.created_at)
+        for row in query.yield_per(1000):
+            weight = counter_weight(**row._asdict())
+            # Articles nobody has interacted with decay from when they were stored, not from every reload
+            if row.id in last_seen:
+                when = epoch_seconds(last_seen[row.id])
+            else:
+                when = epoch_seconds(row.created_at) if row.created_at is not None else now
+            keys[row.id] = self._key(weight, when)
+            articles[row.id] = {'id': row.id, 'title': row.title, 'summary': row.summary}
+
+        ranking = SortedList((-key, article_id) for article_id, key in keys.items())
+        with self._lock:
+            self._keys, self._ranking, self._articles = keys, ranking, articles
+            self.loaded_at = now
+
+    def ensure_loaded(self):
+        """
+        Load the ranking on first use and reload it in the background once it is
+        older than POPULARITY_RELOAD_SECONDS, to pick up newly ingested articles.
+        """
+        if self.loaded_at is None:
+            self.load()
+            return
+
+        max_age = current_app.config.get('POPULARITY_RELOAD_SECONDS', 3600)
+        if time.time() - self.loaded_at < max_age or self._reloading:
+            return
+
+        self._reloading = True
+        app = current_app._get_current_object()
+
+        def reload():
+            try:
+                with app.app_context():
+                    self.load()
+            finally:
+                self._reloading = False
+
+        threading.Thread(target=reload, daemon=True).start()
+
+    def record(self, article_id, interaction=0, rating=None, when=None, **counters):
+        """
+        Fold new engagement on an article into its popularity score.
+
+        Parameters:
+            article_id (int): The id of the article.
+            interaction (int): Number of new Interaction rows.
+            rating (int): The rating attached to the interaction, if any.
+            when (datetime): When the engagement happened, naive datetimes being UTC; defaults to now.
+            **counters: Increments of views, likes, dislikes, shares or saves.
+        """
+        weight = interaction * INTERACTION_WEIGHT + sum(COUNTER_WEIGHTS[name] * n for name, n in counters.items())
+        if rating is not None:
+            weight += (rating - 3) * INTERACTION_WEIGHT
+        if weight <= 0:
+            return
+
+        when = epoch_seconds(when) if isinstance(when, datetime) else (when or time.time())
+        key = self._key(weight, when)
+        with self._lock:
+            if self.loaded_at is None:
+                return
+            old = self._keys.get(article_id)
+            self._set(article_id, key if old is None else max(old, key) + math.log1p(math.exp(-abs(old - key))))
+
+    def top(self, n=10):
+        """
+        Return the n most popular articles without touching the database once loaded.
+
+        Parameters:
+            n (int): The number of articles to return.
+
+        Returns:
+            list: A list of dictionaries with the id, title and summary of each article.
+        """
+        self.ensure_loaded()
+        with self._lock:
+            ids = [article_id for _, article_id in self._ranking.islice(0, n)]
+            missing = [article_id for article_id in ids if article_id not in self._articles]
+
+        if missing:
+            # Articles that gained interactions after the last load are fetched once and kept
+            for article_id, title, summary in db.session.query(Article.id, Article.title, Article.summary) \
+                    .filter(Article.id.in_(missing)):
+                self._articles[article_id] = {'id': article_id, 'title': title, 'summary': summary}
+
+        return [self._articles[article_id] for article_id in ids if article_id in self._articles]
+
+
+popularity_ranking = PopularityRanking()
@@ -0,0 +1,388 @@
+import os
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+import scipy.sparse as sp
+from flask import current_app
+from core.artifacts import ArtifactLoader, StringTable, artifact_store, csr_arrays, csr_from_arrays, exclusive_lock, \
+    string_arrays
+from core.dedup import collapse_duplicates, duplicate_clusters
+from core.extensions import db
+from core.models import Article, Interaction, favorite_article, viewed_article
+from core.text import tokenize, summarize
+
+# Relative weight of each kind of signal when building a user's taste profile.
+FAVORITE_WEIGHT = 3.0
+VIEW_WEIGHT = 1.0
+INTERACTION_WEIGHT = 1.0
+# Seconds before a process tries to refit again, after another one held the lock or its refit failed
+REFRESH_RETRY_SECONDS = 60
+
+
+def interaction_weight(read_time, scroll_depth, rating):
+    """
+    Turn a single Interaction row into a profile weight.
+
+    Long reads and deep scrolls count for more, and explicit ratings push the
+    weight up (4-5 stars) or below zero (1-2 stars) so disliked articles steer
+    the profile away from similar content.
+
+    Parameters:
+        read_time (int): Seconds spent on the article.
+        scroll_depth (float): Fraction of the article scrolled, between 0 and 1.
+        rating (int): The 1-5 star rating, or None when the user did not rate.
+
+    Returns:
+        float: The weight of the interaction.
+    """
+    weight = INTERACTION_WEIGHT * (1.0 + min(read_time / 60.0, 5.0) * 0.2 + scroll_depth)
+    if rating is not None:
+        weight *= (rating - 2.5) / 1.5
+    return weight
+
+
+class TfidfVectorizer:
+    """
+    Minimal TF-IDF vectorizer producing L2-normalised SciPy CSR matrices.
+
+    Parameters:
+        min_df (int): Ignore terms that appear in fewer documents than this.
+        max_df (float): Ignore terms that appear in more than this fraction of documents.
+        max_features (int): Keep at most this many terms, ranked by document frequency.
+    """
+
+    def __init__(self, min_df=2, max_df=0.8, max_features=50000):
+        self.min_df = min_df
+        self.max_df = max_df
+        self.max_features = max_features
+        self.vocabulary = {}
+        self.idf = np.empty(0, dtype=np.float32)
+
+    def _count(self, documents, vocabulary, grow):
+        indices = []
+        indptr = [0]
+        for document in documents:
+            for token in tokenize(document):
+                index = vocabulary.get(token)
+                if index is None:
+                    if not grow:
+                        continue
+                    index = vocabulary[token] = len(vocabulary)
+                indices.append(index)
+            indptr.append(len(indices))
+        indices = np.asarray(indices, dtype=np.int32)
+        data = np.ones(len(indices), dtype=np.float32)
+        counts = sp.csr_matrix((data, indices, np.asarray(indptr, dtype=np.int64)),
+                               shape=(len(indptr) - 1, len(vocabulary)))
+        counts.sum_duplicates()
+        return counts
+
+    def _weight(self, counts):
+        counts = counts.astype(np.float32)
+        # Sublinear term frequency so a word repeated 50 times does not dominate.
+        np.log1p(counts.data, out=counts.data)
+        counts.data *= self.idf[counts.indices]
+        return normalize_rows(counts)
+
+    def fit_transform(self, documents):
+        vocabulary = {}
+        counts = self._count(documents, vocabulary, grow=True)
+        n_documents = counts.shape[0]
+
+        df = np.bincount(counts.indices, minlength=counts.shape[1])
+        keep = (df >= self.min_df) & (df <= max(self.max_df * n_documents, self.min_df))
+        if keep.sum() > self.max_features:
+            threshold = np.sort(df[keep])[-self.max_features]
+            keep &= df >= threshold
+        columns = np.flatnonzero(keep)
+
+        terms = np.empty(len(vocabulary), dtype=object)
+        for term, index in vocabulary.items():
+            terms[index] = term
+        self.vocabulary = {term: new for new, term in enumerate(terms[columns])}
+        self.idf = (np.log((1.0 + n_documents) / (1.0 + df[columns])) + 1.0).astype(np.float32)
+        return self._weight(counts[:, columns].tocsr())
+
+    def transform(self, documents):
+        return self._weight(self._count(documents, self.vocabulary, grow=False))
+
+
+def pick_top_k(scores, k):
+    """
+    Pick the k best columns of every row of a score array.
+
+    Parameters:
+        scores (numpy.ndarray): A dense users x articles array of scores.
+        k (int): The number of columns to pick per row.
+
+    Returns:
+        tuple: Two (users, k) arrays holding the picked columns and their scores,
+        best first. Picks scored -inf are padding and must be ignored.
+    """
+    k = min(k, scores.shape[1])
+    if k == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64), np.empty((scores.shape[0], 0), dtype=scores.dtype)
+    top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+
+
+# Everything a request needs to score against, swapped in as a single object on refit.
+# article_ids are sorted, so the row of an article is found by binary search.
+Corpus = namedtuple('Corpus', ['matrix', 'article_ids', 'titles', 'summaries', 'fitted_at'])
+
+
+def normalize_rows(matrix):
+    """
+    Scale every row of a CSR matrix to unit L2 norm, leaving empty rows untouched.
+    """
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1.0
+    return sp.diags((1.0 / norms).astype(np.float32)) @ matrix
+
+
+class ContentRecommender:
+    """
+    Content-based recommender over every Article in the catalog.
+
+    Article bodies are vectorized once into a TF-IDF CSR matrix. A user's profile
+    is the weighted sum of the rows they favorited, viewed or interacted with,
+    and all candidates are scored in a single sparse matrix-vector product.
+
+    The fitted corpus is published as the 'content' artifact, which every worker
+    memory-maps instead of fitting and holding its own copy.
+    """
+
+    ARTIFACT = 'content'
+
+    def __init__(self, vectorizer=None):
+        self.vectorizer = vectorizer or TfidfVectorizer()
+        self.corpus = None
+        self._refreshing = False
+        self._next_refresh_at = 0.0
+        self._loader = ArtifactLoader(self.ARTIFACT, self.corpus_from_artifact)
+
+    def fit(self, rows):
+        """
+        Vectorize a corpus and swap it in as the live model of this process.
+
+        Parameters:
+            rows (iterable): (id, title, content, summary) tuples, one per article, by increasing id.
+        """
+        ids, titles, summaries, documents = [], [], [], []
+        for article_id, title, content, summary in rows:
+            ids.append(article_id)
+            titles.append(title)
+            summaries.append(summary if summary is not None else summarize(content))
+            documents.append(title + ' ' + content)
+
+        vectorizer = TfidfVectorizer(self.vectorizer.min_df, self.vectorizer.max_df, self.vectorizer.max_features)
+        matrix = vectorizer.fit_transform(documents)
+
+        # Publish the new state in one assignment so readers never see a half-built model.
+        self.vectorizer = vectorizer
+        self.corpus = Corpus(matrix, np.asarray(ids, dtype=np.int64), titles, summaries, time.time())
+
+    def fit_from_db(self):
+        """
+        Fit on every article and publish the corpus for the other processes.
+        """
+        query = db.session.query(Article.id, Article.title, Article.content, Article.summary).order_by(Article.id)
+        self.fit(query.yield_per(1000))
+        self.publish(artifact_store(current_app))
+
+    def publish(self, store):
+        corpus = self.corpus
+        arrays = dict(csr_arrays('matrix', corpus.matrix), article_ids=corpus.article_ids)
+        arrays.update(string_arrays('titles', corpus.titles))
+        arrays.update(string_arrays('summaries', corpus.summaries))
+        store.publish(self.ARTIFACT, arrays, {'shape': list(corpus.matrix.shape), 'fitted_at': corpus.fitted_at})
+        self._loader.reset()
+
+    @staticmethod
+    def corpus_from_artifact(artifact):
+        arrays = artifact.arrays
+        return Corpus(csr_from_arrays(arrays, 'matrix', artifact.meta['shape']), arrays['article_ids'],
+                      StringTable(arrays, 'titles'), StringTable(arrays, 'summaries'), artifact.meta['fitted_at'])
+
+    def ensure_fitted(self):
+        """
+        Serve the latest published corpus, fitting one when none exists yet.
+        On a cold start one process fits it while the others wait for it and
+        load its version. Once it is older than RECOMMENDER_REFRESH_SECONDS,
+        one process refits it in a background thread and publishes it, and
+        requests keep being served from the previous version meanwhile.
+        """
+        store = artifact_store(current_app)
+        lock_path = os.path.join(store.root, self.ARTIFACT + '.lock')
+        corpus = self._loader.get(store)
+        if corpus is not None:
+            self.corpus = corpus
+        if self.corpus is None:
+            with exclusive_lock(lock_path, wait=True):
+                # Another process may have published while this one waited
+                self._loader.reset()
+                corpus = self._loader.get(store)
+                if corpus is not None:
+                    self.corpus = corpus
+                else:
+                    self.fit_from_db()
+            return
+
+        max_age = current_app.config.get('RECOMMENDER_REFRESH_SECONDS', 900)
+        now = time.time()
+        if now - self.corpus.fitted_at < max_age or self._refreshing or now < self._next_refresh_at:
+            return
+
+        self._refreshing = True
+        app = current_app._get_current_object()
+
+        def refresh():
+            try:
+                # Only the process holding the lock refits; the others pick up its version
+                with exclusive_lock(lock_path) as locked:
+                    if locked:
+                        with app.app_context():
+                            self.fit_from_db()
+            finally:
+                # Until the new version is loaded the corpus still looks old, so do not retry straight away
+                self._next_refresh_at = time.time() + REFRESH_RETRY_SECONDS
+                self._refreshing = False
+
+        threading.Thread(target=refresh, daemon=True).start()
+
+    def fit_if_changed(self):
+        """
+        Serve the latest published corpus to a batch job, refitting it only when
+        articles were added or removed since it was fitted. Articles edited in
+        place are picked up by the periodic refit of ensure_fitted().
+
+        Returns:
+            bool: Whether the corpus was refitted.
+        """
+        store = artifact_store(current_app)
+        with exclusive_lock(os.path.join(store.root, self.ARTIFACT + '.lock'), wait=True):
+            self._loader.reset()
+            corpus = self._loader.get(store)
+            article_ids = np.fromiter((article_id for (article_id,) in
+                                       db.session.query(Article.id).order_by(Article.id)), dtype=np.int64)
+            if corpus is not None and np.array_equal(corpus.article_ids, article_ids):
+                self.corpus = corpus
+                return False
+            self.fit_from_db()
+            return True
+
+    def build_profiles(self, user_ids):
+        """
+        Collect the weighted article signals of a batch of users, in three queries.
+
+        Parameters:
+            user_ids (list): The ids of the users.
+
+        Returns:
+            dict: A dictionary of user ids to dictionaries of article ids to
+            accumulated profile weights.
+        """
+        profiles = {user_id: {} for user_id in user_ids}
+
+        def add(user_id, article_id, weight):
+            profile = profiles[user_id]
+            profile[article_id] = profile.get(article_id, 0.0) + weight
+
+        favorites = db.session.query(favorite_article.c.user_id, favorite_article.c.article_id) \
+            .filter(favorite_article.c.user_id.in_(user_ids))
+        for user_id, article_id in favorites:
+            add(user_id, article_id, FAVORITE_WEIGHT)
+        views = db.session.query(viewed_article.c.user_id, viewed_article.c.article_id) \
+            .filter(viewed_article.c.user_id.in_(user_ids))
+        for user_id, article_id in views:
+            add(user_id, article_id, VIEW_WEIGHT)
+        interactions = db.session.query(Interaction.user_id, Interaction.article_id, Interaction.read_time,
+                                        Interaction.scroll_depth, Interaction.rating) \
+            .filter(Interaction.user_id.in_(user_ids))
+        for user_id, article_id, read_time, scroll_depth, rating in interactions:
+            add(user_id, article_id, interaction_weight(read_time, scroll_depth, rating))
+        return profiles
+
+    @staticmethod
+    def weight_matrix(corpus, profiles, user_ids):
+        """
+        Lay out the profiles of a batch of users as a sparse users x articles matrix.
+
+        Parameters:
+            corpus (Corpus): The fitted corpus, whose rows are the matrix columns.
+            profiles (dict): The profiles, as from build_profiles().
+            user_ids (list): The ids of the users, in matrix row order.
+
+        Returns:
+            scipy.sparse.csr_matrix: The weight of each article for each user.
+        """
+        rows, article_ids, data = [], [], []
+        for i, user_id in enumerate(user_ids):
+            for article_id, weight in profiles[user_id].items():
+                rows.append(i)
+                article_ids.append(article_id)
+                data.append(weight)
+        # Articles newer than the corpus are not in it and are left out
+        article_ids = np.asarray(article_ids, dtype=np.int64)
+        columns = np.minimum(np.searchsorted(corpus.article_ids, article_ids), max(len(corpus.article_ids) - 1, 0))
+        known = corpus.article_ids[columns] == article_ids if len(corpus.article_ids) else np.zeros(0, dtype=bool)
+        return sp.csr_matrix((np.asarray(data, dtype=np.float32)[known], (np.asarray(rows)[known], columns[known])),
+                             shape=(len(user_ids), len(corpus.article_ids)))
+
+    @staticmethod
+    def score_profiles(corpus, weights):
+        """
+        Score every article for a batch of users.
+
+        Parameters:
+            corpus (Corpus): The fitted corpus to score against.
+            weights (scipy.sparse.csr_matrix): The users x articles weights, as from weight_matrix().
+
+        Returns:
+            numpy.ndarray: A dense users x articles array of cosine scores. Articles
+            the users already read, and every article of users without a profile,
+            score -inf.
+        """
+        profiles = normalize_rows(weights @ corpus.matrix)
+        scores = np.ascontiguousarray((corpus.matrix @ profiles.toarray().T).T)
+        scores[weights.nonzero()] = -np.inf
+        scores[profiles.getnnz(axis=1) == 0] = -np.inf
+        return scores
+
+    def top_k(self, corpus, weights, k):
+        """
+        Score every article for a batch of users and pick the k best unseen ones each.
+
+        Returns:
+            tuple: Two (users, k) arrays, as from pick_top_k().
+        """
+        return pick_top_k(self.score_profiles(corpus, weights), k)
+
+    def recommend(self, user_id, k=10):
+        """
+        Recommend the top-k unseen articles for a user.
+
+        Parameters:
+            user_id (int): The id of the user.
+            k (int): The number of articles to return.
+
+        Returns:
+            list: A list of dictionaries with the id, title and summary of each
+            recommended article, best first. Empty when the user has no history.
+        """
+        self.ensure_fitted()
+        corpus = self.corpus
+        profiles = self.build_profiles([user_id])
+        rows, scores = self.top_k(corpus, self.weight_matrix(corpus, profiles, [user_id]), 2 * k)
+        rows = rows[0][np.isfinite(scores[0])]
+        # Near duplicates of a recommended article are skipped; only the candidates' clusters are looked up
+        candidates = corpus.article_ids[rows].tolist()
+        kept = collapse_duplicates(candidates, duplicate_clusters(candidates), k)
+        return [{'id': int(corpus.article_ids[row]), 'title': corpus.titles[row], 'summary': corpus.summaries[row]}
+                for row in rows[kept]]
+
+
+content_recommender = ContentRecommender()
@@ -0,0 +1,28 @@
+import os
+import threading
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def get_redis(path):
+    """
+    Connect to the embedded Redis server persisted at the given path, starting it
+    if needed. The scraper and the web workers pass the same REDISLITE_PATH so
+    they share one server, and with it the sentiment and article caches.
+
+    Parameters:
+        path (str): The path of the redislite database file.
+
+    Returns:
+        redislite.Redis: A client, shared by every caller in the process.
+    """
+    # Imported lazily: only processes that use a shared backend need redislite
+    import redislite
+
+    path = os.path.abspath(path)
+    with _lock:
+        if path not in _clients:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _clients[path] = redislite.Redis(path, serverconfig={'appendonly': 'yes'})
+        return _clients[path]
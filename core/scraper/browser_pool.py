@@ -0,0 +1,157 @@
+import atexit
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.chrome.service import Service
+from core.metrics import metrics
+from core.scraper.fetcher import fetcher
+
+CHROMEDRIVER_PATH = os.getenv('CHROMEDRIVER_PATH', 'path/to/chromedriver')
+
+
+class PooledBrowser:
+    """
+    A headless Chrome instance together with the number of pages it has loaded.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.uses = 0
+
+
+class BrowserPool:
+    """
+    A small pool of long-lived headless Chrome instances shared by all scrapers.
+
+    Browsers are launched lazily, health-checked before each use and recycled
+    after max_uses page loads, so a cycle pays for a Chrome cold start only
+    when a browser is new, crashed or worn out.
+
+    Parameters:
+        size (int): The maximum number of browsers kept alive at once.
+        max_uses (int): The number of page loads after which a browser is replaced.
+        page_load_timeout (int): The time a page load may take, in seconds.
+        driver_path (str): The path to the chromedriver executable.
+    """
+
+    def __init__(self, size=1, max_uses=50, page_load_timeout=30, driver_path=CHROMEDRIVER_PATH):
+        self.size = size
+        self.max_uses = max_uses
+        self.page_load_timeout = page_load_timeout
+        self.driver_path = driver_path
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _launch(self):
+        with metrics.span('scraper.browser_launch'):
+            return self._start_driver()
+
+    def _start_driver(self):
+        options = Options()
+        options.add_argument("--headless")  # Run in headless mode, without a visible browser window
+        options.add_argument("--disable-gpu")
+        options.add_argument("--disable-dev-shm-usage")
+        driver = webdriver.Chrome(service=Service(self.driver_path), options=options)
+        driver.set_page_load_timeout(self.page_load_timeout)
+        return PooledBrowser(driver)
+
+    @staticmethod
+    def _is_healthy(browser):
+        try:
+            return browser.driver.execute_script("return 1") == 1
+        except WebDriverException:
+            return False
+
+    @staticmethod
+    def _quit(browser):
+        try:
+            browser.driver.quit()
+        except WebDriverException:
+            pass
+
+    @contextmanager
+    def browser(self):
+        """
+        Borrow a healthy browser from the pool, launching one if none is idle.
+
+        Yields:
+            selenium.webdriver.Chrome: The browser. It goes back to the pool
+            afterwards, or is quit if it failed or reached max_uses.
+        """
+        self._slots.acquire()
+        try:
+            browser = None
+            try:
+                browser = self._idle.get_nowait()
+                if not self._is_healthy(browser):
+                    self._quit(browser)
+                    browser = None
+            except queue.Empty:
+                pass
+            if browser is None:
+                browser = self._launch()
+
+            crashed = False
+            try:
+                yield browser.driver
+            except WebDriverException:
+                crashed = True
+                raise
+            finally:
+                browser.uses += 1
+                if crashed or browser.uses >= self.max_uses:
+                    self._quit(browser)
+                else:
+                    self._idle.put(browser)
+        finally:
+            self._slots.release()
+
+    def get_page_source(self, url):
+        """
+        Load a page in a pooled browser and return the rendered HTML.
+
+        Parameters:
+            url (str): The URL of the page.
+
+        Returns:
+            str: The HTML of the page after JavaScript has run.
+        """
+        with self.browser() as driver, metrics.span('scraper.render'):
+            driver.get(url)
+            return driver.page_source
+
+    def close(self):
+        """
+        Quit every idle browser in the pool.
+        """
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+
+browser_pool = BrowserPool()
+atexit.register(browser_pool.close)
+
+
+def get_front_page(url, render_js=True):
+    """
+    Fetch the HTML of a source's front page.
+
+    Parameters:
+        url (str): The URL of the front page.
+        render_js (bool): Load the page in a pooled headless browser. When False,
+            the page is fetched over plain HTTP, which is much cheaper for sources
+            whose links are already in the server-rendered HTML.
+
+    Returns:
+        str: The HTML of the front page.
+    """
+    if render_js:
+        return browser_pool.get_page_source(url)
+    return fetcher.get(url).text
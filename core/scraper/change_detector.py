@@ -0,0 +1,94 @@
+import hashlib
+from core.scraper.fetcher import fetcher
+
+
+class ChangeDetector:
+    """
+    Detect changes of a source's front page without downloading it every cycle.
+
+    Front pages fetched over plain HTTP are requested conditionally with the
+    stored ETag / Last-Modified validators, so an unchanged page costs a 304 and
+    no parsing at all. Pages rendered in a browser have no validators, and ads,
+    timestamps and tokens change their HTML on every poll, so what is compared
+    with the last poll is the set of article links found on them. Which of the
+    links on a changed page are new is up to the Frontier.
+
+    Parameters:
+        redis_client (redis.Redis): Where validators and link fingerprints are kept between cycles.
+        namespace (str): Prefix of every key written to Redis.
+    """
+
+    def __init__(self, redis_client, namespace='change'):
+        self.redis = redis_client
+        self.namespace = namespace
+
+    def _key(self, source, name):
+        return f"{self.namespace}:{source}:{name}"
+
+    def fetch_if_modified(self, source, url):
+        """
+        Fetch a front page with a conditional GET.
+
+        Parameters:
+            source (str): The name of the source, e.g. "verge".
+            url (str): The URL of the front page.
+
+        Returns:
+            str: The HTML of the page, or None if the server answered 304 Not Modified.
+        """
+        validators = self.redis.hgetall(self._key(source, "validators"))
+        headers = {}
+        if b"etag" in validators:
+            headers["If-None-Match"] = validators[b"etag"].decode('utf-8')
+        if b"last_modified" in validators:
+            headers["If-Modified-Since"] = validators[b"last_modified"].decode('utf-8')
+
+        response = fetcher.get(url, headers=headers)
+        if response.status_code == 304:
+            return None
+
+        new_validators = {}
+        if response.headers.get("ETag"):
+            new_validators["etag"] = response.headers["ETag"]
+        if response.headers.get("Last-Modified"):
+            new_validators["last_modified"] = response.headers["Last-Modified"]
+        self.redis.delete(self._key(source, "validators"))
+        if new_validators:
+            self.redis.hset(self._key(source, "validators"), mapping=new_validators)
+        return response.text
+
+    @staticmethod
+    def fingerprint(links):
+        """
+        Compute an order-independent fingerprint of a set of article links.
+
+        Parameters:
+            links (iterable): The article links found on the front page.
+
+        Returns:
+            str: The SHA-1 hex digest of the sorted links.
+        """
+        return hashlib.sha1("\n".join(sorted(set(links))).encode('utf-8')).hexdigest()
+
+    def links_unchanged(self, source, links, ttl=None):
+        """
+        Compare the article links of a front page with those of the last poll.
+
+        Parameters:
+            source (str): The name of the source, e.g. "verge".
+            links (iterable): The article links currently on the front page.
+            ttl (float): Forget the fingerprint after this many seconds, so the
+                links are reported as changed again at least that often.
+
+        Returns:
+            bool: True if the same links were found last time.
+        """
+        digest = self.fingerprint(links)
+        key = self._key(source, "links")
+        if ttl is not None and ttl < 1:
+            # Nothing is remembered for less than a second
+            self.redis.delete(key)
+            return False
+        previous = self.redis.get(key)
+        self.redis.set(key, digest, ex=int(ttl) if ttl is not None else None)
+        return previous is not None and previous.decode('utf-8') == digest
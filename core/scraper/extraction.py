@@ -0,0 +1,180 @@
+from collections import namedtuple
+from bs4 import BeautifulSoup, SoupStrainer
+from core.metrics import metrics
+
+try:
+    from lxml import etree
+except ImportError:
+    # Without lxml, pages are read whole and parsed with html.parser, restricted to the configured tags
+    etree = None
+
+# Bytes read from the network per chunk fed to the parser
+CHUNK_SIZE = 16384
+
+# Tags whose text is code or styling rather than article text, skipped like BeautifulSoup's stripped_strings does
+NON_TEXT_TAGS = {'script', 'style', 'template', 'noscript'}
+
+# Where the heading and content of an article are on the pages of one source.
+#   headings: (tag, class) rules tried in order, the first one found wins
+#   content: the (tag, class) rule of the elements whose text makes up the content
+#   container: the (tag, class) rule of the element holding the article; parsing stops once the one
+#     enclosing the heading closed
+# A class of None matches any element with that tag.
+ExtractorConfig = namedtuple('ExtractorConfig', ['headings', 'content', 'container'])
+
+
+def matches(rule, element):
+    tag, css_class = rule
+    if element.tag != tag:
+        return False
+    return css_class is None or css_class in element.get('class', '').split()
+
+
+def stripped_strings(element):
+    if isinstance(element.tag, str) and element.tag not in NON_TEXT_TAGS:
+        if element.text:
+            yield element.text
+        for child in element:
+            yield from stripped_strings(child)
+            if child.tail:
+                yield child.tail
+
+
+def element_text(element, separator=' '):
+    return separator.join(string.strip() for string in stripped_strings(element) if string.strip())
+
+
+def join_content(texts):
+    return ' '.join(text + ' ' for text in texts).strip()
+
+
+def extract_article(chunks, config, encoding=None):
+    """
+    Extract the heading and content of an article from its HTML, incrementally.
+
+    Chunks are fed to lxml's pull parser as they arrive, and the text of the
+    configured elements is collected as each one closes. Elements outside of
+    them are dropped once closed, so the page is never held as a whole tree,
+    and the remaining chunks are not read once the article container closed.
+
+    Parameters:
+        chunks (iterable): The HTML of the page, as str or bytes chunks.
+        config (ExtractorConfig): Where the heading and content are on the page.
+        encoding (str): The encoding of bytes chunks, detected from the page when None.
+
+    Returns:
+        tuple: A tuple containing the heading and content of the article.
+        The heading is a string and the content is a string of concatenated text.
+    """
+    if etree is None:
+        return parse_strained(chunks, config)
+
+    parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding)
+    headings = [None] * len(config.headings)
+    texts = []
+    # The number of matched elements currently open; what is inside them is kept until they close
+    open_matches = 0
+    # The number of containers currently open, and how many were open around the first heading found.
+    # Teasers of other articles are containers too, so only the one enclosing the heading ends the article.
+    open_containers = 0
+    heading_depth = None
+
+    def handle(event, element):
+        nonlocal open_matches, open_containers, heading_depth
+        if matches(config.container, element):
+            open_containers += 1 if event == 'start' else -1
+        heading_rule = next((i for i, rule in enumerate(config.headings) if matches(rule, element)), None)
+        is_content = matches(config.content, element)
+        if heading_rule is None and not is_content:
+            if event == 'end' and open_matches == 0:
+                release(element)
+            # A heading outside of any container is followed by the container of its article
+            return (event == 'end' and heading_depth is not None and matches(config.container, element)
+                    and open_containers < max(heading_depth, 1))
+
+        if event == 'start':
+            open_matches += 1
+            return False
+        open_matches -= 1
+        if heading_rule is not None and headings[heading_rule] is None:
+            headings[heading_rule] = element_text(element, separator='')
+            if heading_depth is None:
+                heading_depth = open_containers
+        # Content nested in another content element is already part of its text
+        if is_content and open_matches == 0:
+            texts.append(element_text(element))
+        if open_matches == 0:
+            release(element)
+        return False
+
+    def run(events):
+        return any(handle(event, element) for event, element in events)
+
+    done = False
+    for chunk in chunks:
+        parser.feed(chunk)
+        if run(parser.read_events()):
+            done = True
+            break
+    if not done:
+        parser.close()
+        run(parser.read_events())
+
+    heading = next((heading for heading in headings if heading is not None), None)
+    if heading is None:
+        raise ValueError('No article heading found on the page')
+    return heading, join_content(texts)
+
+
+def release(element):
+    # Free a closed element and its earlier siblings; its tail text is kept for the parent
+    tail = element.tail
+    element.clear()
+    element.tail = tail
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def parse_strained(chunks, config):
+    # Fallback without lxml: only the heading and content tags are built into the soup
+    html = ''.join(chunk.decode('utf-8', 'replace') if isinstance(chunk, bytes) else chunk for chunk in chunks)
+    tags = sorted({tag for tag, _ in config.headings} | {config.content[0]})
+    soup = BeautifulSoup(html, 'html.parser', parse_only=SoupStrainer(tags))
+
+    heading = None
+    for tag, css_class in config.headings:
+        heading = soup.find(tag, {'class': css_class} if css_class else {})
+        if heading:
+            break
+    if not heading:
+        raise ValueError('No article heading found on the page')
+
+    tag, css_class = config.content
+    content_tags = soup.find_all(tag, {'class': css_class} if css_class else {})
+    return heading.get_text(strip=True), join_content(' '.join(tag.stripped_strings) for tag in content_tags)
+
+
+def response_encoding(response):
+    # Only trust the charset the server declared; otherwise lxml reads it from the page's meta tag
+    if 'charset' in response.headers.get('Content-Type', '').lower():
+        return response.encoding
+    return None
+
+
+def extract_response(response, config):
+    """
+    Extract an article from a streamed response, reading its body only until
+    the article container closed.
+
+    Parameters:
+        response (requests.Response): A response fetched with stream=True.
+        config (ExtractorConfig): Where the heading and content are on the page.
+
+    Returns:
+        tuple: The heading and content of the article.
+    """
+    # Also times the download of the body, which is read as it is parsed
+    with metrics.span('scraper.parse'):
+        return extract_article(response.iter_content(CHUNK_SIZE), config, response_encoding(response))
@@ -0,0 +1,127 @@
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from core.metrics import metrics
+
+# A body abandoned with at most this many bytes left is read to the end, so its connection can be reused
+DRAIN_LIMIT = 256 * 1024
+
+
+class Fetcher:
+    """
+    Concurrent HTTP fetcher built on one shared keep-alive requests.Session.
+
+    Parameters:
+        max_workers (int): The number of pages fetched at the same time overall.
+        per_host (int): The number of pages fetched at the same time from a single host.
+        timeout (tuple): The (connect, read) timeout of every request, in seconds.
+        retries (int): How many times a failed or throttled request is retried.
+        backoff (float): The exponential backoff factor between retries, in seconds.
+    """
+
+    def __init__(self, max_workers=16, per_host=4, timeout=(5, 20), retries=3, backoff=0.5):
+        self.max_workers = max_workers
+        self.per_host = per_host
+        self.timeout = timeout
+
+        retry = Retry(total=retries, backoff_factor=backoff, status_forcelist=(429, 500, 502, 503, 504),
+                      allowed_methods=('GET', 'HEAD'), respect_retry_after_header=True)
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        self._host_slots = defaultdict(lambda: threading.BoundedSemaphore(self.per_host))
+        self._host_slots_lock = threading.Lock()
+
+    def _slot(self, url):
+        with self._host_slots_lock:
+            return self._host_slots[urlsplit(url).netloc]
+
+    def get(self, url, **kwargs):
+        """
+        Fetch a single URL, honouring the per-host concurrency limit.
+
+        Parameters:
+            url (str): The URL to fetch.
+            **kwargs: Extra arguments passed on to requests.Session.get.
+
+        Returns:
+            requests.Response: The response, after raise_for_status().
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        with self._slot(url), metrics.span('scraper.fetch'):
+            response = self.session.get(url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    @contextmanager
+    def stream(self, url, **kwargs):
+        """
+        Fetch a single URL without downloading its body up front, for callers
+        that read it in chunks with iter_content() and may stop early.
+
+        Parameters:
+            url (str): The URL to fetch.
+            **kwargs: Extra arguments passed on to requests.Session.get.
+
+        Yields:
+            requests.Response: The response, after raise_for_status().
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        with self._slot(url):
+            # Only up to the headers; the body is read, and timed, by whoever parses it
+            with metrics.span('scraper.fetch'):
+                response = self.session.get(url, stream=True, **kwargs)
+            try:
+                response.raise_for_status()
+                yield response
+            finally:
+                # Closing a partly read response drops its connection, unless what is left is read first
+                length = response.headers.get('Content-Length')
+                if not response.raw.closed and length and int(length) - response.raw.tell() <= DRAIN_LIMIT:
+                    response.raw.drain_conn()
+                response.close()
+
+    def fetch_all(self, urls, handler=None, stream=False):
+        """
+        Fetch many URLs concurrently.
+
+        Parameters:
+            urls (iterable): The URLs to fetch.
+            handler (callable): Optional function applied to each response in the
+                worker thread, e.g. to parse it while other pages are downloading.
+            stream (bool): Hand the handler a streamed response whose body it reads
+                itself, see stream().
+
+        Returns:
+            dict: A dictionary of URLs to the handler's result, or to the response
+            text when no handler is given. URLs that failed are logged and left out.
+        """
+        handler = handler or (lambda response: response.text)
+
+        def fetch(url):
+            try:
+                if stream:
+                    with self.stream(url) as response:
+                        return url, handler(response)
+                return url, handler(self.get(url))
+            except Exception as e:
+                print(f"Failed to fetch {url}:", e)
+                return url, None
+
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(urls))) as executor:
+            results = executor.map(fetch, urls)
+            return {url: result for url, result in results if result is not None}
+
+
+# Shared by every scraper in the process so connections are reused across sources
+fetcher = Fetcher()
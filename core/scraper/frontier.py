@@ -0,0 +1,154 @@
+import time
+from core.sentiment import content_hash
+
+# A fetched article is fetched again when it is still linked this long after, to pick up corrections
+RECHECK_SECONDS = 6 * 3600
+# URLs not fetched for this long are forgotten; they are not linked from the front pages any more
+RETENTION_SECONDS = 30 * 24 * 3600
+# Failed fetches of a URL before it is given up on until it is due for a recheck
+MAX_ATTEMPTS = 3
+
+
+class Frontier:
+    """
+    Persistent queue of article URLs to fetch, and the set of URLs already
+    fetched, per source, kept in Redis.
+
+    Links found on a front page are queued only when they were never fetched
+    or were fetched more than recheck_after seconds ago. A URL leaves the queue
+    once its article is stored, so after a crash the next cycle resumes with
+    what is left. The content hash of every fetched article is kept too, and
+    a recheck that finds the same content is not ingested again.
+
+    Parameters:
+        redis_client (redis.Redis): Where the queues and seen-sets are kept.
+        known (callable): Optional function taking a list of URLs and returning
+            those already stored, e.g. in the Article table. They are marked as
+            fetched instead of being queued, so an empty or lost seen-set does
+            not cause every linked article to be downloaded again.
+        recheck_after (float): The age from which a fetched URL is queued again, in seconds.
+        namespace (str): Prefix of every key written to Redis.
+    """
+
+    def __init__(self, redis_client, known=None, recheck_after=RECHECK_SECONDS, namespace='frontier'):
+        self.redis = redis_client
+        self.known = known
+        self.recheck_after = recheck_after
+        self.namespace = namespace
+
+    def _key(self, source, name):
+        return f"{self.namespace}:{source}:{name}"
+
+    def schedule(self, source, urls, now=None):
+        """
+        Queue the URLs that were never fetched or are due for a recheck.
+
+        Parameters:
+            source (str): The name of the source.
+            urls (iterable): Absolute article URLs found on the front page.
+
+        Returns:
+            int: The number of URLs newly queued.
+        """
+        now = time.time() if now is None else now
+        urls = list(dict.fromkeys(urls))
+        if not urls:
+            return 0
+        seen_key, queue_key = self._key(source, "seen"), self._key(source, "queue")
+
+        pipeline = self.redis.pipeline()
+        for url in urls:
+            pipeline.zscore(seen_key, url)
+            pipeline.zscore(queue_key, url)
+        scores = pipeline.execute()
+        candidates = [(url, fetched_at) for url, fetched_at, queued in zip(urls, scores[::2], scores[1::2])
+                      if queued is None and (fetched_at is None or fetched_at < now - self.recheck_after)]
+
+        unseen = [url for url, fetched_at in candidates if fetched_at is None]
+        stored = set(self.known(unseen)) if self.known and unseen else set()
+        pipeline = self.redis.pipeline()
+        if stored:
+            pipeline.zadd(seen_key, {url: now for url in stored})
+        queued = {url: now for url, _ in candidates if url not in stored}
+        if queued:
+            pipeline.zadd(queue_key, queued, nx=True)
+        pipeline.execute()
+        self.prune(source, now)
+        return len(queued)
+
+    def pending(self, source, limit=100):
+        """
+        Returns:
+            list: Up to limit queued URLs, the longest waiting first.
+        """
+        return [url.decode('utf-8') for url in self.redis.zrange(self._key(source, "queue"), 0, limit - 1)]
+
+    def changed(self, source, articles):
+        """
+        Leave out the fetched articles whose content is the same as when they were last fetched.
+
+        Parameters:
+            source (str): The name of the source.
+            articles (dict): Article URLs to (heading, content) tuples, as returned by Source.scrape_articles().
+
+        Returns:
+            dict: The articles that are new or whose content changed.
+        """
+        if not articles:
+            return {}
+        items = list(articles.items())
+        hashes = self.redis.hmget(self._key(source, "hashes"), [url for url, _ in items])
+        return {url: (heading, content) for (url, (heading, content)), stored in zip(items, hashes)
+                if stored is None or stored.decode('utf-8') != content_hash(content)}
+
+    def complete(self, source, articles, now=None):
+        """
+        Mark fetched articles as done, once they are stored: record their fetch
+        time and content hash, and take them off the queue.
+
+        Parameters:
+            source (str): The name of the source.
+            articles (dict): Article URLs to (heading, content) tuples.
+        """
+        if not articles:
+            return
+        now = time.time() if now is None else now
+        urls = list(articles)
+        pipeline = self.redis.pipeline()
+        pipeline.zadd(self._key(source, "seen"), {url: now for url in urls})
+        pipeline.hset(self._key(source, "hashes"),
+                      mapping={url: content_hash(content) for url, (_, content) in articles.items()})
+        pipeline.zrem(self._key(source, "queue"), *urls)
+        pipeline.hdel(self._key(source, "attempts"), *urls)
+        pipeline.execute()
+
+    def fail(self, source, urls, now=None):
+        """
+        Count a failed fetch of each URL. A URL that failed MAX_ATTEMPTS times
+        leaves the queue until it is due for a recheck.
+        """
+        urls = list(urls)
+        if not urls:
+            return
+        now = time.time() if now is None else now
+        pipeline = self.redis.pipeline()
+        for url in urls:
+            pipeline.hincrby(self._key(source, "attempts"), url, 1)
+        given_up = [url for url, attempts in zip(urls, pipeline.execute()) if attempts >= MAX_ATTEMPTS]
+        if given_up:
+            pipeline = self.redis.pipeline()
+            pipeline.zadd(self._key(source, "seen"), {url: now for url in given_up})
+            pipeline.zrem(self._key(source, "queue"), *given_up)
+            pipeline.hdel(self._key(source, "attempts"), *given_up)
+            pipeline.execute()
+
+    def prune(self, source, now=None):
+        # Forget URLs fetched long ago, with their hashes
+        now = time.time() if now is None else now
+        seen_key = self._key(source, "seen")
+        expired = self.redis.zrangebyscore(seen_key, 0, now - RETENTION_SECONDS)
+        if expired:
+            pipeline = self.redis.pipeline()
+            pipeline.zrem(seen_key, *expired)
+            pipeline.hdel(self._key(source, "hashes"), *expired)
+            pipeline.execute()
@@ -1,47 +1,80 @@
-from apscheduler.schedulers.blocking import BlockingScheduler
-from verge_scraper import main as scrape_verge, get_verge_main_page_hash
-from techcrunch_scraper import main as scrape_techcrunch, get_techcrunch_main_page_hash
-import redislite
+from config import ProdConfig
+from core.app import create_app
+from core.extensions import db
+from core.ingest import ingest_articles
+from core.metrics import metrics
+from core.models import Article
+from core.sentiment import sentiment_service
+from core.scraper.change_detector import ChangeDetector
+from core.scraper.frontier import Frontier
+from core.scraper.scheduler import SourceScheduler
+from core.scraper.sources import load_sources
+from core.cache import article_cache
+from core.redis_store import get_redis
 
-# Create a Redis configuration file with AOF persistence enabled
-config_file = 'redis.conf'
-with open(config_file, 'w') as f:
-    f.write('appendonly yes\n')
+# The app is only used for its database connection and configuration
+app = create_app(ProdConfig())
 
 # Initialize Redis connection
-# We use Redis to store the hashes of the html content of TechCrunch and The Verge
-redis_client = redislite.Redis(serverconfig={"appendonly": "yes"})
+# We use Redis to store the front page validators, article URL queues and polling schedules of every source
+redis_client = get_redis(app.config["REDISLITE_PATH"])
+change_detector = ChangeDetector(redis_client)
+# Keep sentiment scores across restarts so unchanged articles are never re-scored
+sentiment_service.backend = redis_client
+# Updated articles are dropped from the page cache the web workers share through this server
+article_cache.backend = redis_client
 
-# Function to monitor and scrape the main pages of 
-def monitor_and_scrape():
+sources = load_sources(app.config["SCRAPER_SOURCES"])
+
+
+def stored_urls(urls):
+    # URLs already in the Article table are not fetched again when the frontier has never seen them
+    with app.app_context():
+        return [url for url, in db.session.query(Article.url).filter(Article.url.in_(urls))]
+
+
+frontier = Frontier(redis_client, known=stored_urls, recheck_after=app.config["FRONTIER_RECHECK_SECONDS"])
+
+
+def ingest_source(source):
+    """
+    Scrape the new articles of a source and store them in the Article table.
+
+    Parameters:
+        source (Source): The source to check.
 
-    def check_verge():
-        new_hash = get_verge_main_page_hash()
-        old_hash = redis_client.get("verge_hash")
-        if old_hash is None or new_hash != old_hash.decode('utf-8'):
-            redis_client.set("verge_hash", new_hash)
-            return True
-        return False
-
-    def check_techcrunch():
-        new_hash = get_techcrunch_main_page_hash()
-        old_hash = redis_client.get("techcrunch_hash")
-        if old_hash is None or new_hash != old_hash.decode('utf-8'):
-            redis_client.set("techcrunch_hash", new_hash)
-            return True
-        return False
-
-    if check_verge():
-        print("Scraping new articles from The Verge")
-        articles = scrape_verge()
-        # Process the articles here, e.g., send notifications or store them in a database
-
-    if check_techcrunch():
-        print("Scraping new articles from TechCrunch")
-        articles = scrape_techcrunch()
-        # Process the articles here, e.g., send notifications or store them in a database
+    Returns:
+        int: The number of articles inserted.
+    """
+    articles, failed = source.check(change_detector, frontier)
+    frontier.fail(source.name, failed)
+    # Rechecked articles whose content did not change are not stored again
+    changed = frontier.changed(source.name, articles)
+
+    inserted = 0
+    if changed:
+        with app.app_context(), metrics.span('ingest', source=source.name):
+            result = ingest_articles(changed, source.category)
+        print(f"{source.name}: {result.inserted} inserted, {result.updated} updated, {result.skipped} skipped, "
+              f"{result.duplicates} near duplicates, {len(articles) - len(changed)} unchanged")
+        inserted = result.inserted
+
+    # Only take the URLs off the queue once their articles are stored, so a crash before that resumes them
+    frontier.complete(source.name, articles)
+    return inserted
+
+
+scheduler = SourceScheduler(sources, ingest_source, max_workers=app.config["SCRAPER_WORKERS"],
+                            redis_client=redis_client)
+
+
+# Check every source once, concurrently
+def monitor_and_scrape():
+    scheduler.run_once()
 
 if __name__ == "__main__":
-    scheduler = BlockingScheduler()
-    scheduler.add_job(monitor_and_scrape, 'interval', minutes=5)  # Execute monitor_and_scrape every 5 minutes
-    scheduler.start() 
\ No newline at end of file
+    # The scraper serves no pages, so its metrics get their own endpoint
+    if metrics.enabled and app.config["METRICS_PORT"]:
+        metrics.serve(app.config["METRICS_PORT"])
+    # Each source is polled on its own adaptive interval, see core/scraper/scheduler.py
+    scheduler.run()
@@ -0,0 +1,190 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Interval multipliers after a poll with and without new articles
+SPEEDUP = 0.5
+BACKOFF = 1.5
+# Publishing counts per hour of the day fade with this half-life, so the peaks follow a changing schedule
+PEAK_HALF_LIFE_HOURS = 7 * 24
+# Bounds of the hour-of-day factor applied to the interval, for quiet hours and peaks
+PEAK_FACTOR_BOUNDS = (0.5, 2.0)
+# Articles seen before the hourly profile is trusted
+PEAK_MIN_ARTICLES = 20
+
+
+class PollSchedule:
+    """
+    Adaptive polling interval of one source.
+
+    The interval halves after a poll that found new articles and grows by half
+    after one that did not, within [min_interval, max_interval]. On top of
+    that, the number of new articles found in each hour of the day (UTC) is
+    tracked with exponential decay: during hours the source usually publishes
+    more than its average it is polled up to twice as often, and during quiet
+    hours up to half as often.
+
+    Parameters:
+        min_interval (float): The shortest delay between two polls, in seconds.
+        max_interval (float): The longest delay between two polls, in seconds.
+    """
+
+    def __init__(self, min_interval, max_interval):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.hourly = [0.0] * 24
+        self.updated_at = None
+
+    def _decay(self, now):
+        if self.updated_at is not None:
+            factor = 0.5 ** ((now - self.updated_at) / 3600 / PEAK_HALF_LIFE_HOURS)
+            self.hourly = [count * factor for count in self.hourly]
+        self.updated_at = now
+
+    def record(self, new_articles, now=None):
+        """
+        Adapt the interval to the outcome of a poll.
+
+        Parameters:
+            new_articles (int): The number of new articles the poll found, 0
+                when nothing changed or the poll failed.
+            now (float): The time of the poll, as a Unix timestamp.
+        """
+        now = time.time() if now is None else now
+        self._decay(now)
+        if new_articles:
+            self.hourly[time.gmtime(now).tm_hour] += new_articles
+            self.interval *= SPEEDUP
+        else:
+            self.interval *= BACKOFF
+        self.interval = min(max(self.interval, self.min_interval), self.max_interval)
+
+    def peak_factor(self, now):
+        total = sum(self.hourly)
+        if total < PEAK_MIN_ARTICLES:
+            return 1.0
+        ratio = self.hourly[time.gmtime(now).tm_hour] / (total / 24)
+        low, high = PEAK_FACTOR_BOUNDS
+        return min(max(ratio, low), high)
+
+    def delay(self, now=None):
+        """
+        Returns:
+            float: The seconds to wait before the next poll.
+        """
+        now = time.time() if now is None else now
+        return min(max(self.interval / self.peak_factor(now), self.min_interval), self.max_interval)
+
+    def to_dict(self):
+        return {'interval': self.interval, 'hourly': self.hourly, 'updated_at': self.updated_at}
+
+    def load(self, state):
+        self.interval = min(max(state['interval'], self.min_interval), self.max_interval)
+        self.hourly = state['hourly']
+        self.updated_at = state['updated_at']
+
+
+class SourceScheduler:
+    """
+    Poll many sources concurrently, each on its own adaptive schedule.
+
+    Every source runs in a worker thread when it is due, so a slow or failing
+    source delays only itself, and a cycle over ten sources takes as long as the
+    slowest one rather than the sum of them. A source is never polled again
+    while its previous poll is still running.
+
+    Parameters:
+        sources (list): The sources to poll.
+        poll (callable): Called with a source in a worker thread; returns the
+            number of new articles it stored.
+        max_workers (int): The number of sources polled at the same time.
+        redis_client (redis.Redis): Optional store of the schedules, so the
+            learned intervals and publishing hours survive restarts.
+        namespace (str): Prefix of the Redis keys.
+    """
+
+    def __init__(self, sources, poll, max_workers=8, redis_client=None, namespace='schedule'):
+        self.sources = list(sources)
+        self.poll = poll
+        self.max_workers = max_workers
+        self.redis = redis_client
+        self.namespace = namespace
+        self.schedules = {source.name: PollSchedule(source.min_interval, source.max_interval)
+                          for source in self.sources}
+        self.next_run = {source.name: 0.0 for source in self.sources}
+        self._running = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._restore()
+
+    def _key(self, source):
+        return f"{self.namespace}:{source.name}"
+
+    def _restore(self):
+        if self.redis is None:
+            return
+        for source in self.sources:
+            state = self.redis.get(self._key(source))
+            if state:
+                schedule = self.schedules[source.name]
+                schedule.load(json.loads(state))
+                if schedule.updated_at is not None:
+                    self.next_run[source.name] = schedule.updated_at + schedule.delay()
+
+    def _run(self, source):
+        started = time.time()
+        new_articles = 0
+        try:
+            new_articles = self.poll(source) or 0
+        except Exception as e:
+            print(f"{source.name}: poll failed:", e)
+        finally:
+            schedule = self.schedules[source.name]
+            with self._lock:
+                schedule.record(new_articles, started)
+                self.next_run[source.name] = time.time() + schedule.delay()
+                self._running.discard(source.name)
+            if self.redis is not None:
+                self.redis.set(self._key(source), json.dumps(schedule.to_dict()))
+            self._wake.set()
+
+    def _due(self, now):
+        with self._lock:
+            due = [source for source in self.sources
+                   if source.name not in self._running and self.next_run[source.name] <= now]
+            self._running.update(source.name for source in due)
+            return due
+
+    def _seconds_to_next(self, now):
+        with self._lock:
+            waiting = [self.next_run[source.name] for source in self.sources if source.name not in self._running]
+        return max(min(waiting) - now, 0.0) if waiting else None
+
+    def run(self):
+        """
+        Poll the sources until stop() is called.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not self._stop.is_set():
+                for source in self._due(time.time()):
+                    executor.submit(self._run, source)
+                # Sleep until the next source is due, or until a poll finished and rescheduled its source
+                self._wake.wait(self._seconds_to_next(time.time()))
+                self._wake.clear()
+
+    def run_once(self):
+        """
+        Poll every source once, concurrently, and wait for all of them.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for source in self.sources:
+                with self._lock:
+                    self._running.add(source.name)
+                executor.submit(self._run, source)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
@@ -0,0 +1,174 @@
+import importlib
+import re
+from urllib.parse import urljoin
+from bs4 import BeautifulSoup
+from core.metrics import metrics
+from core.scraper.browser_pool import browser_pool
+from core.scraper.extraction import extract_article, extract_response
+from core.scraper.fetcher import fetcher
+
+
+class LinkExtractor:
+    """
+    Find the article links on a source's front page.
+
+    Parameters:
+        selector (str): The CSS selector of the article anchors.
+        pattern (str): Optional regular expression the href of an article link must match.
+    """
+
+    def __init__(self, selector, pattern=None):
+        self.selector = selector
+        self.pattern = re.compile(pattern) if pattern else None
+
+    def extract(self, html):
+        """
+        Parameters:
+            html (str): The HTML of the front page.
+
+        Returns:
+            set: The href of every matching anchor.
+        """
+        soup = BeautifulSoup(html, 'html.parser')
+        links = set()
+        for anchor in soup.select(self.selector):
+            href = anchor.get('href')
+            if href and (self.pattern is None or self.pattern.search(href)):
+                links.add(href)
+        return links
+
+
+class Source:
+    """
+    A news site the scraper follows, made of three pluggable parts: a link
+    extractor for its front page, an extractor config for its article pages,
+    and the change detector deciding whether the front page changed, while the
+    Frontier decides which of its links to fetch. Adding a site means declaring
+    one Source in its own module and listing that module in SCRAPER_SOURCES;
+    sites with unusual pages override the methods below.
+
+    Parameters:
+        name (str): The name of the source, used as its key in Redis.
+        base_url (str): The URL relative article links are resolved against.
+        front_page_url (str): The page listing the latest articles.
+        links (LinkExtractor): Finds the article links on the front page.
+        extractor (ExtractorConfig): Where the heading and content are on an article page.
+        category (str): The category stored on the articles of the source.
+        render_js (bool): Load the front page in a pooled headless browser rather
+            than over plain HTTP, for sites that only list articles client side.
+            Such pages cannot be requested conditionally; polls that find the
+            same article links as the last one queue nothing.
+        min_interval (float): The shortest time between two polls, in seconds.
+        max_interval (float): The longest time between two polls, in seconds.
+    """
+
+    def __init__(self, name, base_url, front_page_url, links, extractor, category='tech', render_js=True,
+                 min_interval=60, max_interval=1800):
+        self.name = name
+        self.base_url = base_url
+        self.front_page_url = front_page_url
+        self.links = links
+        self.extractor = extractor
+        self.category = category
+        self.render_js = render_js
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.fetcher = fetcher
+
+    def fetch_front_page(self, change_detector=None):
+        """
+        Fetch the HTML of the front page, conditionally when it is fetched over
+        plain HTTP and a change detector is given.
+
+        Returns:
+            str: The HTML, or None when the server answered 304 Not Modified.
+        """
+        if self.render_js:
+            return browser_pool.get_page_source(self.front_page_url)
+        if change_detector is not None:
+            return change_detector.fetch_if_modified(self.name, self.front_page_url)
+        return self.fetcher.get(self.front_page_url).text
+
+    def get_links(self, html):
+        return self.links.extract(html)
+
+    def parse_article_content(self, html):
+        """
+        Extract the heading and content of an article from its HTML.
+
+        Returns:
+            tuple: The heading and content of the article.
+        """
+        with metrics.span('scraper.parse'):
+            return extract_article([html], self.extractor)
+
+    def get_article_content(self, url):
+        with self.fetcher.stream(url) as response:
+            return extract_response(response, self.extractor)
+
+    def scrape_articles(self, links, concurrent=True):
+        """
+        Scrape the content of a set of articles.
+
+        Parameters:
+            links (set): Article links, relative to base_url or absolute.
+            concurrent (bool): Fetch the articles in parallel over the shared keep-alive
+                session. When False, articles are fetched one at a time.
+
+        Returns:
+            dict: A dictionary of article URLs as keys and a tuple of article heading and content as values.
+        """
+        urls = [urljoin(self.base_url, link) for link in links]
+        if concurrent:
+            pages = self.fetcher.fetch_all(urls, handler=lambda response: extract_response(response, self.extractor),
+                                           stream=True)
+        else:
+            pages = {url: self.get_article_content(url) for url in urls}
+        # Keyed by URL, as articles sharing a title are still distinct articles
+        return dict(pages)
+
+    def check(self, change_detector, frontier, batch_size=100):
+        """
+        Queue the links of the front page that were never fetched or are due for
+        a recheck, then fetch a batch of the queued articles.
+
+        Parameters:
+            change_detector (ChangeDetector): Fetches the front page conditionally.
+            frontier (Frontier): The queue and seen-set of article URLs.
+            batch_size (int): The most articles fetched in one check.
+
+        Returns:
+            tuple: A dictionary of article URLs as keys and a tuple of article heading and
+            content as values, for the articles fetched, and the list of queued URLs that failed.
+        """
+        with metrics.span('scraper.front_page', source=self.name):
+            html = self.fetch_front_page(change_detector)
+        if html is not None:
+            with metrics.span('scraper.links', source=self.name):
+                links = [urljoin(self.base_url, link) for link in self.get_links(html)]
+            # The fingerprint expires after the recheck interval, so still linked articles are queued again
+            if not change_detector.links_unchanged(self.name, links, ttl=frontier.recheck_after):
+                frontier.schedule(self.name, links)
+        # Whatever is queued is fetched, including what a crashed cycle left behind
+        urls = frontier.pending(self.name, batch_size)
+        if not urls:
+            return {}, []
+        with metrics.span('scraper.articles', source=self.name):
+            articles = self.scrape_articles(urls)
+        return articles, [url for url in urls if url not in articles]
+
+    def __repr__(self):
+        return f'<Source {self.name}>'
+
+
+def load_sources(module_names):
+    """
+    Import the modules declaring sources.
+
+    Parameters:
+        module_names (iterable): Dotted module paths, each defining a SOURCE.
+
+    Returns:
+        list: The sources, in the given order.
+    """
+    return [importlib.import_module(name).SOURCE for name in module_names]
@@ -0,0 +1,157 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from textblob import TextBlob
+
+
+def content_hash(text):
+    """
+    Hash a text so its sentiment can be cached regardless of where it came from.
+
+    Parameters:
+        text (str): The text.
+
+    Returns:
+        str: The SHA-1 hex digest of the UTF-8 encoded text.
+    """
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def score_text(text):
+    sentiment = TextBlob(text).sentiment
+    return sentiment.polarity, sentiment.subjectivity
+
+
+def score_chunk(texts):
+    # Runs in a worker process; one call per chunk keeps pickling overhead low
+    return [score_text(text) for text in texts]
+
+
+class SentimentService:
+    """
+    Batch sentiment scoring with a cache keyed by the hash of the content.
+
+    Texts that were scored before, e.g. unchanged articles scraped again, are
+    answered from the cache. The rest are deduplicated and, when there are
+    enough of them, scored across a process pool.
+
+    Parameters:
+        max_workers (int): The number of worker processes, defaults to the CPU count.
+        cache_size (int): The number of scores kept in the in-process LRU cache.
+        min_parallel (int): Smaller batches are scored in the calling process, as
+            the pool would cost more than it saves.
+        backend (redis.Redis): Optional shared cache that survives restarts.
+        backend_ttl (int): The seconds a score stays in the shared cache. By then
+            the article is no longer rechecked by the scraper, see core/scraper/frontier.py.
+    """
+
+    BACKEND_PREFIX = 'sentiment:'
+
+    def __init__(self, max_workers=None, cache_size=100000, min_parallel=32, backend=None,
+                 backend_ttl=30 * 24 * 3600):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.min_parallel = min_parallel
+        self.backend = backend
+        self.backend_ttl = backend_ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def _get_cached(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                    found[key] = self._cache[key]
+
+        missing = [key for key in keys if key not in found]
+        if missing and self.backend is not None:
+            for key, value in zip(missing, self.backend.mget([self.BACKEND_PREFIX + key for key in missing])):
+                if value is not None:
+                    polarity, subjectivity = value.decode('utf-8').split(',')
+                    found[key] = (float(polarity), float(subjectivity))
+            self._put_cached({key: found[key] for key in missing if key in found}, write_backend=False)
+        return found
+
+    def _put_cached(self, scores, write_backend=True):
+        if not scores:
+            return
+        with self._lock:
+            for key, value in scores.items():
+                self._cache[key] = value
+                self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        if write_backend and self.backend is not None:
+            # One key per score, so each expires on its own
+            pipeline = self.backend.pipeline(transaction=False)
+            for key, value in scores.items():
+                pipeline.setex(self.BACKEND_PREFIX + key, self.backend_ttl, '%r,%r' % value)
+            pipeline.execute()
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def score(self, text):
+        """
+        Score a single text.
+
+        Parameters:
+            text (str): The text.
+
+        Returns:
+            tuple: The polarity and subjectivity of the text.
+        """
+        return self.score_many([text], parallel=False)[0]
+
+    def score_many(self, texts, parallel=True):
+        """
+        Score a batch of texts.
+
+        Parameters:
+            texts (list): The texts.
+            parallel (bool): Allow spreading the uncached texts over the process pool.
+
+        Returns:
+            list: A (polarity, subjectivity) tuple for each text, in order.
+        """
+        keys = [content_hash(text) for text in texts]
+        scores = self._get_cached(set(keys))
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in scores:
+                pending.setdefault(key, text)
+
+        if pending:
+            pending_keys = list(pending)
+            pending_texts = [pending[key] for key in pending_keys]
+            if parallel and len(pending_texts) >= self.min_parallel and self.max_workers > 1:
+                chunk_size = max(1, len(pending_texts) // (self.max_workers * 4))
+                chunks = [pending_texts[i:i + chunk_size] for i in range(0, len(pending_texts), chunk_size)]
+                results = [score for chunk in self._pool().map(score_chunk, chunks) for score in chunk]
+            else:
+                results = score_chunk(pending_texts)
+            computed = dict(zip(pending_keys, results))
+            self._put_cached(computed)
+            scores.update(computed)
+
+        return [scores[key] for key in keys]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+sentiment_service = SentimentService()
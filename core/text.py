@@ -0,0 +1,47 @@
+import re
+
+# Tokens are runs of letters/digits that start with a letter, lower-cased.
+TOKEN_PATTERN = re.compile(r'[a-z][a-z0-9]+')
+
+STOP_WORDS = frozenset('''
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers herself him himself his how i if in into is it its itself just me more most my myself no
+nor not now of off on once only or other our ours ourselves out over own same she should so some such than
+that the their theirs them themselves then there these they this those through to too under until up very
+was we were what when where which while who whom why will with would you your yours yourself yourselves
+said says say new one two like get got make made
+'''.split())
+
+
+def tokenize(text):
+    """
+    Split a piece of text into lower-cased word tokens with stop words removed.
+
+    Parameters:
+        text (str): The text to tokenize.
+
+    Returns:
+        list: A list of tokens in the order they appear in the text.
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOP_WORDS]
+
+
+def summarize(text, max_length=280):
+    """
+    Build a short plain-text excerpt of an article body, cut on a word boundary.
+
+    Parameters:
+        text (str): The article content.
+        max_length (int): The maximum number of characters in the excerpt.
+
+    Returns:
+        str: The excerpt, with an ellipsis appended when the text was shortened.
+    """
+    text = ' '.join(text.split())
+    if len(text) <= max_length:
+        return text
+    cut = text.rfind(' ', 0, max_length)
+    if cut <= 0:
+        cut = max_length
+    return text[:cut].rstrip(' ,.;:') + '...'
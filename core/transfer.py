@@ -0,0 +1,313 @@
+import csv
+import gzip
+import io
+import json
+import sys
+from collections import namedtuple
+from datetime import date, datetime
+from sqlalchemy import select, types
+from core.extensions import db
+from core.models import Article, Interaction, User
+from core.text import summarize
+
+# Rows fetched per round trip on export, and sent per COPY on import
+CHUNK_SIZE = 5000
+
+# Tables that can be moved, in the order they have to be imported in
+TABLES = {
+    'article': Article.__table__,
+    'interaction': Interaction.__table__,
+}
+
+# Rebuilt after import instead of being exported: search_vector by a database trigger,
+# minhash and cluster_id by flask articles dedup
+DERIVED_COLUMNS = {'search_vector', 'minhash', 'cluster_id'}
+
+# Interactions are exported with the URL of their article, and imported onto the
+# local article with that URL, as ids differ between databases
+ARTICLE_URL = 'article_url'
+
+TransferResult = namedtuple('TransferResult', ['rows', 'skipped'])
+
+
+def exported_columns(table):
+    return [column for column in table.columns if column.name not in DERIVED_COLUMNS]
+
+
+def open_text(path, mode):
+    """
+    Open a file for streaming, '-' meaning standard input or output and a .gz
+    suffix meaning gzip compression.
+    """
+    if path == '-':
+        return sys.stdin if mode == 'r' else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def export_statement(table):
+    statement = select(*exported_columns(table))
+    if table is Interaction.__table__:
+        article = Article.__table__
+        statement = statement.add_columns(article.c.url.label(ARTICLE_URL)) \
+            .join(article, article.c.id == table.c.article_id)
+    return statement.order_by(table.c.id)
+
+
+def stream_rows(table, chunk_size=CHUNK_SIZE):
+    """
+    Read every row of a table through a server-side cursor, so only one chunk of
+    rows is ever held in memory.
+
+    Parameters:
+        table (Table): The table to read.
+        chunk_size (int): The number of rows fetched per round trip.
+
+    Yields:
+        list: Chunks of rows, as dictionaries of column values.
+    """
+    statement = export_statement(table)
+    with db.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=chunk_size).execute(statement)
+        for partition in result.mappings().partitions():
+            yield [dict(row) for row in partition]
+
+
+def export_table(name, path, format='ndjson', chunk_size=CHUNK_SIZE):
+    """
+    Stream a table to a newline-delimited JSON or Parquet file.
+
+    Parameters:
+        name (str): The name of the table, a key of TABLES.
+        path (str): The file to write, or '-' for standard output (NDJSON only).
+        format (str): ndjson or parquet. Parquet needs pyarrow.
+        chunk_size (int): The number of rows fetched and written at once.
+
+    Returns:
+        TransferResult: The number of rows written.
+    """
+    chunks = stream_rows(TABLES[name], chunk_size)
+    if format == 'parquet':
+        return export_parquet(chunks, path, export_statement(TABLES[name]))
+
+    written = 0
+    output = open_text(path, 'w')
+    try:
+        for chunk in chunks:
+            output.write(''.join(json.dumps(row, default=json_default, ensure_ascii=False) + '\n' for row in chunk))
+            written += len(chunk)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return TransferResult(written, 0)
+
+
+def arrow_type(pa, column_type):
+    if isinstance(column_type, types.Integer):
+        return pa.int64()
+    if isinstance(column_type, types.Float):
+        return pa.float64()
+    if isinstance(column_type, types.DateTime):
+        return pa.timestamp('us')
+    if isinstance(column_type, types.LargeBinary):
+        return pa.binary()
+    if isinstance(column_type, types.Boolean):
+        return pa.bool_()
+    return pa.string()
+
+
+def export_parquet(chunks, path, statement):
+    # Imported lazily: pyarrow is only needed for Parquet files
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Taken from the column types rather than from the first chunk, where a column may be all nulls
+    schema = pa.schema([(column.name, arrow_type(pa, column.type)) for column in statement.selected_columns])
+    written = 0
+    writer = pq.ParquetWriter(path, schema)
+    try:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            written += len(chunk)
+    finally:
+        writer.close()
+    return TransferResult(written, 0)
+
+
+def read_chunks(path, format='ndjson', chunk_size=CHUNK_SIZE):
+    """
+    Read the rows of an export file, one chunk at a time.
+
+    Yields:
+        list: Chunks of rows, as dictionaries of column values.
+    """
+    if format == 'parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pylist()
+        return
+
+    source = open_text(path, 'r')
+    try:
+        chunk = []
+        for line in source:
+            if line.strip():
+                chunk.append(json.loads(line))
+            if len(chunk) >= chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+
+def parse_time(value):
+    # NDJSON holds times as ISO strings, Parquet as datetimes
+    return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+
+def parse_value(table, column, value):
+    if isinstance(table.c[column].type, types.DateTime):
+        return parse_time(value)
+    return value
+
+
+def prepare_chunk(name, rows):
+    # Exports made before articles had a stored summary get one computed here
+    if name == 'article':
+        for row in rows:
+            if not row.get('summary'):
+                row['summary'] = summarize(row['content'])
+    return rows
+
+
+def to_csv(rows, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['\\N' if row.get(column) is None else row[column] for column in columns])
+    buffer.seek(0)
+    return buffer
+
+
+def imported_columns(table):
+    # Imported rows get new ids; interactions point at articles through their URL instead
+    return [column.name for column in exported_columns(table) if column.name != 'id']
+
+
+def copy_chunks(name, chunks):
+    """
+    Load chunks of rows with Postgres COPY into a temporary staging table, then
+    move them into the real table in one INSERT ... SELECT.
+
+    Rows get ids of this database rather than those of the export. Articles
+    whose URL already exists are skipped, and interactions are attached to the
+    article with their article_url; those whose article or user is missing,
+    or that were already imported, are skipped, so importing the same file
+    twice is harmless.
+
+    Returns:
+        TransferResult: The number of rows inserted and skipped.
+    """
+    table = TABLES[name]
+    staged_columns = [column.name for column in exported_columns(table)]
+    if name == 'interaction':
+        staged_columns.append(ARTICLE_URL)
+    columns = imported_columns(table)
+    column_list = ', '.join(f'"{column}"' for column in columns)
+
+    staged = 0
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f'CREATE TEMPORARY TABLE staging (LIKE "{table.name}") ON COMMIT DROP')
+        if name == 'interaction':
+            cursor.execute(f'ALTER TABLE staging ADD COLUMN {ARTICLE_URL} varchar(512)')
+        staged_list = ', '.join(f'"{column}"' for column in staged_columns)
+        for chunk in chunks:
+            rows = prepare_chunk(name, chunk)
+            cursor.copy_expert(f"COPY staging ({staged_list}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                               to_csv(rows, staged_columns))
+            staged += len(rows)
+
+        if name == 'interaction':
+            values = ', '.join('article.id' if column == 'article_id' else f'staging."{column}"' for column in columns)
+            cursor.execute(f'INSERT INTO interaction ({column_list}) SELECT {values} FROM staging '
+                           f'JOIN article ON article.url = staging.{ARTICLE_URL} '
+                           'WHERE EXISTS (SELECT 1 FROM "user" WHERE "user".id = staging.user_id) '
+                           'AND NOT EXISTS (SELECT 1 FROM interaction AS existing '
+                           'WHERE existing.user_id = staging.user_id AND existing.article_id = article.id '
+                           'AND existing.last_interaction_time = staging.last_interaction_time)')
+        else:
+            cursor.execute(f'INSERT INTO article ({column_list}) SELECT {column_list} FROM staging '
+                           'ON CONFLICT (url) DO NOTHING')
+        inserted = cursor.rowcount
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+    return TransferResult(inserted, staged - inserted)
+
+
+def insert_chunks(name, chunks):
+    # Stand-in for databases without COPY, e.g. SQLite in development, with the same skipping rules
+    table = TABLES[name]
+    columns = imported_columns(table)
+    inserted = skipped = 0
+    with db.engine.begin() as connection:
+        for chunk in chunks:
+            rows = prepare_chunk(name, chunk)
+            if name == 'interaction':
+                articles = dict(connection.execute(select(Article.url, Article.id).where(
+                    Article.url.in_({row.get(ARTICLE_URL) for row in rows}))).all())
+                users = {user_id for user_id, in connection.execute(select(User.id).where(
+                    User.id.in_({row['user_id'] for row in rows})))}
+                for row in rows:
+                    row['article_id'] = articles.get(row.get(ARTICLE_URL))
+                existing = set(connection.execute(
+                    select(table.c.user_id, table.c.article_id, table.c.last_interaction_time).where(
+                        table.c.article_id.in_(set(articles.values())))).all())
+                kept = [row for row in rows if row['article_id'] is not None and row['user_id'] in users
+                        and (row['user_id'], row['article_id'], parse_time(row['last_interaction_time']))
+                        not in existing]
+            else:
+                existing = {url for url, in connection.execute(select(Article.url).where(
+                    Article.url.in_([row['url'] for row in rows])))}
+                kept = list({row['url']: row for row in rows if row['url'] not in existing}.values())
+            if kept:
+                connection.execute(table.insert(), [{column: parse_value(table, column, row.get(column))
+                                                     for column in columns} for row in kept])
+            inserted += len(kept)
+            skipped += len(rows) - len(kept)
+    return TransferResult(inserted, skipped)
+
+
+def import_table(name, path, format='ndjson', chunk_size=CHUNK_SIZE):
+    """
+    Stream an export file into a table, in a single transaction.
+
+    Parameters:
+        name (str): The name of the table, a key of TABLES.
+        path (str): The file to read, or '-' for standard input (NDJSON only).
+        format (str): ndjson or parquet. Parquet needs pyarrow.
+        chunk_size (int): The number of rows read and sent at once.
+
+    Returns:
+        TransferResult: The number of rows inserted and skipped.
+    """
+    chunks = read_chunks(path, format, chunk_size)
+    if db.engine.dialect.name == 'postgresql':
+        return copy_chunks(name, chunks)
+    return insert_chunks(name, chunks)
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash
 from flask_login import login_user, logout_user, current_user, login_required
 from core.models import db, User
+from core.cache import user_cache
 from core.forms import LoginForm, RegistrationForm, UpdateUserForm, CommentForm
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -82,20 +83,22 @@ def update_user():
         current_user.email = form.email.data
         current_user.set_password(form.new_password.data)
         db.session.commit()
+        user_cache.invalidate(current_user.id)
 
         flash('Your account has been updated', 'success')
         return redirect(url_for('main.index'))
 
-    return render_template('templates/update_user.html', form=form)
+    return render_template('auth/update.html', form=form)
 
 
 @auth_bp.route('/delete', methods=['GET', 'POST'])
 @login_required
 def delete_user():
-    user = User.query.get(current_user.id)
+    user = current_user._get_current_object()
     logout_user()
     db.session.delete(user)
     db.session.commit()
+    user_cache.invalidate(user.id)
 
     flash('Your account has been deleted', 'success')
     return redirect(url_for('main.index'))
\ No newline at end of file
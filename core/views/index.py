@@ -2,9 +2,16 @@ from flask import Blueprint, render_template, request, flash, redirect, url_for
 from flask_login import login_required, current_user
 from core.models import Article, User
 from core.forms import SearchForm
+from core.cache import article_cache
+from core.embeddings import embedding_index
+from core.events import event_queue
+from core.extensions import db
 
 main_bp = Blueprint('main', __name__)
 
+PROFILE_PAGE_SIZE = 10
+SIMILAR_ARTICLES = 5
+
 @main_bp.route('/')
 def index():
     search_form = SearchForm()
@@ -17,44 +24,84 @@ def index():
 
     return render_template('index/index.html', articles=recommended_articles, search_form=search_form)
 
-@main_bp.route('/article/<int:article_id>')
-def article_detail(article_id):
-    # article = Article.query.get(article_id)
-    # if article is None:
-    #    flash('Article not found', 'danger')
-    #    return redirect(url_for('main.index'))
-
-    content = '''
-    Lorem ipsum dolor sit amet, consectetur adipiscing elit. Sed eu bibendum dolor. Maecenas sit amet neque non tortor condimentum tincidunt vitae sodales sem. Nunc venenatis, metus ac ultrices vulputate, eros ante tristique quam, pulvinar euismod dui mi vitae nibh. Nunc iaculis suscipit velit, et convallis elit scelerisque egestas. Nullam vehicula magna eget tellus porta, vitae luctus urna tempor. Maecenas posuere leo nec odio maximus elementum. Ut arcu nisl, luctus ac lorem in, porttitor consequat libero. Donec orci nunc, maximus a bibendum non, aliquam ut velit. Vestibulum quis mollis mi.
-
-Proin ullamcorper a enim id ultricies. Nunc augue sapien, iaculis a nisl at, fringilla tempor felis. Praesent vitae arcu at nulla bibendum facilisis. In aliquam rhoncus ex, et aliquet velit elementum vitae. Nulla facilisi. Sed consectetur at felis eget viverra. Class aptent taciti sociosqu ad litora torquent per conubia nostra, per inceptos himenaeos. Donec elementum, sem sodales bibendum efficitur, neque urna dapibus lorem, non commodo leo dui quis erat. Quisque vestibulum, felis sit amet porta fermentum, nisl ex eleifend lacus, a maximus felis metus sit amet eros. Vestibulum semper eros non ligula interdum, sed sodales odio scelerisque. Vivamus tempus, velit in rhoncus molestie, justo nisi fringilla neque, in ultricies ex diam eget justo. Aenean faucibus malesuada euismod. Proin pretium ligula quis congue euismod. Praesent pulvinar rutrum diam vel elementum. Sed justo libero, molestie vel arcu eget, volutpat condimentum purus.
+def load_article(article_id):
+    row = db.session.query(Article.id, Article.title, Article.content, Article.cluster_id) \
+        .filter(Article.id == article_id).first()
+    if row is None:
+        return None
 
-Donec posuere aliquam sapien, ut imperdiet nibh. Aenean gravida leo elementum, vulputate nulla eu, luctus risus. Duis vitae purus lectus. Fusce dapibus sed lectus et tempor. Nulla facilisi. Donec quis pellentesque est, et tempus justo. Integer ut semper ex. Integer ultricies, elit vitae tempor interdum, arcu mauris consequat velit, sed convallis metus eros eget nibh. Maecenas condimentum tristique auctor. Quisque egestas lorem dolor.
+    # "More like this", leaving out near duplicates of the article itself
+    similar_ids = [similar_id for similar_id, _ in embedding_index.more_like_this(article_id, k=SIMILAR_ARTICLES * 2)]
+    similar = []
+    if similar_ids:
+        rows = {other.id: other for other in db.session.query(Article.id, Article.title, Article.cluster_id)
+                .filter(Article.id.in_(similar_ids))}
+        similar = [{'id': other.id, 'title': other.title}
+                   for other in (rows[similar_id] for similar_id in similar_ids if similar_id in rows)
+                   if row.cluster_id is None or other.cluster_id != row.cluster_id]
+    return {'id': row.id, 'title': row.title, 'content': row.content, 'similar': similar[:SIMILAR_ARTICLES]}
 
-Ut ornare, massa eu consequat accumsan, ipsum diam ultricies elit, et condimentum eros velit vel leo. Pellentesque a risus lorem. Suspendisse aliquet bibendum consectetur. Vestibulum ante ipsum primis in faucibus orci luctus et ultrices posuere cubilia curae; Nam tristique ipsum felis, non aliquam velit viverra sed. Vestibulum iaculis sed massa ac lacinia. Nullam nisi nulla, viverra at sapien sit amet, convallis egestas felis. Proin gravida lacus dolor, eget pellentesque mauris convallis at. Pellentesque habitant morbi tristique senectus et netus et malesuada fames ac turpis egestas.
+@main_bp.route('/article/<int:article_id>')
+def article_detail(article_id):
+    # The page itself depends on the user and the CSRF token, so only the article is cached
+    article = article_cache.get(article_id, load_article)
+    if article is None:
+        flash('Article not found', 'danger')
+        return redirect(url_for('main.index'))
 
-Nulla ante magna, auctor a felis ac, feugiat tincidunt urna. Nulla facilisi. Nullam condimentum scelerisque volutpat. Duis posuere viverra aliquam. Nam ullamcorper nibh vitae elit maximus fringilla. Donec imperdiet lacus ac lectus condimentum posuere. Mauris lobortis, arcu sed ullamcorper rutrum, eros turpis pulvinar metus, sit amet rutrum elit nulla sit amet mauris. Nunc sed arcu neque. Curabitur arcu nisl, facilisis nec risus id, maximus fringilla ligula. Lorem ipsum dolor sit amet, consectetur adipiscing elit.
-    '''
+    # Counted by the background flush in core/events.py, not in this request
+    event_queue.record_view(article_id, current_user.id if current_user.is_authenticated else None)
 
     return render_template('index/article_detail.html',
-                           title='Sample Article Title',
-                           content=content)
+                           article_id=article_id,
+                           title=article['title'],
+                           content=article['content'],
+                           similar_articles=article['similar'])
+
+@main_bp.route('/article/<int:article_id>/engagement', methods=['POST'])
+@login_required
+def article_engagement(article_id):
+    # Sent by the article page when the reader likes, shares or saves it, and when they leave it
+    action = request.form.get('action')
+    try:
+        if action == 'read':
+            event_queue.record_interaction(current_user.id, article_id,
+                                           read_time=request.form.get('read_time', 0, type=int),
+                                           scroll_depth=request.form.get('scroll_depth', 0.0, type=float),
+                                           rating=request.form.get('rating', None, type=int))
+        else:
+            event_queue.record_engagement(article_id, action)
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    return '', 202
 
 @main_bp.route('/profile')
 @login_required
 def user_profile():
-    favorited_articles = current_user.get_favorited_articles()
-    viewed_articles = current_user.get_viewed_articles()
-    shared_articles = current_user.get_shared_articles()
+    # Later pages of a single list are requested with ?list=<name>&page=<n>
+    lists = current_user.get_profile_lists(per_page=PROFILE_PAGE_SIZE)
+    list_name = request.args.get('list')
+    page = request.args.get('page', 1, type=int)
+    if list_name in User.PROFILE_LISTS and page > 1:
+        lists[list_name] = current_user.get_profile_list(list_name, page=page, per_page=PROFILE_PAGE_SIZE)
 
-    return render_template('user_profile.html', favorited_articles=favorited_articles, viewed_articles=viewed_articles, shared_articles=shared_articles)
+    return render_template('index/user_profile.html',
+                           favorited_articles=lists['favorited'],
+                           viewed_articles=lists['viewed'],
+                           shared_articles=lists['shared'])
 
-@main_bp.route('/search', methods=['POST'])
+@main_bp.route('/search', methods=['GET', 'POST'])
 def search():
-    search_form = SearchForm(request.form)
+    # The search bar posts the form; result pages link to each other with GET parameters
+    if request.method == 'POST':
+        search_form = SearchForm(request.form)
+    else:
+        search_form = SearchForm(request.args, meta={'csrf': False})
+
     if search_form.validate():
-        search_results = Article.search_articles(search_form.keywords.data)
-        return render_template('search_results.html', search_results=search_results, search_form=search_form)
+        page = request.args.get('page', 1, type=int)
+        search_results = Article.search_articles(search_form.keywords.data, page=page)
+        return render_template('index/search_results.html', search_results=search_results, search_form=search_form)
 
     flash('Invalid search query', 'danger')
     return redirect(url_for('main.index'))
\ No newline at end of file
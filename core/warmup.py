@@ -0,0 +1,74 @@
+import time
+from sqlalchemy import text
+from core.extensions import db
+from core.collaborative import collaborative_recommender
+from core.embeddings import embedding_index
+from core.popularity import popularity_ranking
+from core.recommender import content_recommender
+
+
+def open_pool(connections):
+    """
+    Check out and return connections so the first requests find them open.
+
+    Parameters:
+        connections (int): The number of connections to open, at most pool_size
+            of them stay in the pool once returned.
+    """
+    opened = []
+    try:
+        for _ in range(connections):
+            connection = db.engine.connect()
+            connection.execute(text("SELECT 1"))
+            opened.append(connection)
+    finally:
+        for connection in opened:
+            connection.close()
+
+
+def warm_up(app):
+    """
+    Prepare a worker before it accepts traffic: open the connection pool, and
+    load the popularity ranking and map the recommendation models that the
+    first requests would otherwise load. create_app() runs it when
+    WARMUP_ON_STARTUP is set. A step that fails is reported and skipped, so a
+    worker still starts and loads what it missed on first use.
+
+    Parameters:
+        app (Flask): The application.
+
+    Returns:
+        dict: The seconds taken by each step that succeeded, and in total.
+    """
+    timings = {}
+    started = time.perf_counter()
+    with app.app_context():
+        steps = [
+            ('pool', lambda: open_pool(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).get('pool_size', 1))),
+            ('popularity', popularity_ranking.load),
+            ('content_model', content_recommender.ensure_fitted),
+            ('collaborative_model', collaborative_recommender.get_model),
+            ('embeddings', lambda: embedding_index.available),
+        ]
+        for name, step in steps:
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                print(f"Warmup step {name} failed:", e)
+                continue
+            timings[name] = time.perf_counter() - step_started
+    timings['total'] = time.perf_counter() - started
+    return timings
+
+
+def warm_up_pool(app):
+    """
+    Open the connection pool of a worker forked from a preloaded app, e.g.
+    from a gunicorn post_fork hook; the models were loaded before the fork.
+
+    Parameters:
+        app (Flask): The application.
+    """
+    with app.app_context():
+        open_pool(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}).get('pool_size', 1))
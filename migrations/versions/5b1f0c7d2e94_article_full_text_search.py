@@ -0,0 +1,54 @@
+"""article full-text search
+
+Revision ID: 5b1f0c7d2e94
+Revises: 3932966004d0
+Create Date: 2026-10-18 10:12:31.482000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1f0c7d2e94'
+down_revision = '3932966004d0'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    # Keep search_vector in sync on every insert and update, including the bulk upserts of the ingest stage
+    op.execute("""
+        CREATE FUNCTION article_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(NEW.content, '')), 'B');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER article_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, content ON article
+        FOR EACH ROW EXECUTE FUNCTION article_search_vector_update()
+    """)
+    op.execute("UPDATE article SET title = title")
+
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.create_index('ix_article_search_vector', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_index('ix_article_search_vector', postgresql_using='gin')
+
+    op.execute("DROP TRIGGER article_search_vector_trigger ON article")
+    op.execute("DROP FUNCTION article_search_vector_update()")
+
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_column('search_vector')
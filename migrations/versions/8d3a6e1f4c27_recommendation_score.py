@@ -0,0 +1,26 @@
+"""recommendation score
+
+Revision ID: 8d3a6e1f4c27
+Revises: 5b1f0c7d2e94
+Create Date: 2026-10-18 11:40:05.913000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3a6e1f4c27'
+down_revision = '5b1f0c7d2e94'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('recommendation', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('score', sa.Float(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('recommendation', schema=None) as batch_op:
+        batch_op.drop_column('score')
@@ -0,0 +1,28 @@
+"""article created at
+
+Revision ID: a83f5c2d9e17
+Revises: f2a9c7d31b40
+Create Date: 2026-10-18 18:02:41.731000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a83f5c2d9e17'
+down_revision = 'f2a9c7d31b40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('created_at', sa.DateTime(), nullable=True))
+    # Existing articles are taken as first seen now, stored times being naive UTC
+    op.execute("UPDATE article SET created_at = timezone('utc', now())")
+
+
+def downgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_column('created_at')
@@ -0,0 +1,45 @@
+"""article summary
+
+Revision ID: c4b8e2a9f613
+Revises: 8d3a6e1f4c27
+Create Date: 2026-10-18 14:05:31.274000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from core.text import summarize
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4b8e2a9f613'
+down_revision = '8d3a6e1f4c27'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH = 1000
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('summary', sa.String(length=300), nullable=True))
+
+    # Backfill in keyset-paginated batches so no more than one batch of bodies is held in memory
+    connection = op.get_bind()
+    article = sa.table('article', sa.column('id', sa.Integer), sa.column('content', sa.Text),
+                       sa.column('summary', sa.String))
+    update = article.update().where(article.c.id == sa.bindparam('article_id')).values(summary=sa.bindparam('excerpt'))
+    last_id = 0
+    while True:
+        rows = connection.execute(sa.select(article.c.id, article.c.content)
+                                  .where(article.c.id > last_id)
+                                  .order_by(article.c.id)
+                                  .limit(BACKFILL_BATCH)).fetchall()
+        if not rows:
+            break
+        connection.execute(update, [{'article_id': row.id, 'excerpt': summarize(row.content)} for row in rows])
+        last_id = rows[-1].id
+
+
+def downgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_column('summary')
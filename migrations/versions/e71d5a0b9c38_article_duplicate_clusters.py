@@ -0,0 +1,31 @@
+"""article duplicate clusters
+
+Revision ID: e71d5a0b9c38
+Revises: c4b8e2a9f613
+Create Date: 2026-10-18 15:22:47.518000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e71d5a0b9c38'
+down_revision = 'c4b8e2a9f613'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('cluster_id', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('minhash', sa.LargeBinary(), nullable=True))
+        batch_op.create_index(batch_op.f('ix_article_cluster_id'), ['cluster_id'], unique=False)
+    # Existing articles are signed and clustered by: flask articles dedup
+
+
+def downgrade():
+    with op.batch_alter_table('article', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_article_cluster_id'))
+        batch_op.drop_column('minhash')
+        batch_op.drop_column('cluster_id')
@@ -0,0 +1,33 @@
+"""user recommendation freshness
+
+Revision ID: f2a9c7d31b40
+Revises: e71d5a0b9c38
+Create Date: 2026-10-18 17:05:12.264000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a9c7d31b40'
+down_revision = 'e71d5a0b9c38'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('signals_changed_at', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('recommended_at', sa.DateTime(), nullable=True))
+    # Users keep their last run; those with favorites or views that were never run are picked up by the next one
+    op.execute('UPDATE "user" SET recommended_at = '
+               '(SELECT max(recommended_on) FROM recommendation WHERE recommendation.user_id = "user".id)')
+    op.execute('UPDATE "user" SET signals_changed_at = CURRENT_TIMESTAMP WHERE recommended_at IS NULL AND '
+               '(id IN (SELECT user_id FROM favorite_article) OR id IN (SELECT user_id FROM viewed_article))')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('recommended_at')
+        batch_op.drop_column('signals_changed_at')